@@ -1,18 +1,40 @@
+import asyncio
+import hashlib
 import logging
-
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-from app.services.project_service import project_service
+import os
+
+import aiofiles
+import aiofiles.tempfile
+import orjson
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from app.services.project_service import project_service, TERMINAL_TASK_STATUSES
 from app.services.script_service import script_service
 from app.services.explain_service import explain_service
 from app.services.architecture_service import architecture_service
 from app.services.vector_service import vector_service
+from app.services.semantic_cache_service import semantic_cache_service
 from app.services.llm_service import LLMError
+from app.core.cache import (
+    response_cache,
+    build_cache_key,
+    normalize_code,
+    normalize_text,
+)
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 api_router = APIRouter()
 
+# 上传文件分块写盘的块大小（1MB）
+UPLOAD_CHUNK_SIZE = 1 << 20
+# SSE 心跳间隔（秒），防止代理因长时间无数据断开连接
+SSE_HEARTBEAT_SECONDS = 15
+# 后台任务的强引用：事件循环只持有弱引用，不保存的话任务可能在运行中被回收
+_background_tasks: set = set()
+
 # Pydantic 模型
 class GenerateScriptRequest(BaseModel):
     scenario: str
@@ -56,6 +78,11 @@ class ProjectDetailsResponse(BaseModel):
     status: str
     progress: int
 
+class TaskProgressResponse(BaseModel):
+    taskId: str
+    status: str
+    progress: int
+
 class SearchCodeRequest(BaseModel):
     query: str
     n_results: int = 5
@@ -82,6 +109,23 @@ class HistoryItemResponse(BaseModel):
 class HistoryListResponse(BaseModel):
     items: list[HistoryItemResponse]
 
+# 预先构建的校验器，避免每次请求重复创建
+HISTORY_ITEMS_ADAPTER = TypeAdapter(list[HistoryItemResponse])
+
+async def _load_architecture_visualization(task_id: str) -> dict:
+    """
+    获取架构可视化数据。
+    两个路由共用同一缓存 key，并发轮询同一 task_id 时只会触发一次 LLM 生成。
+    """
+    return await response_cache.cached(
+        build_cache_key("architecture_visualization", task_id),
+        lambda: architecture_service.generate_architecture_visualization(task_id),
+        ttl_seconds=settings.ARCHITECTURE_CACHE_TTL_SECONDS,
+        # 含默认模板的降级结果不缓存，避免临时故障长期污染缓存
+        should_cache=lambda _: architecture_service.is_cached(task_id),
+    )
+
+
 @api_router.get("/history/list", response_model=HistoryListResponse)
 async def get_history_list():
     """
@@ -89,22 +133,70 @@ async def get_history_list():
     """
     # 调用服务层获取历史记录
     history_data = project_service.get_history_list()
-    
-    # 将时间戳转换为 ISO 格式字符串
-    items = []
-    for item in history_data:
-        from datetime import datetime
-        created_at_str = datetime.fromtimestamp(item["created_at"]).isoformat()
-        
-        items.append(HistoryItemResponse(
-            task_id=item["task_id"],
-            file_name=item["file_name"],
-            created_at=created_at_str,
-            status=item["status"],
-            file_count=item.get("file_count")
-        ))
-    
-    return HistoryListResponse(items=items)
+
+    items = HISTORY_ITEMS_ADAPTER.validate_python([
+        {
+            "task_id": item["task_id"],
+            "file_name": item["file_name"],
+            "created_at": item["created_at_iso"],
+            "status": item["status"],
+            "file_count": item.get("file_count"),
+        }
+        for item in history_data
+    ])
+
+    return HistoryListResponse.model_construct(items=items)
+
+
+def _compute_etag(payload: dict) -> str:
+    """根据响应内容计算强 ETag（键排序保证同一内容得到同一值）"""
+    digest = hashlib.blake2b(
+        orjson.dumps(payload, option=orjson.OPT_SORT_KEYS), digest_size=16
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """判断请求头 If-None-Match 是否命中当前 ETag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def _save_upload_to_temp(file: UploadFile) -> str:
+    """
+    将上传文件按块流式写入临时文件，避免把整个 ZIP 读入内存。
+    超过大小限制时立即中止并删除临时文件。
+
+    Returns:
+        临时 ZIP 文件路径（之后由 project_service 负责清理）
+
+    Raises:
+        ValueError: 文件超过大小限制时
+    """
+    max_bytes = settings.max_upload_size_bytes
+    bytes_written = 0
+
+    async with aiofiles.tempfile.NamedTemporaryFile(
+        "wb", prefix="codestory_upload_", suffix=".zip", delete=False
+    ) as temp_file:
+        upload_path = temp_file.name
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                bytes_written += len(chunk)
+                if bytes_written > max_bytes:
+                    raise ValueError(
+                        f"文件大小超过限制（最大 {settings.MAX_UPLOAD_SIZE_MB}MB）"
+                    )
+                await temp_file.write(chunk)
+        except BaseException:
+            await temp_file.close()
+            os.remove(upload_path)
+            raise
+
+    return upload_path
 
 
 @api_router.post("/upload", response_model=UploadResponse)
@@ -112,10 +204,9 @@ async def upload_project(file: UploadFile = File(...)):
     """
     上传 ZIP 包，返回任务 ID 和文件列表
     """
-    file_content = await file.read()
-
     try:
-        result = await project_service.upload_and_parse(file_content, file.filename)
+        upload_path = await _save_upload_to_temp(file)
+        result = await project_service.upload_and_parse(upload_path, file.filename)
     except ValueError as validation_error:
         raise HTTPException(status_code=400, detail=str(validation_error))
 
@@ -128,20 +219,27 @@ async def upload_project(file: UploadFile = File(...)):
 
 
 @api_router.get("/project/structure", response_model=ProjectStructureResponse)
-async def get_project_structure(task_id: str):
+async def get_project_structure(task_id: str, request: Request, response: Response):
     """
-    获取项目白话版的目录树
+    获取项目白话版的目录树。
+    支持 ETag 条件请求，数据未变化时返回 304。
     """
     # 获取项目数据
     project_data = project_service.get_project_data(task_id)
-    
+
     if not project_data:
         raise HTTPException(status_code=404, detail="项目未找到或未完成解析")
-    
-    return ProjectStructureResponse(
-        tree=project_data["tree"],
-        mermaid_diagram=project_data["mermaid_diagram"]
-    )
+
+    payload = {
+        "tree": project_data["tree"],
+        "mermaid_diagram": project_data["mermaid_diagram"],
+    }
+    etag = _compute_etag(payload)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    return ProjectStructureResponse(**payload)
 
 
 @api_router.post("/chat/generate", response_model=ScriptResponse)
@@ -149,8 +247,22 @@ async def generate_script(request: GenerateScriptRequest):
     """
     输入业务场景关键词，获取拟人化群聊剧本
     """
-    # 调用服务层生成剧本
-    script = await script_service.generate_chat_script(request.scenario, request.task_id)
+    # 调用服务层生成剧本（先查精确缓存，再查同一项目下的语义缓存）
+    cache_key = build_cache_key(
+        "chat_generate", f"{request.task_id}\n{normalize_text(request.scenario)}"
+    )
+    script = await response_cache.cached(
+        cache_key,
+        lambda: semantic_cache_service.get_or_compute(
+            namespace="chat_script",
+            text=request.scenario,
+            compute=lambda: script_service.generate_chat_script(
+                request.scenario, request.task_id
+            ),
+            scope=request.task_id,
+        ),
+        ttl_seconds=settings.SCRIPT_CACHE_TTL_SECONDS,
+    )
     
     return ScriptResponse(
         scenario=script["scenario"],
@@ -164,8 +276,13 @@ async def explain_term(code_snippet: str):
     """
     传入代码片段，返回小白版的术语解释
     """
-    # 调用服务层解释术语
-    explanation = await explain_service.explain_term(code_snippet)
+    # 调用服务层解释术语（只走精确缓存：相似度高的代码片段含义可能完全不同，
+    # 如 useState 与 useEffect，不能复用彼此的解释）
+    explanation = await response_cache.cached(
+        build_cache_key("explain_term", normalize_code(code_snippet)),
+        lambda: explain_service.explain_term(code_snippet),
+        ttl_seconds=settings.EXPLAIN_CACHE_TTL_SECONDS,
+    )
     
     return ExplainTermResponse(
         term=explanation["term"],
@@ -174,21 +291,89 @@ async def explain_term(code_snippet: str):
     )
 
 
-@api_router.get("/task/status")
+@api_router.get("/task/status", deprecated=True)
 async def get_task_status(task_id: str):
     """
-    获取任务解析状态
+    获取任务解析状态（已废弃，请改用 /task/{task_id}/events 订阅进度）
     """
     # 调用服务层获取任务状态
     task_info = project_service.get_task_status(task_id)
     
     return task_info
 
+def _format_sse_event(event: str, payload: dict) -> bytes:
+    """按 text/event-stream 格式编码一条事件"""
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + orjson.dumps(payload) + b"\n\n"
+
+
+def _warm_architecture_visualization(task_id: str) -> None:
+    """
+    任务完成后在后台预生成架构可视化数据（需开启 ARCHITECTURE_PREWARM_ENABLED）。
+    并发订阅者触发时由响应缓存合并为一次生成，随后的详情请求直接命中缓存。
+    """
+    if not settings.ARCHITECTURE_PREWARM_ENABLED:
+        return
+
+    async def warm() -> None:
+        try:
+            await _load_architecture_visualization(task_id)
+        except Exception as error:
+            logger.warning("预生成架构可视化数据失败: %s", str(error))
+
+    task = asyncio.create_task(warm())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+@api_router.get("/task/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """
+    以 Server-Sent Events 推送任务解析进度，任务进入终态（completed/failed）后结束。
+    """
+    # 先订阅再读取快照，避免两者之间的进度更新丢失
+    queue = project_service.subscribe(task_id)
+    snapshot = project_service.get_task_status(task_id)
+    if snapshot["status"] == "not_found":
+        project_service.unsubscribe(task_id, queue)
+        raise HTTPException(status_code=404, detail="任务不存在，请先上传代码文件")
+
+    async def event_stream():
+        try:
+            status = snapshot
+            yield _format_sse_event("progress", status)
+
+            while status["status"] not in TERMINAL_TASK_STATUSES:
+                try:
+                    status = await asyncio.wait_for(
+                        queue.get(), timeout=SSE_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield b": heartbeat\n\n"
+                    continue
+                yield _format_sse_event("progress", status)
+
+            if status["status"] == "completed":
+                _warm_architecture_visualization(task_id)
+        finally:
+            project_service.unsubscribe(task_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @api_router.get("/architecture/visualization", response_model=ArchitectureVisualizationResponse)
-async def get_architecture_visualization(task_id: str):
+async def get_architecture_visualization(
+    task_id: str, request: Request, response: Response
+):
     """
     获取架构可视化数据（分层、场景、术语）。
     需要项目解析完成后才能调用，否则返回 404。
+    支持 ETag 条件请求，数据未变化时返回 304。
     """
     # 先检查任务状态
     task_status = project_service.get_task_status(task_id)
@@ -203,9 +388,7 @@ async def get_architecture_visualization(task_id: str):
         )
 
     try:
-        visualization = await architecture_service.generate_architecture_visualization(
-            task_id
-        )
+        visualization = await _load_architecture_visualization(task_id)
     except ValueError as validation_error:
         raise HTTPException(status_code=404, detail=str(validation_error))
     except LLMError as llm_error:
@@ -215,25 +398,41 @@ async def get_architecture_visualization(task_id: str):
             detail="AI 大模型调用失败，请检查 API Key 配置后重试",
         )
 
-    return ArchitectureVisualizationResponse(
-        layers=visualization["layers"],
-        scenarios=visualization["scenarios"],
-        techTerms=visualization["techTerms"],
-    )
+    payload = {
+        "layers": visualization["layers"],
+        "scenarios": visualization["scenarios"],
+        "techTerms": visualization["techTerms"],
+    }
+    etag = _compute_etag(payload)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
 
+    return ArchitectureVisualizationResponse(**payload)
 
-@api_router.get("/project/{task_id}", response_model=ProjectDetailsResponse)
+
+@api_router.get(
+    "/project/{task_id}",
+    response_model=ProjectDetailsResponse | TaskProgressResponse,
+)
 async def get_project_details(task_id: str):
     """
     获取项目的聚合详情数据，包括结构、架构、群聊剧本和术语词典。
-    解析未完成时返回当前进度，解析完成后返回完整数据。
+    解析未完成时只返回精简的进度信息，解析完成后返回完整数据。
     """
     task_status = project_service.get_task_status(task_id)
 
     if task_status["status"] == "not_found":
         raise HTTPException(status_code=404, detail="任务不存在，请先上传代码文件")
 
-    # 基础响应（解析中或失败时也能返回进度信息）
+    if task_status["status"] != "completed":
+        # 轮询进度是最常见的调用，直接返回，不读取任务数据
+        return TaskProgressResponse(
+            taskId=task_id,
+            status=task_status["status"],
+            progress=task_status.get("progress", 0),
+        )
+
     response_data: dict = {
         "taskId": task_id,
         "fileName": "",
@@ -250,10 +449,7 @@ async def get_project_details(task_id: str):
     file_list = task_data.get("file_list", [])
     response_data["fileName"] = file_list[0] if file_list else "未知项目"
 
-    if task_status["status"] != "completed":
-        return ProjectDetailsResponse(**response_data)
-
-    # 解析完成，填充完整数据
+    # 解析完成：项目数据是内存读取，直接获取；架构可视化可能需要调用 LLM
     project_data = project_service.get_project_data(task_id)
     if project_data:
         response_data["structure"] = project_data.get("tree")
@@ -261,56 +457,48 @@ async def get_project_details(task_id: str):
             "mermaidCode": project_data.get("mermaid_diagram", ""),
         }
 
-    # 获取架构可视化数据（包含群聊剧本和术语词典）
+    # 架构可视化数据（包含群聊剧本和术语词典）失败时只记录日志
     try:
-        visualization = await architecture_service.generate_architecture_visualization(
-            task_id
-        )
-        # 取第一个场景作为默认群聊剧本
-        scenarios = visualization.get("scenarios", [])
-        if scenarios:
-            first_scenario = scenarios[0]
-            response_data["chatScript"] = {
-                "scenario": first_scenario.get("title", ""),
-                "characters": first_scenario.get("characters", []),
-                "dialogues": first_scenario.get("messages", []),
-            }
-
-        # 术语词典
-        tech_terms = visualization.get("techTerms", [])
-        if tech_terms:
-            response_data["termDictionary"] = [
-                {
-                    "term": term.get("term", ""),
-                    "laymanExplanation": term.get("plainExplanation", ""),
-                    "technicalExplanation": term.get("description", ""),
-                    "examples": term.get("examples", []),
-                }
-                for term in tech_terms
-            ]
+        visualization = await _load_architecture_visualization(task_id)
     except (ValueError, LLMError) as error:
         logger.warning("架构可视化数据获取失败: %s", str(error))
+        return ProjectDetailsResponse(**response_data)
+
+    # 取第一个场景作为默认群聊剧本
+    scenarios = visualization.get("scenarios", [])
+    if scenarios:
+        first_scenario = scenarios[0]
+        response_data["chatScript"] = {
+            "scenario": first_scenario.get("title", ""),
+            "characters": first_scenario.get("characters", []),
+            "dialogues": first_scenario.get("messages", []),
+        }
+
+    # 术语词典
+    tech_terms = visualization.get("techTerms", [])
+    if tech_terms:
+        response_data["termDictionary"] = [
+            {
+                "term": term.get("term", ""),
+                "laymanExplanation": term.get("plainExplanation", ""),
+                "technicalExplanation": term.get("description", ""),
+                "examples": term.get("examples", []),
+            }
+            for term in tech_terms
+        ]
 
     return ProjectDetailsResponse(**response_data)
 
-@api_router.post("/search/code", response_model=SearchResponse)
-async def search_code(request: SearchCodeRequest):
-    """
-    语义搜索代码片段
-    """
-    # 构建过滤条件
+def _build_search_filters(request: SearchCodeRequest) -> dict | None:
+    """根据搜索请求构建元数据过滤条件"""
     filters = {}
     if request.language:
         filters["language"] = request.language
-    
-    # 调用向量服务进行语义搜索
-    results = await vector_service.search_similar_code(
-        query=request.query,
-        n_results=request.n_results,
-        filters=filters if filters else None
-    )
-    
-    # 格式化结果
+    return filters if filters else None
+
+
+def _format_search_response(query: str, results: list[dict]) -> SearchResponse:
+    """将向量服务的检索结果格式化为响应模型"""
     formatted_results = [
         SearchResult(
             id=result["id"],
@@ -320,17 +508,87 @@ async def search_code(request: SearchCodeRequest):
         )
         for result in results
     ]
-    
+
     return SearchResponse(
-        query=request.query,
+        query=query,
         results=formatted_results,
         total=len(formatted_results)
     )
 
+
+@api_router.post("/search/code", response_model=SearchResponse)
+async def search_code(request: SearchCodeRequest):
+    """
+    语义搜索代码片段
+    """
+    # 调用向量服务进行语义搜索
+    results = await vector_service.search_similar_code(
+        query=request.query,
+        n_results=request.n_results,
+        filters=_build_search_filters(request)
+    )
+
+    return _format_search_response(request.query, results)
+
+
+@api_router.post("/search/code/batch", response_model=list[SearchResponse])
+async def search_code_batch(requests: list[SearchCodeRequest]):
+    """
+    批量语义搜索代码片段：结果数量与过滤条件相同的查询合并为一次嵌入调用和一次向量检索
+    """
+    if not requests:
+        return []
+
+    groups: dict[bytes, list[int]] = {}
+    for index, request in enumerate(requests):
+        group_key = orjson.dumps(
+            [request.n_results, _build_search_filters(request)], option=orjson.OPT_SORT_KEYS
+        )
+        groups.setdefault(group_key, []).append(index)
+
+    async def search_group(indices: list[int]) -> list[list[dict]]:
+        first = requests[indices[0]]
+        return await vector_service.search_similar_code_batch(
+            [requests[index].query for index in indices],
+            n_results=first.n_results,
+            filters=_build_search_filters(first)
+        )
+
+    group_results = await asyncio.gather(*(search_group(indices) for indices in groups.values()))
+
+    results_list: list[list[dict]] = [[] for _ in requests]
+    for indices, results in zip(groups.values(), group_results):
+        for index, items in zip(indices, results):
+            results_list[index] = items
+
+    return [
+        _format_search_response(request.query, results)
+        for request, results in zip(requests, results_list)
+    ]
+
 @api_router.get("/database/stats")
 async def get_database_stats():
     """
     获取向量数据库统计信息
     """
     stats = await vector_service.get_collection_stats()
-    return stats
\ No newline at end of file
+    return stats
+
+# 在导入阶段完成所有请求 / 响应模型的 schema 构建，避免首个请求承担冷启动开销
+for _model in (
+    GenerateScriptRequest,
+    ExplainTermRequest,
+    UploadResponse,
+    ProjectStructureResponse,
+    ScriptResponse,
+    ExplainTermResponse,
+    ArchitectureVisualizationResponse,
+    ProjectDetailsResponse,
+    TaskProgressResponse,
+    SearchCodeRequest,
+    SearchResult,
+    SearchResponse,
+    HistoryItemResponse,
+    HistoryListResponse,
+):
+    _model.model_rebuild()
@@ -0,0 +1,235 @@
+"""
+精确匹配响应缓存
+以规范化后输入的 SHA-256 作为 key，命中时直接返回之前的 LLM 结果。
+配置 REDIS_URL 时使用 Redis（多进程共享），否则退化为进程内 TTL 字典（LRU 限制条目数）；
+配置持久化存储时额外写入 SQLite，重启后仍可命中。
+同一 key 的并发未命中请求会合并为一次计算（single-flight），避免轮询风暴重复调用 LLM。
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import orjson
+
+from app.core.config import settings
+from app.core.persistent_cache import PersistentCacheStore
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 多进程部署时计算锁的过期时间，以及等待其他进程结果的轮询间隔
+LOCK_TTL_SECONDS = 120
+LOCK_POLL_INTERVAL_SECONDS = 0.5
+# 未配置 Redis 时进程内缓存的最大条目数（LRU 淘汰）
+MEMORY_CACHE_SIZE = 1024
+
+
+def normalize_text(text: str) -> str:
+    """转小写并折叠连续空白"""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def normalize_code(code: str) -> str:
+    """
+    只折叠连续空白，使仅缩进/换行不同的片段命中同一 key。
+    不去注释、不转小写：// 和 # 在很多语言里也是运算符或字符串内容（如 a // b），
+    大小写也区分标识符，改写它们会让含义不同的代码共用缓存结果
+    """
+    return _WHITESPACE_RE.sub(" ", code).strip()
+
+
+def build_cache_key(route: str, normalized_payload: str) -> str:
+    """生成形如 route:sha256 的缓存 key"""
+    digest = hashlib.sha256(normalized_payload.encode("utf-8")).hexdigest()
+    return f"{route}:{digest}"
+
+
+class ResponseCache:
+    """精确匹配缓存，Redis 不可用时使用进程内存"""
+
+    def __init__(self, db_path: Optional[str] = None) -> None:
+        self._persistent = (
+            PersistentCacheStore(db_path, model=settings.MODEL_NAME) if db_path else None
+        )
+        self._redis = None
+        self._redis_checked = False
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # cached() 的命中 / 未命中次数，便于观察缓存效果
+        self.hits = 0
+        self.misses = 0
+
+    def _get_redis(self):
+        """延迟创建 Redis 客户端；未配置或依赖缺失时返回 None"""
+        if self._redis_checked:
+            return self._redis
+
+        self._redis_checked = True
+        if not settings.REDIS_URL:
+            return None
+
+        try:
+            from redis import asyncio as redis_asyncio
+
+            self._redis = redis_asyncio.from_url(settings.REDIS_URL)
+            logger.info("响应缓存使用 Redis: %s", settings.REDIS_URL)
+        except ImportError:
+            logger.warning("未安装 redis 依赖，响应缓存降级为进程内存")
+        return self._redis
+
+    async def get(self, key: str) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            try:
+                raw = await redis_client.get(key)
+                if raw is not None:
+                    return orjson.loads(raw)
+            except Exception as error:
+                logger.warning("Redis 读取失败: %s", str(error))
+        else:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, raw = entry
+                if expires_at >= time.time():
+                    self._memory.move_to_end(key)
+                    return orjson.loads(raw)
+                self._memory.pop(key, None)
+
+        return await self._get_persistent(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        """写入缓存并设置过期时间"""
+        # 与 json.dumps 一致地把非字符串 key 转为字符串；持久层按 str 存储
+        raw = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+        redis_client = self._get_redis()
+        if redis_client is not None:
+            try:
+                await redis_client.setex(key, ttl_seconds, raw)
+            except Exception as error:
+                logger.warning("Redis 写入失败: %s", str(error))
+        else:
+            self._memory[key] = (time.time() + ttl_seconds, raw)
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_CACHE_SIZE:
+                self._memory.popitem(last=False)
+
+        if self._persistent is not None:
+            try:
+                await asyncio.to_thread(self._persistent.set, key, raw, ttl_seconds)
+            except Exception as error:
+                logger.warning("持久化缓存写入失败: %s", str(error))
+
+    async def _get_persistent(self, key: str) -> Optional[Any]:
+        """从 SQLite 读取；命中时不回填易失层，剩余有效期以持久层为准"""
+        if self._persistent is None:
+            return None
+        try:
+            raw = await asyncio.to_thread(self._persistent.get, key)
+        except Exception as error:
+            logger.warning("持久化缓存读取失败: %s", str(error))
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    async def cached(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: int,
+        should_cache: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """
+        命中则返回缓存值，否则执行 compute 并写回缓存。
+        同一 key 的并发请求只有第一个会真正执行 compute，其余等待其结果。
+
+        Args:
+            key: 缓存 key（见 build_cache_key）
+            compute: 未命中时执行的协程工厂
+            ttl_seconds: 过期时间（秒）
+            should_cache: 判断计算结果是否写入缓存（如降级结果不缓存），为空时总是写入
+
+        Returns:
+            缓存值或新计算的结果
+        """
+        cached_value = await self.get(key)
+        if cached_value is not None:
+            self.hits += 1
+            logger.info("命中响应缓存: %s", key.split(":", 1)[0])
+            return cached_value
+        self.misses += 1
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            logger.info("合并并发请求: %s", key.split(":", 1)[0])
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._compute_with_lock(key, compute, ttl_seconds, should_cache)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _compute_with_lock(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl_seconds: int,
+        should_cache: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """计算并写回缓存；使用 Redis 时通过 SET NX 锁保证多进程间也只计算一次"""
+        redis_client = self._get_redis()
+        lock_key = f"{key}:lock"
+        lock_acquired = False
+
+        if redis_client is not None:
+            try:
+                lock_acquired = bool(
+                    await redis_client.set(lock_key, "1", nx=True, ex=LOCK_TTL_SECONDS)
+                )
+                if not lock_acquired:
+                    value = await self._wait_for_other_worker(redis_client, key, lock_key)
+                    if value is not None:
+                        return value
+            except Exception as error:
+                logger.warning("Redis 计算锁不可用，直接计算: %s", str(error))
+
+        try:
+            value = await compute()
+            if should_cache is None or should_cache(value):
+                await self.set(key, value, ttl_seconds)
+            return value
+        finally:
+            if lock_acquired:
+                try:
+                    await redis_client.delete(lock_key)
+                except Exception as error:
+                    logger.warning("Redis 计算锁释放失败: %s", str(error))
+
+    async def _wait_for_other_worker(
+        self, redis_client: Any, key: str, lock_key: str
+    ) -> Optional[Any]:
+        """等待持有锁的进程写入结果；锁释放仍无结果时返回 None 由调用方自行计算"""
+        while await redis_client.exists(lock_key):
+            await asyncio.sleep(LOCK_POLL_INTERVAL_SECONDS)
+        return await self.get(key)
+
+
+response_cache = ResponseCache(db_path=settings.LLM_CACHE_DB_PATH)
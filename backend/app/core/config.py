@@ -2,8 +2,10 @@
 应用配置
 从 .env 文件或环境变量读取配置项。
 """
+from functools import cached_property
+from typing import Tuple
+
 from pydantic_settings import BaseSettings
-from typing import List
 
 
 class Settings(BaseSettings):
@@ -13,26 +15,73 @@ class Settings(BaseSettings):
     API_KEY: str = ""
     API_BASE: str = "https://api.openai.com/v1"
     MODEL_NAME: str = "gpt-4"
+    # 为 system 提示词添加 cache_control 标记（Anthropic 兼容网关需要显式开启提示词缓存）
+    PROMPT_CACHE_CONTROL: bool = False
+    # 架构可视化生成时同时在途的 LLM 请求上限
+    LLM_CONCURRENCY: int = 6
+    # 每分钟最多发起的 LLM 请求数（含重试），0 表示不限流
+    LLM_RPM: int = 60
 
     # 向量数据库配置
     CHROMA_PERSIST_DIR: str = "./chroma_db"
+    # 写入向量库时每批的片段数（过大的单次写入会触发昂贵的序列化与索引重建）
+    VECTOR_ADD_BATCH_SIZE: int = 128
+    # 未配置 API Key 时使用的本地嵌入模型（需安装 sentence-transformers，未安装时退回 Chroma 默认嵌入函数）
+    LOCAL_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    # 新建代码片段集合时的 HNSW 索引参数（已存在的集合沿用创建时的参数）
+    VECTOR_HNSW_SPACE: str = "cosine"
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_CONSTRUCTION_EF: int = 64
+    VECTOR_HNSW_SEARCH_EF: int = 40
+    # 索引每累积多少条写入批量插入一次、多少条写入落盘一次
+    VECTOR_HNSW_BATCH_SIZE: int = 100
+    VECTOR_HNSW_SYNC_THRESHOLD: int = 1000
 
     # 服务器配置
     HOST: str = "0.0.0.0"
     PORT: int = 8000
 
+    # 默认线程池大小（同步的磁盘 / ChromaDB 调用通过 asyncio.to_thread 移出事件循环）
+    THREAD_POOL_MAX_WORKERS: int = 32
+    # CPU 密集任务（代码脱敏）使用的进程池大小，0 表示使用 CPU 核数
+    PROCESS_POOL_MAX_WORKERS: int = 0
+
+    # 性能剖析配置（需安装 requirements-dev.txt 中的 pyinstrument；开启后携带 X-Profile 头的请求返回火焰图）
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_OUTPUT_DIR: str = "./profiles"
+
     # CORS 配置（逗号分隔的来源列表）
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:3003,http://localhost:5173,https://code-visualization-tool.vercel.app"
 
     # 文件上传配置
     MAX_UPLOAD_SIZE_MB: int = 500
 
-    @property
-    def cors_origins_list(self) -> List[str]:
-        """将逗号分隔的 CORS_ORIGINS 字符串转为列表"""
-        return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
+    # 语义缓存配置（相似问题直接复用 LLM 结果）
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+
+    # 精确匹配缓存配置（REDIS_URL 为空时使用进程内存）
+    REDIS_URL: str = ""
+    EXPLAIN_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    SCRIPT_CACHE_TTL_SECONDS: int = 60 * 60
+    ARCHITECTURE_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    PROJECT_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    # 任务解析完成时在后台预生成架构可视化（会额外调用 LLM，默认关闭）
+    ARCHITECTURE_PREWARM_ENABLED: bool = False
+
+    # 持久化 LLM 响应缓存（SQLite 文件路径，留空则不持久化）
+    LLM_CACHE_DB_PATH: str = "./llm_cache.db"
+
+    @cached_property
+    def cors_origins_list(self) -> Tuple[str, ...]:
+        """将逗号分隔的 CORS_ORIGINS 字符串转为元组（首次访问后缓存）"""
+        return tuple(
+            origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()
+        )
 
-    @property
+    @cached_property
     def max_upload_size_bytes(self) -> int:
         """将 MB 转换为字节"""
         return self.MAX_UPLOAD_SIZE_MB * 1024 * 1024
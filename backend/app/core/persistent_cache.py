@@ -0,0 +1,91 @@
+"""
+持久化 LLM 响应缓存
+使用 SQLite（WAL 模式）保存精确匹配缓存，服务重启或重新部署后无需重新调用 LLM。
+所有方法均为同步阻塞调用，调用方应通过 asyncio.to_thread 执行。
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    hash BLOB PRIMARY KEY,
+    response TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    ttl INTEGER NOT NULL
+)
+"""
+
+
+class PersistentCacheStore:
+    """基于 SQLite 的缓存存储，按缓存 key 的 SHA-256 摘要索引"""
+
+    def __init__(self, db_path: str, model: str = "") -> None:
+        self.db_path = db_path
+        self.model = model
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """首次使用时打开数据库并建表"""
+        if self._connection is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            # WAL 模式允许多个进程并发读取
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(_CREATE_TABLE_SQL)
+            # 打开时顺带清理已过期条目，避免数据库无限增长
+            connection.execute(
+                "DELETE FROM llm_cache WHERE created_at + ttl <= ?", (int(time.time()),)
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _hash_key(key: str) -> bytes:
+        return hashlib.sha256(key.encode("utf-8")).digest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取未过期、且由当前模型生成的缓存条目（切换 MODEL_NAME 后旧模型的结果不再命中）
+
+        Args:
+            key: 缓存 key
+
+        Returns:
+            缓存的 JSON 字符串，未命中或已过期返回 None
+        """
+        with self._lock:
+            row = self._get_connection().execute(
+                "SELECT response FROM llm_cache "
+                "WHERE hash = ? AND model = ? AND created_at + ttl > ?",
+                (self._hash_key(key), self.model, int(time.time())),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, raw: str, ttl_seconds: int) -> None:
+        """
+        写入缓存条目（相同 key 覆盖旧条目）
+
+        Args:
+            key: 缓存 key
+            raw: 响应的 JSON 字符串
+            ttl_seconds: 过期时间（秒）
+        """
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (hash, response, model, created_at, ttl) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self._hash_key(key), raw, self.model, int(time.time()), ttl_seconds),
+            )
+            connection.commit()
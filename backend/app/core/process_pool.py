@@ -0,0 +1,54 @@
+"""
+共享进程池
+CPU 密集的任务（如代码脱敏的正则替换）通过 loop.run_in_executor 提交到这里，绕开 GIL 利用多核。
+提交的函数必须是模块级函数，参数和返回值可被 pickle。
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_unavailable = False
+
+
+def _warm_worker() -> None:
+    """子进程启动时预先导入脱敏和摘要提取模块，正则在导入时编译，首个任务无需再等待"""
+    import app.utils.chunker  # noqa: F401
+    import app.utils.sanitizer  # noqa: F401
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    延迟创建共享进程池
+
+    Returns:
+        进程池；当前环境无法创建子进程时返回 None（调用方退回默认线程池）
+    """
+    global _process_pool, _process_pool_unavailable
+    if _process_pool is None and not _process_pool_unavailable:
+        max_workers = settings.PROCESS_POOL_MAX_WORKERS or os.cpu_count() or 1
+        try:
+            # 使用 spawn：服务进程中已有线程（线程池、数据库连接），fork 可能导致死锁
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+            )
+        except (OSError, NotImplementedError) as error:
+            logger.warning("无法创建进程池，退回线程池执行: %s", str(error))
+            _process_pool_unavailable = True
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    """关闭共享进程池（应用关闭时调用）"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
@@ -0,0 +1,82 @@
+"""
+按需性能剖析中间件
+请求携带 X-Profile 头时使用 pyinstrument 采样并直接返回 HTML 火焰图；
+另可按 PROFILING_SAMPLE_RATE 随机采样请求，将报告写入 PROFILING_OUTPUT_DIR 供离线分析。
+注意：BackgroundTasks / asyncio.create_task 中的耗时不会计入发起它的请求。
+"""
+import asyncio
+import logging
+import random
+import time
+import uuid
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 采样间隔（秒）
+PROFILER_INTERVAL_SECONDS = 0.001
+PROFILE_HEADER = "x-profile"
+
+
+def _load_profiler_class():
+    """延迟导入 pyinstrument；未安装时返回 None"""
+    try:
+        from pyinstrument import Profiler
+
+        return Profiler
+    except ImportError:
+        logger.warning("未安装 pyinstrument，跳过性能剖析")
+        return None
+
+
+def _write_profile_report(html: str, path: str) -> None:
+    """将采样报告写入输出目录"""
+    output_dir = Path(settings.PROFILING_OUTPUT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    route_name = path.strip("/").replace("/", "_") or "root"
+    file_name = f"{int(time.time())}_{route_name}_{uuid.uuid4().hex[:8]}.html"
+    (output_dir / file_name).write_text(html, encoding="utf-8")
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    """未命中采样条件的请求直接放行，几乎没有额外开销"""
+
+    async def dispatch(self, request: Request, call_next):
+        profile_requested = PROFILE_HEADER in request.headers
+        sampled = (
+            not profile_requested
+            and settings.PROFILING_SAMPLE_RATE > 0
+            and random.random() < settings.PROFILING_SAMPLE_RATE
+        )
+        if not (profile_requested or sampled):
+            return await call_next(request)
+
+        profiler_class = _load_profiler_class()
+        if profiler_class is None:
+            return await call_next(request)
+
+        profiler = profiler_class(
+            interval=PROFILER_INTERVAL_SECONDS, async_mode="enabled"
+        )
+        profiler.start()
+        try:
+            response = await call_next(request)
+        finally:
+            profiler.stop()
+
+        if profile_requested:
+            return HTMLResponse(profiler.output_html())
+
+        try:
+            await asyncio.to_thread(
+                _write_profile_report, profiler.output_html(), request.url.path
+            )
+        except OSError as error:
+            logger.warning("保存性能剖析报告失败: %s", str(error))
+        return response
@@ -0,0 +1,70 @@
+"""
+提示词前缀缓存统计
+记录单个请求内 LLM 调用命中服务商提示词缓存的 token 数，并通过响应头暴露：
+- X-Prompt-Cache-Hit: 是否有任一调用命中缓存（true/false）
+- X-Prompt-Cached-Tokens: 命中缓存的输入 token 总数
+仅当请求内实际发生了 LLM 调用时才添加响应头。
+"""
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+
+PROMPT_CACHE_HIT_HEADER = "X-Prompt-Cache-Hit"
+PROMPT_CACHED_TOKENS_HEADER = "X-Prompt-Cached-Tokens"
+
+# 请求级统计字典；子任务复制上下文后仍指向同一个字典，可以直接累加
+_prompt_cache_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "prompt_cache_usage", default=None
+)
+
+
+def record_prompt_cache_usage(usage: Optional[Dict[str, Any]]) -> None:
+    """
+    从 LLM 响应的 usage 字段中累加命中缓存的 token 数
+
+    Args:
+        usage: OpenAI（prompt_tokens_details.cached_tokens）或
+            Anthropic 兼容网关（cache_read_input_tokens）返回的 usage 字典
+    """
+    stats = _prompt_cache_usage.get()
+    if stats is None:
+        return
+
+    usage = usage or {}
+    prompt_details = usage.get("prompt_tokens_details") or {}
+    cached_tokens = prompt_details.get("cached_tokens") or usage.get(
+        "cache_read_input_tokens"
+    ) or 0
+
+    stats["llm_calls"] += 1
+    stats["cached_tokens"] += int(cached_tokens)
+
+
+class PromptCacheHeaderMiddleware:
+    """纯 ASGI 中间件，为每个 HTTP 请求建立统计上下文并写入响应头"""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"llm_calls": 0, "cached_tokens": 0}
+        token = _prompt_cache_usage.set(stats)
+
+        async def send_with_headers(message) -> None:
+            if message["type"] == "http.response.start" and stats["llm_calls"]:
+                headers = MutableHeaders(scope=message)
+                headers[PROMPT_CACHE_HIT_HEADER] = (
+                    "true" if stats["cached_tokens"] else "false"
+                )
+                headers[PROMPT_CACHED_TOKENS_HEADER] = str(stats["cached_tokens"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _prompt_cache_usage.reset(token)
@@ -0,0 +1,48 @@
+"""
+异步令牌桶限流器
+用于把并发发起的 LLM 请求平滑到服务商的 RPM 限额以内，避免集中触发 429。
+"""
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    令牌桶：容量为 max_rate，每 time_period 秒匀速补满。
+    支持 `async with limiter:` 用法，令牌不足时按 FIFO 顺序等待。
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60.0) -> None:
+        if max_rate <= 0 or time_period <= 0:
+            raise ValueError("max_rate 和 time_period 必须为正数")
+        self.max_rate = float(max_rate)
+        self.time_period = float(time_period)
+        self._refill_per_second = self.max_rate / self.time_period
+        self._tokens = self.max_rate
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.max_rate,
+            self._tokens + (now - self._updated_at) * self._refill_per_second,
+        )
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        """获取一个令牌，令牌不足时等待补充"""
+        # 持锁等待，保证等待者按到达顺序获得令牌
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._refill_per_second)
+                self._refill()
+            self._tokens -= 1
+
+    async def __aenter__(self) -> "AsyncTokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        return None
@@ -3,14 +3,251 @@
 生成面向外行人的架构分层、服务聊天剧本和技术名词解释。
 遵循 AGENTS.md 的生活化比喻原则。
 """
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import random
+from functools import lru_cache
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 
-from app.services.llm_service import llm_service, LLMError
+from app.core.config import settings
+from app.services.llm_service import llm_service, LLMError, LLMResponseFormatError
 from app.services.project_service import project_service
 
 logger = logging.getLogger(__name__)
 
+# 限制同时在途的 LLM 请求数：多个项目并发生成时避免触发服务商限流（429）
+_LLM_SEM = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+
+# LLM 调用的最大尝试次数与退避基数（秒），退避时间依次约为 0.5s、1s、2s
+LLM_RETRY_ATTEMPTS = 3
+LLM_RETRY_BASE_SECONDS = 0.5
+
+# 架构分层的配色方案（按层级序号循环使用）
+_COLOR_SCHEMES: Tuple[Dict[str, str], ...] = (
+    {
+        "color": "from-blue-400 to-blue-600",
+        "bgColor": "bg-blue-50",
+        "borderColor": "border-blue-200"
+    },
+    {
+        "color": "from-violet-400 to-violet-600",
+        "bgColor": "bg-violet-50",
+        "borderColor": "border-violet-200"
+    },
+    {
+        "color": "from-emerald-400 to-emerald-600",
+        "bgColor": "bg-emerald-50",
+        "borderColor": "border-emerald-200"
+    },
+    {
+        "color": "from-amber-400 to-amber-600",
+        "bgColor": "bg-amber-50",
+        "borderColor": "border-amber-200"
+    },
+    {
+        "color": "from-pink-400 to-pink-600",
+        "bgColor": "bg-pink-50",
+        "borderColor": "border-pink-200"
+    },
+)
+
+# 聊天角色的配色（按角色序号循环使用）
+_CHARACTER_COLORS: Tuple[str, ...] = (
+    "bg-blue-100 text-blue-700 border-blue-300",
+    "bg-purple-100 text-purple-700 border-purple-300",
+    "bg-green-100 text-green-700 border-green-300",
+    "bg-orange-100 text-orange-700 border-orange-300",
+    "bg-pink-100 text-pink-700 border-pink-300",
+    "bg-indigo-100 text-indigo-700 border-indigo-300",
+)
+
+# 架构分层生成的系统提示词
+_SYSTEM_PROMPT_LAYERS = (
+    "你是一个架构师，擅长用大白话解释软件架构。\n"
+    "你的任务是把项目的代码结构，翻译成外行人也能懂的分层架构。\n\n"
+    "规则：\n"
+    "1. 按照典型的三层架构（前端展示层、业务逻辑层、数据存储层）来分层\n"
+    "2. 如果项目比较复杂，可以细分到 4-5 层\n"
+    "3. 每层要有：\n"
+    "   - name: 层级名称（如「前端展示层」）\n"
+    "   - description: 一句话技术描述\n"
+    "   - plainExplanation: 用大白话解释这层是干嘛的（像跟朋友聊天一样）\n"
+    "   - components: 这层包含的主要组件列表\n"
+    "4. 组件要有：\n"
+    "   - name: 组件名称\n"
+    "   - role: 技术角色（如 Controller、Service、Database）\n"
+    "   - description: 技术描述\n"
+    "   - plainExplanation: 用大白话解释这个组件是干嘛的\n"
+    "   - files: 该组件对应的代码文件路径列表（从项目根目录开始的相对路径）\n"
+    "5. 禁止使用技术黑话，必须用生活化类比\n"
+    "6. 返回 JSON 格式的 layers 数组\n\n"
+    "返回格式示例：\n"
+    "[\n"
+    "  {\n"
+    '    "id": "layer-0",\n'
+    '    "name": "前端展示层",\n'
+    '    "description": "用户界面和交互逻辑",\n'
+    '    "plainExplanation": "这一层就像餐厅的大堂，负责接待客人、展示菜单、接收点单。用户直接接触的就是这一层。",\n'
+    '    "color": "from-blue-400 to-blue-600",\n'
+    '    "bgColor": "bg-blue-50",\n'
+    '    "borderColor": "border-blue-200",\n'
+    '    "components": [\n'
+    "      {\n"
+    '        "name": "前端界面",\n'
+    '        "role": "Frontend",\n'
+    '        "description": "用户界面组件",\n'
+    '        "plainExplanation": "就像餐厅的装修和菜单，负责把内容展示给用户看。",\n'
+    '        "files": ["frontend/src/pages/HomePage.tsx", "frontend/src/components/Header.tsx"]\n'
+    "      }\n"
+    "    ]\n"
+    "  }\n"
+    "]"
+)
+
+# 业务场景群聊剧本生成的系统提示词
+_SYSTEM_PROMPT_SCENARIOS = (
+    "你是一个编剧，擅长把代码交互写成有趣的群聊对话。\n"
+    "你的任务是基于项目的代码结构，生成 3-5 个核心业务场景的群聊剧本。\n\n"
+    "规则：\n"
+    "1. 识别项目的核心功能场景（如用户登录、下单、搜索等）\n"
+    "2. 第一个场景必须是最核心的功能\n"
+    "3. 每个场景包含：\n"
+    "   - id: 场景唯一标识\n"
+    "   - title: 场景名称（如「用户付款」）\n"
+    "   - description: 一句话描述这个场景\n"
+    "   - characters: 参与的角色列表\n"
+    "   - messages: 对话消息列表\n"
+    "4. 角色包含：\n"
+    "   - id: 唯一标识\n"
+    "   - name: 角色昵称（如「前端小美」）\n"
+    "   - role: 技术角色（如 Frontend）\n"
+    "   - personality: 性格描述\n"
+    "   - color: 颜色样式（如 bg-blue-100 text-blue-700 border-blue-300）\n"
+    "5. 消息包含：\n"
+    "   - id: 消息唯一标识\n"
+    "   - from: 发送者角色 ID\n"
+    "   - to: 接收者角色 ID\n"
+    "   - content: 消息内容（口语化，像同事在群里传话）\n"
+    "   - codeRef: 对应的代码位置（如 routes.py:45）\n"
+    "6. 对话要反映真实的代码调用流程\n"
+    "7. 语言要口语化、有趣，像朋友聊天\n"
+    "8. 禁止使用技术黑话\n"
+    "9. 返回 JSON 格式的 scenarios 数组\n\n"
+    "返回格式示例：\n"
+    "[\n"
+    "  {\n"
+    '    "id": "scenario-0",\n'
+    '    "title": "用户付款",\n'
+    '    "description": "用户完成支付后，系统更新订单状态",\n'
+    '    "characters": [\n'
+    '      {\n'
+    '        "id": "fe",\n'
+    '        "name": "前端小美",\n'
+    '        "role": "Frontend",\n'
+    '        "personality": "活泼开朗，负责展示界面",\n'
+    '        "color": "bg-blue-100 text-blue-700 border-blue-300"\n'
+    "      }\n"
+    "    ],\n"
+    '    "messages": []\n'
+    "  }\n"
+    "]"
+)
+
+# 技术名词解释生成的系统提示词
+_SYSTEM_PROMPT_TERMS = (
+    "你是一个技术翻译官，擅长把技术术语翻译成大白话。\n"
+    "你的任务是从项目的代码中提取技术术语，并给出生活化解释。\n\n"
+    "规则：\n"
+    "1. 识别项目中使用的关键技术术语（如 API、Database、async、JWT 等）\n"
+    "2. 每个术语包含：\n"
+    "   - id: 唯一标识\n"
+    "   - term: 术语名称\n"
+    "   - plainExplanation: 一句话白话解释\n"
+    "   - analogy: 生活化类比（以「就像...」开头）\n"
+    "   - relatedComponent: 相关的组件（可选）\n"
+    "3. 解释要简短有趣，像跟朋友聊天\n"
+    "4. 禁止使用技术黑话\n"
+    "5. 返回 JSON 格式的 techTerms 数组\n\n"
+    "返回格式示例：\n"
+    "[\n"
+    "  {\n"
+    '    "id": "term-0",\n'
+    '    "term": "API",\n'
+    '    "plainExplanation": "应用程序接口，让不同软件之间可以互相沟通。",\n'
+    '    "analogy": "就像餐厅的服务员，负责传递客人的点单给厨房，再把做好的菜端给客人。",\n'
+    '    "relatedComponent": "后端服务"\n'
+    "  }\n"
+    "]"
+)
+
+# 用户提示词模板（占位符 project_context 为项目上下文描述）
+_USER_PROMPT_LAYERS = (
+    "以下是一个项目的代码结构：\n\n{project_context}\n\n"
+    "请根据以上代码结构，生成这个项目的架构分层信息。"
+)
+
+_USER_PROMPT_SCENARIOS = (
+    "以下是一个项目的代码结构：\n\n{project_context}\n\n"
+    "请根据以上代码结构，识别核心业务场景，并生成对应的群聊剧本。"
+)
+
+_USER_PROMPT_TERMS = (
+    "以下是一个项目的代码结构：\n\n{project_context}\n\n"
+    "请从以上代码中提取关键的技术术语，并给出大白话解释。"
+)
+
+# 项目上下文的字符预算（约 2000 token），按信息量挑选文件直到填满
+MAX_CONTEXT_CHARS = 6000
+
+class FileSummary(NamedTuple):
+    """构建上下文所需的文件摘要字段"""
+
+    file_path: str
+    classes: Tuple[str, ...]
+    functions: Tuple[str, ...]
+    methods: Tuple[str, ...]
+
+    @classmethod
+    def from_dict(cls, summary: Dict[str, Any]) -> "FileSummary":
+        get = summary.get
+        return cls(
+            get("file_path", ""),
+            tuple(get("classes", ())),
+            tuple(get("functions", ())),
+            tuple(get("methods", ())),
+        )
+
+    @property
+    def score(self) -> int:
+        """信息量评分：类权重为 3，函数和方法各为 1"""
+        return len(self.classes) * 3 + len(self.functions) + len(self.methods)
+
+
+# 单个文件的上下文条目：(路径, 类, 函数, 方法)
+ContextEntry = Tuple[str, Tuple[str, ...], Tuple[str, ...], Tuple[str, ...]]
+ContextKey = Tuple[ContextEntry, ...]
+
+
+@lru_cache(maxsize=4096)
+def _render_context_part(entry: ContextEntry) -> str:
+    """拼接单个文件的上下文描述"""
+    file_path, classes, functions, methods = entry
+    part = f"文件：{file_path}"
+    if classes:
+        part += f"\n  类：{', '.join(classes)}"
+    if functions:
+        part += f"\n  函数：{', '.join(functions)}"
+    if methods:
+        part += f"\n  方法：{', '.join(methods)}"
+    return part
+
+
+@lru_cache(maxsize=256)
+def _build_context_cached(key: ContextKey) -> str:
+    """根据文件结构元组拼接项目上下文描述"""
+    return "\n\n".join(_render_context_part(entry) for entry in key)
+
+
 class ArchitectureService:
     """架构可视化服务，生成外行人能看懂的架构解释"""
 
@@ -29,6 +266,10 @@ class ArchitectureService:
         """
         return self._cache.get(task_id)
 
+    def is_cached(self, task_id: str) -> bool:
+        """是否已有完整（不含默认模板）的生成结果在内存缓存中"""
+        return task_id in self._cache
+
     def clear_cache(self, task_id: str) -> None:
         """
         清除指定任务的缓存。
@@ -43,7 +284,8 @@ class ArchitectureService:
     ) -> Dict[str, Any]:
         """
         生成完整的架构可视化数据，包括分层、场景和术语。
-        优先返回缓存结果，避免重复调用 LLM。
+        优先返回缓存结果，避免重复调用 LLM；同一 task_id 的并发调用由路由层
+        response_cache.cached 合并为一次生成。
 
         Args:
             task_id: 项目任务 ID
@@ -51,7 +293,7 @@ class ArchitectureService:
         Returns:
             包含 layers, scenarios, techTerms 的字典
         """
-        # 优先返回缓存
+        # 优先返回缓存（跨重启的持久化由路由层的 response_cache 负责）
         cached = self.get_cached_visualization(task_id)
         if cached is not None:
             logger.info("命中缓存，跳过 LLM 调用: task_id=%s", task_id)
@@ -64,10 +306,20 @@ class ArchitectureService:
         if not project_data:
             raise ValueError("项目未找到或未完成解析")
 
-        # 并行生成三个部分的数据
-        layers_result = await self._generate_layers(file_summaries)
-        scenarios_result = await self._generate_scenarios(file_summaries)
-        terms_result = await self._generate_tech_terms(file_summaries)
+        # 三个部分共用同一份项目上下文，只构建一次
+        project_context = self._build_project_context(file_summaries)
+
+        # 并行生成三个部分的数据（各自内部处理 LLMError 并降级为默认模板，
+        # 单个部分失败不会取消其他部分）
+        (
+            (layers_result, layers_fallback),
+            (scenarios_result, scenarios_fallback),
+            (terms_result, terms_fallback),
+        ) = await asyncio.gather(
+            self._generate_layers(project_context),
+            self._generate_scenarios(project_context),
+            self._generate_tech_terms(project_context),
+        )
 
         result = {
             "layers": layers_result,
@@ -75,80 +327,62 @@ class ArchitectureService:
             "techTerms": terms_result,
         }
 
+        # 含默认模板的结果不写入缓存，下次请求重新尝试生成
+        if layers_fallback or scenarios_fallback or terms_fallback:
+            logger.warning("可视化结果包含默认模板，不写入缓存: task_id=%s", task_id)
+            return result
+
         # 写入缓存
         self._cache[task_id] = result
         logger.info("已缓存可视化结果: task_id=%s", task_id)
 
         return result
 
+    async def _call_llm_with_retry(self, **kwargs: Any) -> Any:
+        """
+        调用 llm_service.generate_json，返回内容不是合法 JSON 时按指数退避（带抖动）重新生成。
+        网络错误、429/5xx 等传输层失败已由 chat_completion 自行重试，这里不再叠加重试，
+        避免一次调用放大成十几次请求并长时间占用并发名额。
+
+        Raises:
+            LLMError: 传输层失败、API Key 未配置，或所有尝试返回的内容均无法解析时
+        """
+        attempts = LLM_RETRY_ATTEMPTS
+
+        for attempt in range(attempts):
+            try:
+                async with _LLM_SEM:
+                    return await llm_service.generate_json(**kwargs)
+            except LLMResponseFormatError as error:
+                if attempt == attempts - 1:
+                    raise
+                delay = LLM_RETRY_BASE_SECONDS * 2 ** attempt + random.random() * 0.1
+                logger.warning(
+                    "LLM 调用失败，%.2f 秒后重试（%d/%d）: %s",
+                    delay, attempt + 1, attempts, str(error),
+                )
+                await asyncio.sleep(delay)
+
     async def _generate_layers(
-        self, file_summaries: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        self, project_context: str
+    ) -> Tuple[List[Dict[str, Any]], bool]:
         """
         生成架构分层信息。
 
         Args:
-            file_summaries: 文件摘要列表
+            project_context: 项目上下文描述（见 _build_project_context）
 
         Returns:
-            层级列表
+            (层级列表, 是否使用了默认模板)
         """
-        system_prompt = (
-            "你是一个架构师，擅长用大白话解释软件架构。\n"
-            "你的任务是把项目的代码结构，翻译成外行人也能懂的分层架构。\n\n"
-            "规则：\n"
-            "1. 按照典型的三层架构（前端展示层、业务逻辑层、数据存储层）来分层\n"
-            "2. 如果项目比较复杂，可以细分到 4-5 层\n"
-            "3. 每层要有：\n"
-            "   - name: 层级名称（如「前端展示层」）\n"
-            "   - description: 一句话技术描述\n"
-            "   - plainExplanation: 用大白话解释这层是干嘛的（像跟朋友聊天一样）\n"
-            "   - components: 这层包含的主要组件列表\n"
-            "4. 组件要有：\n"
-            "   - name: 组件名称\n"
-            "   - role: 技术角色（如 Controller、Service、Database）\n"
-            "   - description: 技术描述\n"
-            "   - plainExplanation: 用大白话解释这个组件是干嘛的\n"
-            "   - files: 该组件对应的代码文件路径列表（从项目根目录开始的相对路径）\n"
-            "5. 禁止使用技术黑话，必须用生活化类比\n"
-            "6. 返回 JSON 格式的 layers 数组\n\n"
-            "返回格式示例：\n"
-            "[\n"
-            "  {\n"
-            '    "id": "layer-0",\n'
-            '    "name": "前端展示层",\n'
-            '    "description": "用户界面和交互逻辑",\n'
-            '    "plainExplanation": "这一层就像餐厅的大堂，负责接待客人、展示菜单、接收点单。用户直接接触的就是这一层。",\n'
-            '    "color": "from-blue-400 to-blue-600",\n'
-            '    "bgColor": "bg-blue-50",\n'
-            '    "borderColor": "border-blue-200",\n'
-            '    "components": [\n'
-            "      {\n"
-            '        "name": "前端界面",\n'
-            '        "role": "Frontend",\n'
-            '        "description": "用户界面组件",\n'
-            '        "plainExplanation": "就像餐厅的装修和菜单，负责把内容展示给用户看。",\n'
-            '        "files": ["frontend/src/pages/HomePage.tsx", "frontend/src/components/Header.tsx"]\n'
-            "      }\n"
-            "    ]\n"
-            "  }\n"
-            "]"
-        )
-
-        # 构建项目上下文
-        project_context = self._build_project_context(file_summaries)
-
-        user_prompt = (
-            f"以下是一个项目的代码结构：\n\n{project_context}\n\n"
-            "请根据以上代码结构，生成这个项目的架构分层信息。"
-        )
+        user_prompt = _USER_PROMPT_LAYERS.format(project_context=project_context)
 
         try:
-            result = await llm_service.generate_json(
-                system_prompt=system_prompt,
+            result = await self._call_llm_with_retry(
+                system_prompt=_SYSTEM_PROMPT_LAYERS,
                 user_prompt=user_prompt,
                 temperature=0.7,
-                max_tokens=8000,
+                max_tokens=3000,
             )
 
             # 确保返回的是列表
@@ -160,86 +394,32 @@ class ArchitectureService:
                 layers = []
 
             # 为每层添加必需的样式字段
-            return self._enrich_layers_with_styles(layers)
+            return self._enrich_layers_with_styles(layers), False
 
         except LLMError as error:
             logger.warning("LLM 分层生成失败，使用默认模板: %s", str(error))
-            return self._generate_default_layers()
+            return self._generate_default_layers(), True
 
     async def _generate_scenarios(
-        self, file_summaries: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        self, project_context: str
+    ) -> Tuple[List[Dict[str, Any]], bool]:
         """
         生成核心业务场景的群聊剧本。
 
         Args:
-            file_summaries: 文件摘要列表
+            project_context: 项目上下文描述（见 _build_project_context）
 
         Returns:
-            场景列表
+            (场景列表, 是否使用了默认模板)
         """
-        system_prompt = (
-            "你是一个编剧，擅长把代码交互写成有趣的群聊对话。\n"
-            "你的任务是基于项目的代码结构，生成 3-5 个核心业务场景的群聊剧本。\n\n"
-            "规则：\n"
-            "1. 识别项目的核心功能场景（如用户登录、下单、搜索等）\n"
-            "2. 第一个场景必须是最核心的功能\n"
-            "3. 每个场景包含：\n"
-            "   - id: 场景唯一标识\n"
-            "   - title: 场景名称（如「用户付款」）\n"
-            "   - description: 一句话描述这个场景\n"
-            "   - characters: 参与的角色列表\n"
-            "   - messages: 对话消息列表\n"
-            "4. 角色包含：\n"
-            "   - id: 唯一标识\n"
-            "   - name: 角色昵称（如「前端小美」）\n"
-            "   - role: 技术角色（如 Frontend）\n"
-            "   - personality: 性格描述\n"
-            "   - color: 颜色样式（如 bg-blue-100 text-blue-700 border-blue-300）\n"
-            "5. 消息包含：\n"
-            "   - id: 消息唯一标识\n"
-            "   - from: 发送者角色 ID\n"
-            "   - to: 接收者角色 ID\n"
-            "   - content: 消息内容（口语化，像同事在群里传话）\n"
-            "   - codeRef: 对应的代码位置（如 routes.py:45）\n"
-            "6. 对话要反映真实的代码调用流程\n"
-            "7. 语言要口语化、有趣，像朋友聊天\n"
-            "8. 禁止使用技术黑话\n"
-            "9. 返回 JSON 格式的 scenarios 数组\n\n"
-            "返回格式示例：\n"
-            "[\n"
-            "  {\n"
-            '    "id": "scenario-0",\n'
-            '    "title": "用户付款",\n'
-            '    "description": "用户完成支付后，系统更新订单状态",\n'
-            '    "characters": [\n'
-            '      {\n'
-            '        "id": "fe",\n'
-            '        "name": "前端小美",\n'
-            '        "role": "Frontend",\n'
-            '        "personality": "活泼开朗，负责展示界面",\n'
-            '        "color": "bg-blue-100 text-blue-700 border-blue-300"\n'
-            "      }\n"
-            "    ],\n"
-            '    "messages": []\n'
-            "  }\n"
-            "]"
-        )
-
-        # 构建项目上下文
-        project_context = self._build_project_context(file_summaries)
-
-        user_prompt = (
-            f"以下是一个项目的代码结构：\n\n{project_context}\n\n"
-            "请根据以上代码结构，识别核心业务场景，并生成对应的群聊剧本。"
-        )
+        user_prompt = _USER_PROMPT_SCENARIOS.format(project_context=project_context)
 
         try:
-            result = await llm_service.generate_json(
-                system_prompt=system_prompt,
+            result = await self._call_llm_with_retry(
+                system_prompt=_SYSTEM_PROMPT_SCENARIOS,
                 user_prompt=user_prompt,
                 temperature=0.8,
-                max_tokens=8000,
+                max_tokens=4000,
             )
 
             # 确保返回的是列表
@@ -251,64 +431,32 @@ class ArchitectureService:
                 scenarios = []
 
             # 为每个场景添加必需的字段
-            return self._enrich_scenarios_with_ids(scenarios)
+            return self._enrich_scenarios_with_ids(scenarios), False
 
         except LLMError as error:
             logger.warning("LLM 场景生成失败，使用默认模板: %s", str(error))
-            return self._generate_default_scenarios()
+            return self._generate_default_scenarios(), True
 
     async def _generate_tech_terms(
-        self, file_summaries: List[Dict[str, Any]]
-    ) -> List[Dict[str, Any]]:
+        self, project_context: str
+    ) -> Tuple[List[Dict[str, Any]], bool]:
         """
         生成技术名词的大白话解释。
 
         Args:
-            file_summaries: 文件摘要列表
+            project_context: 项目上下文描述（见 _build_project_context）
 
         Returns:
-            术语列表
+            (术语列表, 是否使用了默认模板)
         """
-        system_prompt = (
-            "你是一个技术翻译官，擅长把技术术语翻译成大白话。\n"
-            "你的任务是从项目的代码中提取技术术语，并给出生活化解释。\n\n"
-            "规则：\n"
-            "1. 识别项目中使用的关键技术术语（如 API、Database、async、JWT 等）\n"
-            "2. 每个术语包含：\n"
-            "   - id: 唯一标识\n"
-            "   - term: 术语名称\n"
-            "   - plainExplanation: 一句话白话解释\n"
-            "   - analogy: 生活化类比（以「就像...」开头）\n"
-            "   - relatedComponent: 相关的组件（可选）\n"
-            "3. 解释要简短有趣，像跟朋友聊天\n"
-            "4. 禁止使用技术黑话\n"
-            "5. 返回 JSON 格式的 techTerms 数组\n\n"
-            "返回格式示例：\n"
-            "[\n"
-            "  {\n"
-            '    "id": "term-0",\n'
-            '    "term": "API",\n'
-            '    "plainExplanation": "应用程序接口，让不同软件之间可以互相沟通。",\n'
-            '    "analogy": "就像餐厅的服务员，负责传递客人的点单给厨房，再把做好的菜端给客人。",\n'
-            '    "relatedComponent": "后端服务"\n'
-            "  }\n"
-            "]"
-        )
-
-        # 构建项目上下文
-        project_context = self._build_project_context(file_summaries)
-
-        user_prompt = (
-            f"以下是一个项目的代码结构：\n\n{project_context}\n\n"
-            "请从以上代码中提取关键的技术术语，并给出大白话解释。"
-        )
+        user_prompt = _USER_PROMPT_TERMS.format(project_context=project_context)
 
         try:
-            result = await llm_service.generate_json(
-                system_prompt=system_prompt,
+            result = await self._call_llm_with_retry(
+                system_prompt=_SYSTEM_PROMPT_TERMS,
                 user_prompt=user_prompt,
                 temperature=0.6,
-                max_tokens=8000,
+                max_tokens=2000,
             )
 
             # 确保返回的是列表
@@ -320,131 +468,91 @@ class ArchitectureService:
                 terms = []
 
             # 为每个术语添加必需的字段
-            return self._enrich_terms_with_ids(terms)
+            return self._enrich_terms_with_ids(terms), False
 
         except LLMError as error:
             logger.warning("LLM 术语生成失败，使用默认模板: %s", str(error))
-            return self._generate_default_terms()
+            return self._generate_default_terms(), True
 
     def _build_project_context(
         self, file_summaries: List[Dict[str, Any]]
     ) -> str:
-        """构建项目上下文描述"""
+        """
+        在字符预算内挑选信息量最高的文件，构建项目上下文描述。
+        相同的文件结构直接复用已构建的字符串。
+        """
         if not file_summaries:
             return "这是一个空项目。"
 
-        context_parts: List[str] = []
-        
-        # 只取前 20 个文件，避免 token 过多
-        for summary in file_summaries[:20]:
-            file_path = summary.get("file_path", "")
-            classes = summary.get("classes", [])
-            functions = summary.get("functions", [])
-            methods = summary.get("methods", [])
-            
-            part = f"文件：{file_path}"
-            if classes:
-                part += f"\n  类：{', '.join(classes)}"
-            if functions:
-                part += f"\n  函数：{', '.join(functions[:8])}"
-            if methods:
-                part += f"\n  方法：{', '.join(methods[:8])}"
-            
-            context_parts.append(part)
-
-        return "\n\n".join(context_parts)
+        # 一次性转为轻量的 FileSummary，后续排序和拼接不再逐个 dict.get
+        summaries = [FileSummary.from_dict(summary) for summary in file_summaries]
+        entries: List[ContextEntry] = [
+            (file_path, classes, functions[:8], methods[:8])
+            for file_path, classes, functions, methods in summaries
+        ]
+
+        # 按信息量（类权重更高）从高到低挑选文件，直到用完字符预算
+        ranked = sorted(
+            range(len(summaries)), key=lambda index: -summaries[index].score
+        )
+        selected: List[int] = []
+        used_chars = 0
+        for index in ranked:
+            part_chars = len(_render_context_part(entries[index])) + 2
+            if selected and used_chars + part_chars > MAX_CONTEXT_CHARS:
+                continue
+            selected.append(index)
+            used_chars += part_chars
+
+        # 入选文件保持原有顺序，输出稳定
+        selected.sort()
+        return _build_context_cached(tuple(entries[index] for index in selected))
 
     def _enrich_layers_with_styles(
         self, layers: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """为层级添加样式字段"""
-        color_schemes = [
-            {
-                "color": "from-blue-400 to-blue-600",
-                "bgColor": "bg-blue-50",
-                "borderColor": "border-blue-200"
-            },
-            {
-                "color": "from-violet-400 to-violet-600",
-                "bgColor": "bg-violet-50",
-                "borderColor": "border-violet-200"
-            },
-            {
-                "color": "from-emerald-400 to-emerald-600",
-                "bgColor": "bg-emerald-50",
-                "borderColor": "border-emerald-200"
-            },
-            {
-                "color": "from-amber-400 to-amber-600",
-                "bgColor": "bg-amber-50",
-                "borderColor": "border-amber-200"
-            },
-            {
-                "color": "from-pink-400 to-pink-600",
-                "bgColor": "bg-pink-50",
-                "borderColor": "border-pink-200"
-            },
-        ]
-
-        return [
-            {
-                **layer,
-                "id": layer.get("id", f"layer-{index}"),
-                "color": layer.get("color", color_schemes[index % len(color_schemes)]["color"]),
-                "bgColor": layer.get("bgColor", color_schemes[index % len(color_schemes)]["bgColor"]),
-                "borderColor": layer.get("borderColor", color_schemes[index % len(color_schemes)]["borderColor"]),
-                "components": layer.get("components", []),
-            }
-            for index, layer in enumerate(layers)
-        ]
+        # 原地补全缺失字段，避免为每层复制整个字典
+        scheme_count = len(_COLOR_SCHEMES)
+        for index, layer in enumerate(layers):
+            scheme = _COLOR_SCHEMES[index % scheme_count]
+            layer.setdefault("id", f"layer-{index}")
+            layer.setdefault("color", scheme["color"])
+            layer.setdefault("bgColor", scheme["bgColor"])
+            layer.setdefault("borderColor", scheme["borderColor"])
+            layer.setdefault("components", [])
+
+        return layers
 
     def _enrich_scenarios_with_ids(
         self, scenarios: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """为场景添加必需的字段"""
-        character_colors = [
-            "bg-blue-100 text-blue-700 border-blue-300",
-            "bg-purple-100 text-purple-700 border-purple-300",
-            "bg-green-100 text-green-700 border-green-300",
-            "bg-orange-100 text-orange-700 border-orange-300",
-            "bg-pink-100 text-pink-700 border-pink-300",
-            "bg-indigo-100 text-indigo-700 border-indigo-300",
-        ]
+        # 原地补全缺失字段，避免为每个场景、角色和消息复制字典
+        color_count = len(_CHARACTER_COLORS)
+        for index, scenario in enumerate(scenarios):
+            # 场景 ID 每个场景只确定一次，角色和消息只在缺少 ID 时才拼接
+            scenario_id = scenario.setdefault("id", f"scenario-{index}")
 
-        return [
-            {
-                **scenario,
-                "id": scenario.get("id", f"scenario-{index}"),
-                "characters": [
-                    {
-                        **char,
-                        "id": char.get("id", f"char-{scenario.get('id', index)}-{charIdx}"),
-                        "color": char.get("color", character_colors[charIdx % len(character_colors)]),
-                    }
-                    for charIdx, char in enumerate(scenario.get("characters", []))
-                ],
-                "messages": [
-                    {
-                        **msg,
-                        "id": msg.get("id", f"msg-{scenario.get('id', index)}-{msgIdx}"),
-                    }
-                    for msgIdx, msg in enumerate(scenario.get("messages", []))
-                ],
-            }
-            for index, scenario in enumerate(scenarios)
-        ]
+            for char_index, char in enumerate(scenario.setdefault("characters", [])):
+                if "id" not in char:
+                    char["id"] = f"char-{scenario_id}-{char_index}"
+                char.setdefault("color", _CHARACTER_COLORS[char_index % color_count])
+
+            for msg_index, msg in enumerate(scenario.setdefault("messages", [])):
+                if "id" not in msg:
+                    msg["id"] = f"msg-{scenario_id}-{msg_index}"
+
+        return scenarios
 
     def _enrich_terms_with_ids(
         self, terms: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """为术语添加必需的字段"""
-        return [
-            {
-                **term,
-                "id": term.get("id", f"term-{index}"),
-            }
-            for index, term in enumerate(terms)
-        ]
+        for index, term in enumerate(terms):
+            term.setdefault("id", f"term-{index}")
+
+        return terms
 
     def _generate_default_layers(self) -> List[Dict[str, Any]]:
         """生成默认的分层结构"""
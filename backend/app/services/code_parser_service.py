@@ -2,22 +2,86 @@
 代码解析服务
 遍历项目文件，提取核心代码，调用 LLM 生成生活化比喻摘要，存储为 JSON
 """
-import json
+import asyncio
+import hashlib
 import logging
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+import orjson
 
 from app.utils.chunker import (
     scan_project_files,
-    is_code_file,
-    should_skip_path,
+    is_code_name,
+)
+from app.utils.sanitizer import (
+    PREVIEW_MAX_CHARS,
+    PREVIEW_READ_CHARS,
+    sanitize_file_head,
 )
-from app.utils.sanitizer import sanitize_file_content
+from app.core.process_pool import get_process_pool
 from app.services.llm_service import llm_service, LLMError
 from app.services.vector_service import vector_service
 
 logger = logging.getLogger(__name__)
 
+# 并发读取文件的上限，避免大项目耗尽文件描述符
+SANITIZE_CONCURRENCY = 16
+# 并发生成文件摘要的 LLM 请求上限，以及每个请求包含的文件数
+SUMMARY_CONCURRENCY = 8
+SUMMARY_BATCH_SIZE = 5
+# 缺少结构信息（类 / 函数 / 方法）时，提示词中附带的代码预览长度
+PROMPT_PREVIEW_CHARS = 300
+
+# 不参与摘要的非核心文件类型：配置、文档、样式、模板
+_NON_CORE_EXTENSIONS = frozenset({
+    ".json", ".yml", ".yaml", ".toml", ".ini", ".cfg", ".xml",
+    ".md", ".txt", ".rst",
+    ".css", ".scss", ".less", ".sass",
+    ".html", ".htm",
+})
+
+def _content_digest(file_info: Dict[str, Any]) -> Any:
+    """
+    计算文件内容的去重 key：脱敏预览与结构信息相同的文件视为重复
+
+    Returns:
+        摘要字节串；没有预览内容的文件返回其路径，不参与去重
+    """
+    preview = file_info.get("sanitized_preview", "")
+    if not preview:
+        return file_info["file_path"]
+    digest = hashlib.blake2b(preview.encode("utf-8"), digest_size=16)
+    for field in ("classes", "functions", "methods"):
+        digest.update("\0".join(file_info.get(field, [])).encode("utf-8") + b"\1")
+    return digest.digest()
+
+
+# 生活化摘要的系统提示词（常量，避免每批请求重复构建）
+_SYSTEM_PROMPT_LIFESTYLE = (
+    "你是一个代码翻译官，专门把代码功能翻译成小白也能听懂的大白话。\n\n"
+    "规则：\n"
+    "1. 禁止使用技术黑话，必须转化为生活化类比\n"
+    "2. 每个文件用 1 句话概括其核心功能\n"
+    "3. 使用比喻手法，让非技术人员也能秒懂\n"
+    "4. 常用比喻参考：\n"
+    "   - 数据库 = 档案室\n"
+    "   - API = 传声筒\n"
+    "   - Controller = 前台接待\n"
+    "   - Service = 业务部主管\n"
+    "   - Model = 数据模型\n"
+    "   - Utils = 工具箱\n"
+    "   - Config = 说明书\n\n"
+    "5. 必须返回合法的 JSON 格式，key 是文件路径，value 是生活化比喻摘要\n"
+    "6. 不要使用 markdown 代码块标记\n\n"
+    "示例输出：\n"
+    "{\n"
+    '  "src/auth/login.py": "这是保安大叔的工作手册，负责检查每个来访者的身份证和通行证",\n'
+    '  "src/user/model.py": "这是访客登记表，记录每个来访者的基本信息和联系方式",\n'
+    '  "src/api/routes.py": "这是前台接待台，负责把来访者的请求转达给相应的部门"\n'
+    "}\n"
+)
+
 
 class CodeParserService:
     """代码解析服务，负责提取核心代码并生成生活化比喻摘要"""
@@ -42,7 +106,9 @@ class CodeParserService:
 
         # Step 1: 扫描项目文件，提取核心代码
         logger.info("Step 1: 扫描项目文件...")
-        file_summaries = scan_project_files(project_dir)
+        file_summaries = await asyncio.to_thread(
+            scan_project_files, project_dir, get_process_pool()
+        )
 
         # 过滤出核心代码文件（忽略配置文件、依赖包）
         core_code_files = self._filter_core_code_files(file_summaries)
@@ -50,15 +116,27 @@ class CodeParserService:
 
         # Step 2: 对核心代码进行脱敏处理
         logger.info("Step 2: 对代码进行脱敏处理...")
-        sanitized_files = self._sanitize_code_files(
+        sanitized_files = await self._sanitize_code_files(
             project_dir, core_code_files
         )
 
+        # Step 5 与 Step 3 并行：向量入库只依赖脱敏结果，不必等待 LLM 摘要
+        store_task = None
+        if self.enable_vector_storage:
+            logger.info("Step 5: 存储代码片段到向量数据库（与摘要生成并行）...")
+            store_task = asyncio.create_task(
+                self._store_to_vector_database(sanitized_files)
+            )
+
         # Step 3: 调用 LLM 生成生活化比喻摘要
         logger.info("Step 3: 调用 LLM 生成生活化比喻摘要...")
-        files_with_summaries = await self._generate_lifestyle_summaries(
-            sanitized_files
-        )
+        try:
+            files_with_summaries = await self._generate_lifestyle_summaries(
+                sanitized_files
+            )
+        finally:
+            if store_task is not None:
+                await store_task
 
         # Step 4: 将摘要存储为 JSON 格式
         logger.info("Step 4: 格式化摘要数据...")
@@ -69,11 +147,6 @@ class CodeParserService:
             "file_summaries": files_with_summaries,
         }
 
-        # Step 5: 将代码片段存储到向量数据库（如果启用）
-        if self.enable_vector_storage:
-            logger.info("Step 5: 存储代码片段到向量数据库...")
-            await self._store_to_vector_database(sanitized_files)
-
         logger.info("项目解析完成")
         return result
 
@@ -93,45 +166,32 @@ class CodeParserService:
 
         for summary in file_summaries:
             file_name = summary.get("file_name", "")
-            file_path = summary.get("file_path", "")
-            extension = summary.get("extension", "")
 
-            # 跳过配置文件
-            if extension in {".json", ".yml", ".yaml", ".toml", ".ini", ".cfg", ".xml"}:
+            # 跳过配置、文档、样式和模板文件
+            if summary.get("extension", "") in _NON_CORE_EXTENSIONS:
                 continue
 
-            # 跳过文档文件
-            if extension in {".md", ".txt", ".rst"}:
+            # 只保留源代码文件，并跳过测试文件
+            if not is_code_name(file_name):
                 continue
-
-            # 跳过样式文件
-            if extension in {".css", ".scss", ".less", ".sass"}:
+            name_lower = file_name.lower()
+            if "test" in name_lower or "spec" in name_lower:
                 continue
 
-            # 跳过模板文件
-            if extension in {".html", ".htm"}:
+            # 跳过超大文件
+            if summary.get("is_large", False):
+                logger.info("跳过大文件: %s", summary.get("file_path", ""))
                 continue
 
-            # 只保留源代码文件
-            if is_code_file(Path(file_name)):
-                # 跳过测试文件
-                if "test" in file_name.lower() or "spec" in file_name.lower():
-                    continue
-
-                # 跳过超大文件
-                if summary.get("is_large", False):
-                    logger.info("跳过大文件: %s", file_path)
-                    continue
-
-                core_files.append(summary)
+            core_files.append(summary)
 
         return core_files
 
-    def _sanitize_code_files(
+    async def _sanitize_code_files(
         self, project_dir: str, file_summaries: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
         """
-        对代码文件进行脱敏处理
+        对代码文件进行脱敏处理（在进程池中并发读取和脱敏）
 
         Args:
             project_dir: 项目根目录
@@ -141,31 +201,34 @@ class CodeParserService:
             包含脱敏后代码预览的文件列表
         """
         root_path = Path(project_dir)
-        sanitized_files = []
+        semaphore = asyncio.Semaphore(SANITIZE_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        # 脱敏是 CPU 密集的正则替换，放到进程池中利用多核；进程池不可用时退回默认线程池
+        executor = get_process_pool()
 
-        for summary in file_summaries:
+        async def sanitize_bounded(summary: Dict[str, Any]) -> Dict[str, Any]:
             file_path = root_path / summary["file_path"]
+            async with semaphore:
+                try:
+                    preview = await loop.run_in_executor(
+                        executor,
+                        sanitize_file_head,
+                        str(file_path),
+                        summary["file_path"],
+                        PREVIEW_READ_CHARS,
+                        PREVIEW_MAX_CHARS,
+                    )
+                except OSError as error:
+                    logger.warning("读取文件失败: %s, 错误: %s", file_path, error)
+                    preview = ""
 
-            if not file_path.exists() or not file_path.is_file():
-                sanitized_files.append(summary)
-                continue
-
-            try:
-                content = file_path.read_text(encoding="utf-8", errors="ignore")
-                sanitized_content = sanitize_file_content(
-                    summary["file_path"], content
-                )
-
-                # 只保留前 3000 字符用于 LLM 处理
-                summary["sanitized_preview"] = sanitized_content[:3000]
-                sanitized_files.append(summary)
-
-            except (PermissionError, OSError) as error:
-                logger.warning("读取文件失败: %s, 错误: %s", file_path, error)
-                summary["sanitized_preview"] = ""
-                sanitized_files.append(summary)
+            if preview is not None:
+                summary["sanitized_preview"] = preview
+            return summary
 
-        return sanitized_files
+        return list(await asyncio.gather(
+            *(sanitize_bounded(summary) for summary in file_summaries)
+        ))
 
     async def _generate_lifestyle_summaries(
         self, file_summaries: List[Dict[str, Any]]
@@ -185,45 +248,77 @@ class CodeParserService:
         if not files_to_process:
             return file_summaries
 
-        # 构建批量处理 prompt
-        files_description = self._build_files_description(files_to_process)
+        # 内容相同的文件（如生成的样板代码、__init__.py）只发送一份给 LLM，
+        # 摘要再回填到同组的其他文件
+        groups: Dict[Any, List[Dict[str, Any]]] = {}
+        for file_info in files_to_process:
+            groups.setdefault(_content_digest(file_info), []).append(file_info)
+        representatives = [group[0] for group in groups.values()]
+        duplicates = {
+            group[0]["file_path"]: group[1:] for group in groups.values() if len(group) > 1
+        }
 
-        system_prompt = self._build_system_prompt()
+        # 按每批 SUMMARY_BATCH_SIZE 个文件拆分并发调用：
+        # 既分摊了系统提示词和请求开销，又避免单个超大请求拖慢整体或解析失败
+        semaphore = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+        batches = [
+            representatives[start:start + SUMMARY_BATCH_SIZE]
+            for start in range(0, len(representatives), SUMMARY_BATCH_SIZE)
+        ]
 
-        try:
-            # 调用 LLM 生成摘要
-            parsed_result = await llm_service.generate_json(
-                system_prompt=system_prompt,
-                user_prompt=files_description,
-                temperature=0.7,
-                max_tokens=3000,
-            )
+        async def summarize_bounded(batch: List[Dict[str, Any]]) -> int:
+            async with semaphore:
+                return await self._summarize_batch(batch, duplicates)
 
-            # 将 LLM 返回的摘要映射到文件
-            summary_map = parsed_result if isinstance(parsed_result, dict) else {}
+        results = await asyncio.gather(
+            *(summarize_bounded(batch) for batch in batches)
+        )
+        logger.info("成功生成 %d 个文件的生活化摘要", sum(results))
 
-            for file_info in files_to_process:
-                file_path = file_info["file_path"]
+        return file_summaries
 
-                if file_path in summary_map:
-                    file_info["lifestyle_summary"] = summary_map[file_path]
-                else:
-                    # 如果 LLM 没有为该文件生成摘要，使用基础描述
-                    file_info["lifestyle_summary"] = self._generate_fallback_summary(
-                        file_info
-                    )
+    async def _summarize_batch(
+        self,
+        batch: List[Dict[str, Any]],
+        duplicates: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ) -> int:
+        """
+        为一批文件生成生活化比喻摘要，未生成的文件写入基础描述
 
-            logger.info("成功生成 %d 个文件的生活化摘要", len(summary_map))
+        Args:
+            batch: 同一批次的文件信息列表
+            duplicates: 文件路径 -> 与其内容相同的其他文件，LLM 摘要会同步写入
 
+        Returns:
+            由 LLM 成功生成摘要的文件数
+        """
+        try:
+            parsed_result = await llm_service.generate_json(
+                system_prompt=_SYSTEM_PROMPT_LIFESTYLE,
+                user_prompt=self._build_files_description(batch),
+                temperature=0.7,
+                max_tokens=800,
+            )
+            summary_map = parsed_result if isinstance(parsed_result, dict) else {}
         except LLMError as error:
-            logger.warning("LLM 摘要生成失败，使用基础描述: %s", str(error))
-            # 降级处理：使用基础描述
-            for file_info in files_to_process:
-                file_info["lifestyle_summary"] = self._generate_fallback_summary(
-                    file_info
-                )
-
-        return file_summaries
+            logger.warning("LLM 摘要生成失败，该批次使用基础描述: %s", str(error))
+            summary_map = {}
+
+        generated = 0
+        for file_info in batch:
+            summary = summary_map.get(file_info["file_path"])
+            group = [file_info, *(duplicates or {}).get(file_info["file_path"], ())]
+            if isinstance(summary, str) and summary.strip():
+                for member in group:
+                    member["lifestyle_summary"] = summary
+                generated += len(group)
+            else:
+                # 如果 LLM 没有为该文件生成摘要，使用基础描述
+                for member in group:
+                    member["lifestyle_summary"] = self._generate_fallback_summary(
+                        member
+                    )
+        return generated
 
     def _build_files_description(
         self, file_summaries: List[Dict[str, Any]]
@@ -237,60 +332,33 @@ class CodeParserService:
         Returns:
             文件描述文本
         """
-        description = "以下是需要解析的代码文件：\n\n"
+        parts = ["以下是需要解析的代码文件：\n\n"]
 
         for file_info in file_summaries:
-            preview = file_info.get("sanitized_preview", "")[:1500]
             classes = file_info.get("classes", [])
             functions = file_info.get("functions", [])
             methods = file_info.get("methods", [])
             imports = file_info.get("imports", [])
 
-            description += f"--- 文件：{file_info['file_path']} ---\n"
+            parts.append(f"--- 文件：{file_info['file_path']} ---\n")
 
             if classes:
-                description += f"类：{', '.join(classes)}\n"
+                parts.append(f"类：{', '.join(classes)}\n")
             if functions:
-                description += f"函数：{', '.join(functions[:10])}\n"
+                parts.append(f"函数：{', '.join(functions[:10])}\n")
             if methods:
-                description += f"方法：{', '.join(methods[:10])}\n"
+                parts.append(f"方法：{', '.join(methods[:10])}\n")
             if imports:
-                description += f"依赖：{', '.join(imports[:5])}\n"
+                parts.append(f"依赖：{', '.join(imports[:5])}\n")
 
-            description += f"代码预览：\n{preview}\n\n"
+            # 结构信息已足够概括文件用途时不再附带代码预览，减少输入 token
+            if not (classes or functions or methods):
+                preview = file_info.get("sanitized_preview", "")[:PROMPT_PREVIEW_CHARS]
+                parts.append(f"代码预览：\n{preview}\n")
 
-        return description
+            parts.append("\n")
 
-    def _build_system_prompt(self) -> str:
-        """
-        构建系统提示词，要求 LLM 生成生活化比喻摘要
-
-        Returns:
-            系统提示词
-        """
-        return (
-            "你是一个代码翻译官，专门把代码功能翻译成小白也能听懂的大白话。\n\n"
-            "规则：\n"
-            "1. 禁止使用技术黑话，必须转化为生活化类比\n"
-            "2. 每个文件用 1 句话概括其核心功能\n"
-            "3. 使用比喻手法，让非技术人员也能秒懂\n"
-            "4. 常用比喻参考：\n"
-            "   - 数据库 = 档案室\n"
-            "   - API = 传声筒\n"
-            "   - Controller = 前台接待\n"
-            "   - Service = 业务部主管\n"
-            "   - Model = 数据模型\n"
-            "   - Utils = 工具箱\n"
-            "   - Config = 说明书\n\n"
-            "5. 必须返回合法的 JSON 格式，key 是文件路径，value 是生活化比喻摘要\n"
-            "6. 不要使用 markdown 代码块标记\n\n"
-            "示例输出：\n"
-            "{\n"
-            '  "src/auth/login.py": "这是保安大叔的工作手册，负责检查每个来访者的身份证和通行证",\n'
-            '  "src/user/model.py": "这是访客登记表，记录每个来访者的基本信息和联系方式",\n'
-            '  "src/api/routes.py": "这是前台接待台，负责把来访者的请求转达给相应的部门"\n'
-            "}\n"
-        )
+        return "".join(parts)
 
     def _generate_fallback_summary(self, file_info: Dict[str, Any]) -> str:
         """
@@ -334,20 +402,21 @@ class CodeParserService:
         fragments = []
 
         for file_info in file_summaries:
-            file_path = file_info.get("file_path", "")
-            extension = file_info.get("extension", "")
             sanitized_preview = file_info.get("sanitized_preview", "")
 
             if not sanitized_preview:
                 continue
 
+            file_path = file_info.get("file_path", "")
+            language = file_info.get("extension", "").lstrip(".")
+
             # 为每个文件创建唯一的片段 ID
             fragment_id = file_path.replace("/", "_").replace("\\", "_")
 
             # 提取元数据
             metadata = {
                 "file_name": file_info.get("file_name", ""),
-                "language": extension.lstrip("."),
+                "language": language,
                 "classes": file_info.get("classes", []),
                 "functions": file_info.get("functions", []),
                 "methods": file_info.get("methods", []),
@@ -357,7 +426,7 @@ class CodeParserService:
                 "id": fragment_id,
                 "content": sanitized_preview,
                 "file_path": file_path,
-                "language": extension.lstrip("."),
+                "language": language,
                 "metadata": metadata
             })
 
@@ -368,17 +437,22 @@ class CodeParserService:
             except Exception as error:
                 logger.warning("存储到向量数据库失败: %s", str(error))
 
-    def save_to_json(self, data: Dict[str, Any], output_path: str) -> None:
+    async def save_to_json(self, data: Dict[str, Any], output_path: str) -> None:
         """
-        将解析结果保存为 JSON 文件
+        将解析结果保存为 JSON 文件（序列化在当前线程完成，写盘放到线程池执行）
 
         Args:
             data: 解析结果数据
             output_path: 输出文件路径
         """
+        payload = orjson.dumps(
+            data,
+            option=orjson.OPT_INDENT_2
+            | orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_APPEND_NEWLINE,
+        )
         try:
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            await asyncio.to_thread(Path(output_path).write_bytes, payload)
             logger.info("摘要数据已保存到: %s", output_path)
         except IOError as error:
             logger.error("保存 JSON 文件失败: %s", error)
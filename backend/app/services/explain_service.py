@@ -3,14 +3,19 @@
 接入 LLM 动态解释代码中的技术术语，用生活化类比让小白也能理解。
 同时保留本地术语字典作为 fallback。
 """
+import hashlib
 import re
 import logging
-from typing import Dict, Any, List
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
 
 from app.services.llm_service import llm_service, LLMError
 
 logger = logging.getLogger(__name__)
 
+# 进程内 LLM 解释结果缓存的最大条目数
+EXPLAIN_CACHE_SIZE = 512
+
 # 本地术语字典（作为 LLM 不可用时的 fallback）
 LOCAL_TERM_DICTIONARY: Dict[str, Dict[str, str]] = {
     "API": {
@@ -87,6 +92,11 @@ LOCAL_TERM_DICTIONARY: Dict[str, Dict[str, str]] = {
     },
 }
 
+# 小写术语 -> (字典原始 key, 术语信息)，用于不区分大小写的 O(1) 查找
+_CI_DICT: Dict[str, Tuple[str, Dict[str, str]]] = {
+    key.lower(): (key, value) for key, value in LOCAL_TERM_DICTIONARY.items()
+}
+
 # 常见技术术语关键词列表
 COMMON_TERMS = [
     "API", "Database", "DB", "Controller", "Service",
@@ -98,10 +108,28 @@ COMMON_TERMS = [
     "OAuth", "CORS", "CSRF", "XSS", "SSL", "TLS",
 ]
 
+# 预编译的术语匹配正则：一次扫描找出所有术语（不区分大小写）。
+# 使用零宽前瞻以保留原有的子串匹配语义，允许重叠（如 NoSQL 同时命中 SQL）；
+# 较长的术语排在前面，保证同一位置优先匹配完整术语
+_TERM_RE = re.compile(
+    "(?=("
+    + "|".join(map(re.escape, sorted(COMMON_TERMS, key=len, reverse=True)))
+    + "))",
+    re.IGNORECASE,
+)
+_TERM_BY_LOWER: Dict[str, str] = {term.lower(): term for term in COMMON_TERMS}
+
+# CamelCase 标识符
+_CAMEL_RE = re.compile(r"\b[A-Z][a-z]+(?:[A-Z][a-z]+)+\b")
+
 
 class ExplainService:
     """术语解释服务，优先使用 LLM 动态解释，fallback 到本地字典"""
 
+    def __init__(self) -> None:
+        # 代码片段摘要 -> LLM 解释结果（LRU），本地字典的兜底结果不缓存
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
     async def explain_term(self, code_snippet: str) -> Dict[str, Any]:
         """
         解释代码片段中的技术术语。
@@ -113,13 +141,24 @@ class ExplainService:
         Returns:
             包含 term、plain_explanation、analogy 的字典
         """
+        cache_key = hashlib.blake2b(
+            code_snippet.encode("utf-8"), digest_size=16
+        ).hexdigest()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return dict(cached)
+
         # 提取关键词
         keywords = self._extract_keywords(code_snippet)
 
         # 优先尝试 LLM 动态解释
         try:
             explanation = await self._explain_with_llm(code_snippet, keywords)
-            return explanation
+            self._cache[cache_key] = explanation
+            while len(self._cache) > EXPLAIN_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return dict(explanation)
         except LLMError as error:
             logger.warning("LLM 术语解释失败，使用本地字典: %s", str(error))
 
@@ -177,13 +216,14 @@ class ExplainService:
                 }
 
             # 不区分大小写匹配
-            for dict_key, term_info in LOCAL_TERM_DICTIONARY.items():
-                if keyword.lower() == dict_key.lower():
-                    return {
-                        "term": dict_key,
-                        "plain_explanation": term_info["plain"],
-                        "analogy": term_info["analogy"],
-                    }
+            hit = _CI_DICT.get(keyword.lower())
+            if hit:
+                dict_key, term_info = hit
+                return {
+                    "term": dict_key,
+                    "plain_explanation": term_info["plain"],
+                    "analogy": term_info["analogy"],
+                }
 
         # 没有匹配到任何术语
         return {
@@ -194,17 +234,18 @@ class ExplainService:
 
     def _extract_keywords(self, code_snippet: str) -> List[str]:
         """从代码片段中提取可能的技术术语"""
-        keywords: List[str] = []
-
-        for term in COMMON_TERMS:
-            if term.lower() in code_snippet.lower():
-                keywords.append(term)
+        matched_terms = {
+            _TERM_BY_LOWER[match.group(1).lower()]
+            for match in _TERM_RE.finditer(code_snippet)
+        }
+        # 保持 COMMON_TERMS 中的顺序，首个关键词会作为默认术语名
+        keywords: List[str] = [term for term in COMMON_TERMS if term in matched_terms]
 
-        # 提取 CamelCase 标识符
-        camel_case_words = re.findall(r"\b[A-Z][a-z]+(?:[A-Z][a-z]+)+\b", code_snippet)
-        keywords.extend(camel_case_words[:5])
+        # 提取 CamelCase 标识符（去重后取前 5 个）
+        camel_case_words = list(dict.fromkeys(_CAMEL_RE.findall(code_snippet)))[:5]
 
-        return keywords
+        # 去重并保持顺序（CamelCase 标识符可能与术语相同，如 WebSocket）
+        return list(dict.fromkeys(keywords + camel_case_words))
 
 
 explain_service = ExplainService()
\ No newline at end of file
@@ -3,16 +3,45 @@ LLM 调用服务
 封装与大模型的交互，支持 OpenAI 兼容 API。
 强制 JSON 格式输出，长代码先摘要再处理。
 """
-import json
+import asyncio
+import importlib.util
 import logging
+import random
+import re
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
 import httpx
+import orjson
 
 from app.core.config import settings
+from app.core.prompt_cache import record_prompt_cache_usage
+from app.core.rate_limit import AsyncTokenBucket
 
 logger = logging.getLogger(__name__)
 
+# 可安全重试的 HTTP 状态码（限流与服务端临时故障）
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# 指数退避的基准秒数，以及服务端 Retry-After 的最大等待秒数
+RETRY_BASE_SECONDS = 0.5
+RETRY_AFTER_MAX_SECONDS = 30.0
+
+# generate_json 追加在系统提示词末尾的 JSON 格式要求
+_JSON_INSTRUCTION = (
+    "\n\n【重要】你必须且只能返回合法的 JSON 格式，不要包含 markdown 代码块标记、"
+    "注释或任何其他非 JSON 内容。确保 JSON 可以被 json.loads() 直接解析。"
+)
+
+
+# HTTP/2 需要可选依赖 h2（httpx[http2]），未安装时退回 HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+@lru_cache(maxsize=64)
+def _with_json_instruction(system_prompt: str) -> str:
+    """拼接 JSON 格式要求；系统提示词基本是常量，缓存拼接结果避免重复分配"""
+    return system_prompt + _JSON_INSTRUCTION
+
 
 class LLMService:
     """大模型调用服务，支持 OpenAI 兼容 API"""
@@ -22,7 +51,34 @@ class LLMService:
         self.api_base: str = settings.API_BASE.rstrip("/")
         self.model_name: str = settings.MODEL_NAME
         self.timeout: float = 60.0
-        self.max_retries: int = 1
+        self.max_retries: int = 4
+        self._client: Optional[httpx.AsyncClient] = None
+        # 按服务商 RPM 限额平滑请求，避免并发批量调用集中触发 429
+        self._limiter: Optional[AsyncTokenBucket] = (
+            AsyncTokenBucket(settings.LLM_RPM, 60) if settings.LLM_RPM > 0 else None
+        )
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """延迟创建共享的 HTTP 客户端，复用连接池避免每次请求重新握手"""
+        if self._client is None or self._client.is_closed:
+            # HTTP/2 可在单个连接上多路复用并发的批量请求，只需一次 TLS 握手
+            self._client = httpx.AsyncClient(
+                http2=_HTTP2_AVAILABLE,
+                timeout=self.timeout,
+                verify=False,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """关闭共享的 HTTP 客户端（应用关闭时调用）"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     @property
     def is_configured(self) -> bool:
@@ -58,10 +114,9 @@ class LLMService:
             )
 
         url = f"{self.api_base}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+        if settings.PROMPT_CACHE_CONTROL:
+            messages = _with_system_cache_control(messages)
+
         payload = {
             "model": self.model_name,
             "messages": messages,
@@ -72,15 +127,23 @@ class LLMService:
         logger.info("LLM 请求: URL=%s, Model=%s, MaxTokens=%d", url, self.model_name, max_tokens)
 
         last_error: Optional[Exception] = None
+        attempts_made = 0
 
         for attempt in range(self.max_retries + 1):
+            attempts_made = attempt + 1
+            retry_after: Optional[float] = None
             try:
-                async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-                    response = await client.post(url, json=payload, headers=headers)
-                    logger.info("LLM 响应: Status=%d", response.status_code)
-                    response.raise_for_status()
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"]
+                if self._limiter is not None:
+                    await self._limiter.acquire()
+                # orjson 直接产出 UTF-8 bytes，省去 str -> bytes 的编码步骤
+                response = await self._get_client().post(
+                    url, content=orjson.dumps(payload)
+                )
+                logger.info("LLM 响应: Status=%d", response.status_code)
+                response.raise_for_status()
+                result = orjson.loads(response.content)
+                record_prompt_cache_usage(result.get("usage"))
+                return result["choices"][0]["message"]["content"]
             except httpx.HTTPStatusError as error:
                 last_error = error
                 response_body = error.response.text[:500] if error.response else "N/A"
@@ -91,6 +154,10 @@ class LLMService:
                     str(error),
                     response_body,
                 )
+                # 4xx（429 除外）属于请求本身的问题，重试也不会成功
+                if error.response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+                retry_after = _parse_retry_after(error.response.headers.get("Retry-After"))
             except (httpx.RequestError, KeyError, IndexError) as error:
                 last_error = error
                 logger.warning(
@@ -101,7 +168,15 @@ class LLMService:
                     type(error).__name__,
                 )
 
-        raise LLMError(f"LLM API 调用失败（已重试 {self.max_retries} 次）: {last_error}")
+            if attempt < self.max_retries:
+                delay = (
+                    retry_after
+                    if retry_after is not None
+                    else RETRY_BASE_SECONDS * 2 ** attempt
+                ) + random.random() * 0.1
+                await asyncio.sleep(delay)
+
+        raise LLMError(f"LLM API 调用失败（共尝试 {attempts_made} 次）: {last_error}")
 
     async def generate_json(
         self,
@@ -126,14 +201,8 @@ class LLMService:
         Raises:
             LLMError: 当 API 调用失败或 JSON 解析失败时
         """
-        json_instruction = (
-            "\n\n【重要】你必须且只能返回合法的 JSON 格式，不要包含 markdown 代码块标记、"
-            "注释或任何其他非 JSON 内容。确保 JSON 可以被 json.loads() 直接解析。"
-        )
-        full_system_prompt = system_prompt + json_instruction
-
         messages = [
-            {"role": "system", "content": full_system_prompt},
+            {"role": "system", "content": _with_json_instruction(system_prompt)},
             {"role": "user", "content": user_prompt},
         ]
 
@@ -171,6 +240,52 @@ class LLMService:
         return await self.chat_completion(messages, temperature=0.5, max_tokens=500)
 
 
+def _with_system_cache_control(
+    messages: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    将 system 消息改写为带 cache_control 标记的内容块，
+    使 Anthropic 兼容网关缓存固定的系统提示词前缀。
+    OpenAI 会自动缓存相同前缀，无需此标记，只要系统提示词保持逐字节一致即可。
+    """
+    return [
+        {
+            "role": "system",
+            "content": [{
+                "type": "text",
+                "text": message["content"],
+                "cache_control": {"type": "ephemeral"},
+            }],
+        }
+        if message["role"] == "system" and isinstance(message["content"], str)
+        else message
+        for message in messages
+    ]
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头（仅支持秒数格式）
+
+    Args:
+        value: 响应头原始值
+
+    Returns:
+        等待秒数（不超过 RETRY_AFTER_MAX_SECONDS），无法解析时返回 None
+    """
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return min(max(seconds, 0.0), RETRY_AFTER_MAX_SECONDS)
+
+
+# 匹配文本首尾的 markdown 代码块标记（如 ```json 与结尾的 ```）
+_FENCE_RE = re.compile(r"\A```[\w-]*[ \t]*\n?|\n?[ \t]*```\Z")
+
+
 def validate_and_parse_json(raw_text: str) -> Dict[str, Any]:
     """
     校验并解析 AI 生成的 JSON 文本。
@@ -187,42 +302,24 @@ def validate_and_parse_json(raw_text: str) -> Dict[str, Any]:
     """
     cleaned = raw_text.strip()
 
-    # 尝试直接解析
+    # LLM 输出绝大多数是裸 JSON 或被 markdown 代码块包裹的 JSON：
+    # 先一次性去掉首尾的代码块标记，正常情况下只需解析一次
+    if cleaned.startswith("```"):
+        cleaned = _FENCE_RE.sub("", cleaned).strip()
+
     try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
+        return orjson.loads(cleaned)
+    except orjson.JSONDecodeError:
         pass
 
-    # 尝试去除 markdown 代码块标记
-    if cleaned.startswith("```"):
-        lines = cleaned.split("\n")
-        # 找到第一个非 ``` 行
-        start_index = 0
-        for i, line in enumerate(lines):
-            if not line.strip().startswith("```"):
-                start_index = i
-                break
-        # 找到最后一个非 ``` 行
-        end_index = len(lines)
-        for i in range(len(lines) - 1, -1, -1):
-            if not lines[i].strip().startswith("```"):
-                end_index = i + 1
-                break
-        if start_index < end_index:
-            json_text = "\n".join(lines[start_index:end_index])
-            try:
-                return json.loads(json_text.strip())
-            except json.JSONDecodeError:
-                pass
-
     # 尝试提取第一个 { 到最后一个 } 之间的内容
     first_brace = cleaned.find("{")
     last_brace = cleaned.rfind("}")
     if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
         json_candidate = cleaned[first_brace : last_brace + 1]
         try:
-            return json.loads(json_candidate)
-        except json.JSONDecodeError:
+            return orjson.loads(json_candidate)
+        except orjson.JSONDecodeError:
             pass
 
     # 尝试提取第一个 [ 到最后一个 ] 之间的内容
@@ -231,12 +328,12 @@ def validate_and_parse_json(raw_text: str) -> Dict[str, Any]:
     if first_bracket != -1 and last_bracket != -1 and last_bracket > first_bracket:
         json_candidate = cleaned[first_bracket : last_bracket + 1]
         try:
-            parsed = json.loads(json_candidate)
+            parsed = orjson.loads(json_candidate)
             return {"items": parsed}
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
 
-    raise LLMError(
+    raise LLMResponseFormatError(
         f"无法将 AI 返回内容解析为合法 JSON。原始内容前 200 字符：{cleaned[:200]}"
     )
 
@@ -246,4 +343,9 @@ class LLMError(Exception):
     pass
 
 
+class LLMResponseFormatError(LLMError):
+    """LLM 调用成功但返回内容无法解析为 JSON（重新生成可能成功，与传输层错误区分）"""
+    pass
+
+
 llm_service = LLMService()
@@ -10,18 +10,28 @@ import asyncio
 import shutil
 import logging
 import time
-from io import BytesIO
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Tuple
 from pathlib import Path
 
-from app.utils.sanitizer import sanitize_file_content
+from app.utils.sanitizer import (
+    PREVIEW_MAX_CHARS,
+    PREVIEW_READ_CHARS,
+    sanitize_file_head,
+)
 from app.utils.chunker import (
     scan_project_files,
-    should_skip_path,
-    is_code_file,
+    should_skip_name,
+    is_code_name,
     MAX_FILE_SIZE_BYTES,
 )
+import orjson
+
 from app.services.llm_service import llm_service, LLMError
+from app.core.cache import build_cache_key, response_cache
+from app.core.process_pool import get_process_pool
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -29,19 +39,94 @@ logger = logging.getLogger(__name__)
 # 任务自动清理时间（24 小时）
 TASK_EXPIRY_SECONDS = 24 * 60 * 60
 
+# 任务终态，推送到该状态后事件流结束
+TERMINAL_TASK_STATUSES = frozenset({"completed", "failed"})
+
+# 并行解压 ZIP 的线程数，以及每个成员拷贝时的缓冲区大小
+ZIP_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+ZIP_COPY_BUFFER_SIZE = 1024 * 1024
+
+# 并发读取并脱敏文件的上限，避免大项目耗尽文件描述符
+SANITIZE_CONCURRENCY = 16
+# 下游提示词使用的预览长度：白话摘要（preview_1500）与群聊剧本（preview_800），脱敏时一次切好
+SUMMARY_PREVIEW_CHARS = 1500
+SCRIPT_PREVIEW_CHARS = 800
+
+# 文件扩展名（小写）到白话描述的映射
+_SUFFIX_DESCRIPTIONS: Dict[str, str] = {
+    ".py": "Python 源代码 — 后端逻辑",
+    ".js": "JavaScript 源代码 — 前端交互",
+    ".ts": "TypeScript 源代码 — 带类型的前端逻辑",
+    ".jsx": "React 组件 — 界面模块",
+    ".tsx": "React TypeScript 组件 — 带类型的界面模块",
+    ".java": "Java 源代码 — 后端服务",
+    ".go": "Go 源代码 — 高性能后端",
+    ".css": "样式表 — 页面的「衣服」",
+    ".scss": "Sass 样式表 — 高级版的「衣服」",
+    ".html": "网页模板 — 页面的「骨架」",
+    ".json": "配置文件 — 系统的「说明书」",
+    ".yml": "配置文件 — 系统的「说明书」",
+    ".yaml": "配置文件 — 系统的「说明书」",
+    ".md": "文档 — 项目的「使用手册」",
+    ".sql": "数据库脚本 — 档案室的「整理规则」",
+    ".vue": "Vue 组件 — 界面模块",
+    ".svelte": "Svelte 组件 — 轻量界面模块",
+}
+
+
+def _llm_cache_key(
+    route: str, system_prompt: str, user_prompt: str, temperature: float
+) -> str:
+    """以提示词、模型和温度生成 LLM 结果的缓存 key"""
+    payload = orjson.dumps(
+        {
+            "model": settings.MODEL_NAME,
+            "system_prompt": system_prompt,
+            "temperature": temperature,
+            "user_prompt": user_prompt,
+        },
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return build_cache_key(route, payload.decode("utf-8"))
+
+
+def _summary_preview(file_info: Dict[str, Any]) -> str:
+    """白话摘要提示词使用的代码预览，优先取脱敏时已切好的 preview_1500"""
+    preview = file_info.get("preview_1500")
+    if preview is None:
+        preview = file_info.get("sanitized_preview", "")[:SUMMARY_PREVIEW_CHARS]
+    return preview
+
+
+def _file_summary_cache_key(file_info: Dict[str, Any]) -> str:
+    """以脱敏预览和类/函数名生成单个文件摘要的缓存 key，与所属任务和路径无关"""
+    payload = orjson.dumps(
+        [
+            settings.MODEL_NAME,
+            _summary_preview(file_info),
+            file_info.get("classes", []),
+            file_info.get("functions", []),
+        ]
+    )
+    return build_cache_key("project_file_summary", payload.decode("utf-8"))
+
 
 class ProjectService:
     """项目解析服务，管理上传、解析、存储的完整生命周期"""
 
     def __init__(self) -> None:
-        self.tasks: Dict[str, Dict[str, Any]] = {}
+        # 按创建时间顺序保存任务，过期清理只需从队首弹出，无需全量扫描
+        self.tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 任务进度订阅者（SSE 连接），每个订阅者一个队列
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
 
-    async def upload_and_parse(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    async def upload_and_parse(self, zip_path: str, filename: str) -> Dict[str, Any]:
         """
         上传并解析项目文件（同步模式，返回文件列表）。
+        调用后由本服务负责删除 zip_path 指向的临时文件。
 
         Args:
-            file_content: ZIP 文件的字节内容
+            zip_path: 已写入磁盘的 ZIP 临时文件路径
             filename: 原始文件名
 
         Returns:
@@ -51,97 +136,138 @@ class ProjectService:
             ValueError: 文件过大或格式不正确时
         """
         # 校验文件大小
-        if len(file_content) > settings.max_upload_size_bytes:
+        if os.path.getsize(zip_path) > settings.max_upload_size_bytes:
+            self._safe_remove_file(zip_path)
             raise ValueError(
                 f"文件大小超过限制（最大 {settings.MAX_UPLOAD_SIZE_MB}MB）"
             )
 
         # 校验 ZIP 格式
-        if not zipfile.is_zipfile(BytesIO(file_content)):
+        if not zipfile.is_zipfile(zip_path):
+            self._safe_remove_file(zip_path)
             raise ValueError("上传的文件不是有效的 ZIP 格式")
 
         task_id = str(uuid.uuid4())
         temp_dir = f"/tmp/codestory_{task_id}"
 
         try:
-            # 解压文件
-            os.makedirs(temp_dir, exist_ok=True)
-            with zipfile.ZipFile(BytesIO(file_content), "r") as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            # 扫描目录结构，获取文件列表
-            file_list = self._scan_files(temp_dir)
+            # 只解压一次，后台解析直接复用解压目录；解压放到线程池避免阻塞事件循环。
+            # 文件列表直接来自 ZIP 中央目录，无需再遍历磁盘
+            file_list = await asyncio.to_thread(self._extract_zip, zip_path, temp_dir)
 
-            # 保存任务数据（用于后续异步处理）
-            self.tasks[task_id] = {
-                "task_id": task_id,
-                "file_list": file_list,
-                "directory": temp_dir,
-                "status": "processing",
-                "progress": 0,
-                "message": "开始解析项目...",
-                "project_data": None,
-                "file_summaries": [],
-                "created_at": time.time(),
-            }
+            # 遍历解压目录构建目录树
+            project_tree, tree_file_nodes = await asyncio.to_thread(
+                self._scan_project, temp_dir
+            )
+        except Exception as error:
+            self._safe_cleanup(temp_dir)
+            raise ValueError(f"解析失败: {str(error)}")
+        finally:
+            # 解压完成后 ZIP 文件不再需要
+            self._safe_remove_file(zip_path)
 
-            # 启动后台异步解析任务
-            asyncio.create_task(self._parse_project(task_id, file_content, filename))
+        # 保存任务数据（用于后续异步处理）
+        self._cleanup_expired_tasks()
+        created_at = time.time()
+        self.tasks[task_id] = {
+            "task_id": task_id,
+            "file_list": file_list,
+            "directory": temp_dir,
+            # 上传时已构建的目录树，后台解析取出后不再保留
+            "project_tree": project_tree,
+            "tree_file_nodes": tree_file_nodes,
+            "status": "processing",
+            "progress": 0,
+            "message": "开始解析项目...",
+            "project_data": None,
+            "file_summaries": [],
+            "created_at": created_at,
+            # 创建时一次性转换为 ISO 字符串，历史列表无需逐条转换
+            "created_at_iso": datetime.fromtimestamp(created_at).isoformat(),
+        }
 
-            return {
-                "task_id": task_id,
-                "file_list": file_list
-            }
+        # 启动后台异步解析任务
+        asyncio.create_task(self._parse_project(task_id, filename))
 
-        except Exception as error:
-            raise ValueError(f"解析失败: {str(error)}")
+        return {
+            "task_id": task_id,
+            "file_list": file_list
+        }
 
-    async def _parse_project(
-        self, task_id: str, file_content: bytes, filename: str
-    ) -> None:
-        """异步解析项目的完整流程"""
-        temp_dir = f"/tmp/codestory_{task_id}"
+    def _extract_zip(self, zip_path: str, temp_dir: str) -> List[str]:
+        """
+        将 ZIP 并行解压到临时目录（阻塞调用，在线程池中执行）。
+        zlib 解压时会释放 GIL，多个成员可以真正并行解压。
 
-        try:
-            # Step 1: 解压文件
-            self._update_progress(task_id, 10, "正在解压文件...")
-            os.makedirs(temp_dir, exist_ok=True)
+        Returns:
+            排序后的相对文件路径列表（取自 ZIP 中央目录，与解压结果一致）
 
-            with zipfile.ZipFile(BytesIO(file_content), "r") as zip_ref:
-                zip_ref.extractall(temp_dir)
+        Raises:
+            ValueError: ZIP 中包含指向解压目录之外的路径时（ZipSlip）
+        """
+        root = os.path.realpath(temp_dir)
+        os.makedirs(root, exist_ok=True)
+
+        # ZipFile 按需随机读取，不会整体载入内存
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            targets = []
+            for info in zip_ref.infolist():
+                target = os.path.realpath(os.path.join(root, info.filename))
+                if not target.startswith(root + os.sep):
+                    raise ValueError(f"ZIP 包含非法路径: {info.filename}")
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                else:
+                    targets.append((info, target))
+
+            def extract_member(member: Tuple[zipfile.ZipInfo, str]) -> None:
+                info, target = member
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with zip_ref.open(info) as source, open(target, "wb") as destination:
+                    shutil.copyfileobj(source, destination, ZIP_COPY_BUFFER_SIZE)
+
+            with ThreadPoolExecutor(max_workers=ZIP_EXTRACT_WORKERS) as executor:
+                list(executor.map(extract_member, targets))
+
+        return sorted({os.path.relpath(target, root) for _, target in targets})
+
+    async def _parse_project(self, task_id: str, filename: str) -> None:
+        """异步解析项目的完整流程（ZIP 已在 upload_and_parse 中解压）"""
+        temp_dir = self.tasks[task_id]["directory"]
 
-            # Step 2: 扫描目录结构
+        try:
+            # Step 1: 读取上传时构建的目录树
             self._update_progress(task_id, 25, "正在扫描目录结构...")
-            project_tree = self._scan_directory(temp_dir)
+            project_tree = self.tasks[task_id].pop("project_tree")
+            tree_file_nodes = self.tasks[task_id].pop("tree_file_nodes")
 
             # 处理空目录
-            if self._is_empty_project(project_tree):
-                self.tasks[task_id]["status"] = "failed"
-                self.tasks[task_id]["message"] = "项目为空或不包含可解析的源代码文件"
+            if not self._has_code_file(project_tree):
+                self._finish_task(task_id, "failed", "项目为空或不包含可解析的源代码文件")
                 self._safe_cleanup(temp_dir)
                 return
 
-            # Step 3: 提取文件摘要（代码分片）
+            # Step 2: 提取文件摘要（代码分片）
             self._update_progress(task_id, 40, "正在提取代码摘要...")
-            file_summaries = scan_project_files(temp_dir)
-
-            # Step 4: 对源代码进行脱敏处理
-            self._update_progress(task_id, 50, "正在进行代码脱敏...")
-            sanitized_summaries = self._sanitize_summaries(temp_dir, file_summaries)
-
-            # Step 5: 调用 LLM 生成白话摘要
-            self._update_progress(task_id, 60, "AI 正在翻阅代码，生成白话摘要...")
-            enriched_tree = await self._enrich_tree_with_summaries(
-                project_tree, sanitized_summaries
+            # 逐文件读取与正则提取是 CPU 密集任务，分批交给进程池；在工作线程中等待以免阻塞事件循环
+            file_summaries = await asyncio.to_thread(
+                scan_project_files, temp_dir, get_process_pool()
             )
 
-            # Step 6: 调用 LLM 生成架构图
-            self._update_progress(task_id, 80, "正在生成架构图...")
-            mermaid_diagram = await self._generate_mermaid_with_llm(
-                sanitized_summaries
+            # Step 3: 对源代码进行脱敏处理
+            self._update_progress(task_id, 50, "正在进行代码脱敏...")
+            sanitized_summaries = await self._sanitize_summaries(temp_dir, file_summaries)
+
+            # Step 4 & 5: 白话摘要与架构图互不依赖，并发调用 LLM 使两者耗时重叠
+            self._update_progress(task_id, 60, "AI 正在翻阅代码，生成白话摘要和架构图...")
+            enriched_tree, mermaid_diagram = await asyncio.gather(
+                self._enrich_tree_with_summaries(
+                    project_tree, tree_file_nodes, sanitized_summaries
+                ),
+                self._generate_mermaid_with_llm(sanitized_summaries),
             )
 
-            # Step 7: 保存结果
+            # Step 6: 保存结果
             self._update_progress(task_id, 95, "正在整理结果...")
             self.tasks[task_id]["project_data"] = {
                 "tree": enriched_tree,
@@ -150,14 +276,11 @@ class ProjectService:
             self.tasks[task_id]["file_summaries"] = sanitized_summaries
 
             # 完成
-            self.tasks[task_id]["status"] = "completed"
-            self.tasks[task_id]["progress"] = 100
-            self.tasks[task_id]["message"] = "项目解析完成！"
+            self._finish_task(task_id, "completed", "项目解析完成！", progress=100)
 
         except Exception as error:
             logger.error("项目解析失败: %s", str(error), exc_info=True)
-            self.tasks[task_id]["status"] = "failed"
-            self.tasks[task_id]["message"] = f"解析失败: {str(error)}"
+            self._finish_task(task_id, "failed", f"解析失败: {str(error)}")
         finally:
             # 解析完成后立即清理临时文件（严禁持久化存储用户源码）
             self._safe_cleanup(temp_dir)
@@ -166,126 +289,187 @@ class ProjectService:
         """更新任务进度"""
         self.tasks[task_id]["progress"] = progress
         self.tasks[task_id]["message"] = message
+        self._publish(task_id)
 
-    def _is_empty_project(self, tree: Dict[str, Any]) -> bool:
-        """检查项目是否为空（无可解析的源代码文件）"""
-        if tree["type"] == "file":
-            return not is_code_file(Path(tree["name"]))
+    def _finish_task(
+        self,
+        task_id: str,
+        status: str,
+        message: str,
+        progress: Optional[int] = None,
+    ) -> None:
+        """将任务置为终态并通知订阅者"""
+        self.tasks[task_id]["status"] = status
+        self.tasks[task_id]["message"] = message
+        if progress is not None:
+            self.tasks[task_id]["progress"] = progress
+        self._publish(task_id)
 
-        children = tree.get("children", [])
-        if not children:
-            return True
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """
+        订阅任务进度变化
+
+        Args:
+            task_id: 任务 ID
 
-        return all(self._is_empty_project(child) for child in children)
+        Returns:
+            接收状态快照（与 get_task_status 结构一致）的队列
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue) -> None:
+        """取消订阅任务进度"""
+        queues = self._subscribers.get(task_id)
+        if not queues:
+            return
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._subscribers.pop(task_id, None)
+
+    def _publish(self, task_id: str) -> None:
+        """向所有订阅者推送当前任务状态"""
+        queues = self._subscribers.get(task_id)
+        if not queues:
+            return
+        snapshot = self.get_task_status(task_id)
+        for queue in queues:
+            queue.put_nowait(snapshot)
+
+    def _has_code_file(self, tree: Dict[str, Any]) -> bool:
+        """检查目录树中是否包含可解析的源代码文件（找到第一个即返回）"""
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if node["type"] == "file":
+                if is_code_name(node["name"]):
+                    return True
+            else:
+                stack.extend(node.get("children", ()))
+        return False
 
-    def _scan_files(self, dir_path: str) -> List[str]:
+    def _scan_project(
+        self, dir_path: str
+    ) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
         """
-        递归扫描目录，获取所有文件路径
+        基于 os.scandir 遍历目录，构建过滤后的目录树
 
         Args:
             dir_path: 目录路径
 
         Returns:
-            文件路径列表
+            (跳过无关目录与隐藏文件后的目录树, 相对路径到目录树文件节点的索引)
         """
-        root_path = Path(dir_path)
-        file_list: List[str] = []
-
-        for item in root_path.rglob("*"):
-            if item.is_file():
-                # 获取相对路径
-                relative_path = item.relative_to(root_path)
-                file_list.append(str(relative_path))
-
-        return sorted(file_list)
-
-    def _scan_directory(self, dir_path: str) -> Dict[str, Any]:
-        """扫描目录结构，自动过滤无关配置文件"""
-        root_path = Path(dir_path)
-        return self._build_tree(root_path, root_path)
-
-    def _build_tree(self, current_path: Path, root_path: Path) -> Dict[str, Any]:
-        """递归构建目录树，跳过无关目录"""
-        relative = current_path.relative_to(root_path)
-
-        if current_path.is_file():
-            return {
-                "name": current_path.name,
-                "type": "file",
-                "path": str(relative),
-                "description": self._generate_file_description(current_path),
-                "summary": "",
-            }
+        file_nodes: Dict[str, Dict[str, Any]] = {}
+        tree = self._build_tree(dir_path, "", os.path.basename(dir_path), file_nodes)
+        return tree, file_nodes
 
-        children: List[Dict[str, Any]] = []
+    def _build_tree(
+        self,
+        dir_path: str,
+        relative: str,
+        name: str,
+        file_nodes: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        递归构建目录树，跳过隐藏条目和无关目录/文件，被跳过的目录不再向下遍历。
+        文件节点同时按相对路径登记到 file_nodes，之后写入摘要无需再遍历整棵树。
+        DirEntry 的类型信息来自 readdir 结果，无需额外 stat。
+
+        Returns:
+            目录树节点
+        """
         try:
-            for item in sorted(current_path.iterdir()):
-                if should_skip_path(item.relative_to(root_path)):
-                    continue
-                if item.name.startswith("."):
-                    continue
-                children.append(self._build_tree(item, root_path))
+            with os.scandir(dir_path) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
         except PermissionError:
-            pass
+            entries = []
+
+        children: List[Dict[str, Any]] = []
+        for entry in entries:
+            if entry.name.startswith(".") or should_skip_name(entry.name):
+                continue
+            entry_relative = os.path.join(relative, entry.name) if relative else entry.name
+
+            if entry.is_dir(follow_symlinks=False):
+                children.append(
+                    self._build_tree(entry.path, entry_relative, entry.name, file_nodes)
+                )
+            elif entry.is_file():
+                file_node = {
+                    "name": entry.name,
+                    "type": "file",
+                    "path": entry_relative,
+                    "description": self._generate_file_description(Path(entry.name)),
+                    "summary": "",
+                }
+                file_nodes[entry_relative] = file_node
+                children.append(file_node)
 
         return {
-            "name": current_path.name,
+            "name": name,
             "type": "folder",
-            "path": str(relative),
+            "path": relative or ".",
             "children": children,
         }
 
     def _generate_file_description(self, file_path: Path) -> str:
         """生成文件的白话描述"""
-        suffix = file_path.suffix.lower()
-        descriptions = {
-            ".py": "Python 源代码 — 后端逻辑",
-            ".js": "JavaScript 源代码 — 前端交互",
-            ".ts": "TypeScript 源代码 — 带类型的前端逻辑",
-            ".jsx": "React 组件 — 界面模块",
-            ".tsx": "React TypeScript 组件 — 带类型的界面模块",
-            ".java": "Java 源代码 — 后端服务",
-            ".go": "Go 源代码 — 高性能后端",
-            ".css": "样式表 — 页面的「衣服」",
-            ".scss": "Sass 样式表 — 高级版的「衣服」",
-            ".html": "网页模板 — 页面的「骨架」",
-            ".json": "配置文件 — 系统的「说明书」",
-            ".yml": "配置文件 — 系统的「说明书」",
-            ".yaml": "配置文件 — 系统的「说明书」",
-            ".md": "文档 — 项目的「使用手册」",
-            ".sql": "数据库脚本 — 档案室的「整理规则」",
-            ".vue": "Vue 组件 — 界面模块",
-            ".svelte": "Svelte 组件 — 轻量界面模块",
-        }
-        return descriptions.get(suffix, "文件")
+        return _SUFFIX_DESCRIPTIONS.get(file_path.suffix.lower(), "文件")
 
-    def _sanitize_summaries(
+    async def _sanitize_summaries(
         self, temp_dir: str, file_summaries: List[Dict[str, Any]]
     ) -> List[Dict[str, Any]]:
-        """对文件摘要中的代码内容进行脱敏"""
+        """对文件摘要中的代码内容进行脱敏（在进程池中并发读取和脱敏）"""
         root_path = Path(temp_dir)
+        semaphore = asyncio.Semaphore(SANITIZE_CONCURRENCY)
+        loop = asyncio.get_running_loop()
+        # 脱敏是 CPU 密集的正则替换，线程池受 GIL 限制；进程池不可用时退回默认线程池
+        executor = get_process_pool()
 
-        for summary in file_summaries:
-            file_path = root_path / summary["file_path"]
-            if file_path.exists() and file_path.is_file():
+        async def sanitize_bounded(summary: Dict[str, Any]) -> None:
+            async with semaphore:
                 try:
-                    content = file_path.read_text(encoding="utf-8", errors="ignore")
-                    sanitized = sanitize_file_content(summary["file_path"], content)
-                    # 只保留脱敏后的前 3000 字符用于 LLM 处理
-                    summary["sanitized_preview"] = sanitized[:3000]
-                except (PermissionError, OSError):
-                    summary["sanitized_preview"] = ""
-            else:
-                summary["sanitized_preview"] = ""
-
+                    preview = await loop.run_in_executor(
+                        executor,
+                        sanitize_file_head,
+                        str(root_path / summary["file_path"]),
+                        summary["file_path"],
+                        PREVIEW_READ_CHARS,
+                        PREVIEW_MAX_CHARS,
+                    )
+                except OSError:
+                    preview = None
+            self._set_preview(summary, preview or "")
+
+        await asyncio.gather(*(sanitize_bounded(summary) for summary in file_summaries))
         return file_summaries
 
+    def _set_preview(self, summary: Dict[str, Any], preview: str) -> None:
+        """写入脱敏后的代码预览，并预先切好下游提示词使用的短预览"""
+        summary["sanitized_preview"] = preview
+        summary["preview_1500"] = preview[:SUMMARY_PREVIEW_CHARS]
+        summary["preview_800"] = preview[:SCRIPT_PREVIEW_CHARS]
+
     async def _enrich_tree_with_summaries(
         self,
         tree: Dict[str, Any],
+        file_nodes: Dict[str, Dict[str, Any]],
         file_summaries: List[Dict[str, Any]],
     ) -> Dict[str, Any]:
-        """用 LLM 生成的白话摘要丰富目录树"""
+        """
+        用 LLM 生成的白话摘要丰富目录树
+
+        Args:
+            tree: 上传时构建的目录树
+            file_nodes: 相对路径到目录树文件节点的索引（见 _scan_project）
+            file_summaries: 脱敏后的文件摘要列表
+
+        Returns:
+            写入摘要后的目录树
+        """
         # 构建文件路径到摘要的映射
         summary_map: Dict[str, Dict[str, Any]] = {
             s["file_path"]: s for s in file_summaries
@@ -294,7 +478,7 @@ class ProjectService:
         # 收集需要生成摘要的代码文件
         code_files_for_summary: List[Dict[str, Any]] = [
             s for s in file_summaries
-            if is_code_file(Path(s["file_name"]))
+            if is_code_name(s["file_name"])
             and s.get("sanitized_preview", "").strip()
         ]
 
@@ -303,37 +487,56 @@ class ProjectService:
             files_to_summarize = code_files_for_summary[:20]
             summaries_text = await self._batch_summarize_files(files_to_summarize)
 
+            # 按路径索引直接更新文件节点，无需再递归遍历整棵树
             for file_path, summary_text in summaries_text.items():
                 if file_path in summary_map:
                     summary_map[file_path]["ai_summary"] = summary_text
-
-        # 将摘要写入目录树
-        self._apply_summaries_to_tree(tree, summary_map)
+                    file_node = file_nodes.get(file_path)
+                    if file_node is not None and summary_text:
+                        file_node["summary"] = summary_text
 
         return tree
 
     async def _batch_summarize_files(
         self, files: List[Dict[str, Any]]
     ) -> Dict[str, str]:
-        """批量调用 LLM 为文件生成白话摘要"""
+        """
+        批量调用 LLM 为文件生成白话摘要。
+        摘要按文件内容缓存：其他项目中出现过的相同文件直接复用，只把未命中的文件发给 LLM。
+        """
         result: Dict[str, str] = {}
 
+        cache_keys = [_file_summary_cache_key(file_info) for file_info in files]
+        cached_summaries = await asyncio.gather(
+            *(response_cache.get(key) for key in cache_keys)
+        )
+        misses: List[Tuple[Dict[str, Any], str]] = []
+        for file_info, cache_key, summary in zip(files, cache_keys, cached_summaries):
+            if isinstance(summary, str):
+                result[file_info["file_path"]] = summary
+            else:
+                misses.append((file_info, cache_key))
+
+        if not misses:
+            return result
+
         # 构建批量摘要 prompt
-        files_description = ""
-        for file_info in files:
-            preview = file_info.get("sanitized_preview", "")[:1500]
+        description_parts: List[str] = []
+        for file_info, _ in misses:
+            preview = _summary_preview(file_info)
             classes = file_info.get("classes", [])
             functions = file_info.get("functions", [])
             methods = file_info.get("methods", [])
 
-            files_description += f"\n--- 文件：{file_info['file_path']} ---\n"
+            description_parts.append(f"\n--- 文件：{file_info['file_path']} ---\n")
             if classes:
-                files_description += f"类：{', '.join(classes)}\n"
+                description_parts.append(f"类：{', '.join(classes)}\n")
             if functions:
-                files_description += f"函数：{', '.join(functions[:10])}\n"
+                description_parts.append(f"函数：{', '.join(functions[:10])}\n")
             if methods:
-                files_description += f"方法：{', '.join(methods[:10])}\n"
-            files_description += f"代码预览：\n{preview}\n"
+                description_parts.append(f"方法：{', '.join(methods[:10])}\n")
+            description_parts.append(f"代码预览：\n{preview}\n")
+        files_description = "".join(description_parts)
 
         system_prompt = (
             "你是一个代码翻译官，专门把代码功能翻译成大白话。\n"
@@ -344,62 +547,60 @@ class ProjectService:
             "示例：{\"auth_service.py\": \"这是保安大叔的工作手册，负责检查每个来访者的身份证\"}"
         )
 
+        user_prompt = f"请为以下代码文件生成白话摘要：\n{files_description}"
+
         try:
             parsed = await llm_service.generate_json(
                 system_prompt=system_prompt,
-                user_prompt=f"请为以下代码文件生成白话摘要：\n{files_description}",
+                user_prompt=user_prompt,
                 temperature=0.5,
                 max_tokens=8000,
             )
-            # parsed 应该是 {file_path: summary_text} 的字典
-            for key, value in parsed.items():
-                if isinstance(value, str):
-                    result[key] = value
         except LLMError as error:
             logger.warning("批量摘要生成失败，使用基础描述: %s", str(error))
-            for file_info in files:
+            for file_info, _ in misses:
                 result[file_info["file_path"]] = self._generate_file_description(
                     Path(file_info["file_name"])
                 )
+            return result
+
+        # parsed 应该是 {file_path: summary_text} 的字典；只缓存 LLM 真正生成的摘要
+        pending_writes = []
+        for file_info, cache_key in misses:
+            summary = parsed.get(file_info["file_path"])
+            if isinstance(summary, str):
+                result[file_info["file_path"]] = summary
+                pending_writes.append(
+                    response_cache.set(
+                        cache_key, summary, settings.PROJECT_CACHE_TTL_SECONDS
+                    )
+                )
+        await asyncio.gather(*pending_writes)
 
         return result
 
-    def _apply_summaries_to_tree(
-        self, tree: Dict[str, Any], summary_map: Dict[str, Dict[str, Any]]
-    ) -> None:
-        """将 AI 摘要应用到目录树节点"""
-        if tree["type"] == "file":
-            file_path = tree["path"]
-            if file_path in summary_map:
-                ai_summary = summary_map[file_path].get("ai_summary", "")
-                if ai_summary:
-                    tree["summary"] = ai_summary
-            return
-
-        for child in tree.get("children", []):
-            self._apply_summaries_to_tree(child, summary_map)
-
     async def _generate_mermaid_with_llm(
         self, file_summaries: List[Dict[str, Any]]
     ) -> str:
         """调用 LLM 生成 Mermaid 架构图"""
         # 构建项目结构描述
-        structure_description = "项目文件结构：\n"
+        structure_parts: List[str] = ["项目文件结构：\n"]
         for summary in file_summaries[:30]:
             classes = summary.get("classes", [])
             functions = summary.get("functions", [])
             methods = summary.get("methods", [])
             imports = summary.get("imports", [])
 
-            structure_description += f"\n文件：{summary['file_path']}"
+            structure_parts.append(f"\n文件：{summary['file_path']}")
             if classes:
-                structure_description += f" | 类：{', '.join(classes)}"
+                structure_parts.append(f" | 类：{', '.join(classes)}")
             if functions:
-                structure_description += f" | 函数：{', '.join(functions[:5])}"
+                structure_parts.append(f" | 函数：{', '.join(functions[:5])}")
             if methods:
-                structure_description += f" | 方法：{', '.join(methods[:5])}"
+                structure_parts.append(f" | 方法：{', '.join(methods[:5])}")
             if imports:
-                structure_description += f" | 依赖：{', '.join(imports[:5])}"
+                structure_parts.append(f" | 依赖：{', '.join(imports[:5])}")
+        structure_description = "".join(structure_parts)
 
         system_prompt = (
             "你是一个架构图生成专家。根据项目文件结构，生成 Mermaid.js 的 graph TD 架构图。\n"
@@ -412,13 +613,17 @@ class ProjectService:
         )
 
         try:
-            mermaid_code = await llm_service.chat_completion(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": structure_description},
-                ],
-                temperature=0.5,
-                max_tokens=1500,
+            mermaid_code = await response_cache.cached(
+                _llm_cache_key("project_mermaid", system_prompt, structure_description, 0.5),
+                lambda: llm_service.chat_completion(
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": structure_description},
+                    ],
+                    temperature=0.5,
+                    max_tokens=1500,
+                ),
+                ttl_seconds=settings.PROJECT_CACHE_TTL_SECONDS,
             )
             # 清理可能的 markdown 标记
             cleaned = mermaid_code.strip()
@@ -438,20 +643,16 @@ class ProjectService:
         folders: Dict[str, List[str]] = {}
 
         for summary in file_summaries:
-            parts = summary["file_path"].split("/")
-            if len(parts) > 1:
-                folder = parts[0]
-                if folder not in folders:
-                    folders[folder] = []
-                folders[folder].append(summary["file_name"])
-
-        node_index = 0
-        folder_ids: Dict[str, str] = {}
-        for folder_name in folders:
-            node_id = f"F{node_index}"
-            folder_ids[folder_name] = node_id
+            # 只需要第一级目录，partition 不会拆出整条路径的列表
+            folder, separator, _ = summary["file_path"].partition("/")
+            if separator:
+                folders.setdefault(folder, []).append(summary["file_name"])
+
+        folder_ids: Dict[str, str] = {
+            folder_name: f"F{index}" for index, folder_name in enumerate(folders)
+        }
+        for folder_name, node_id in folder_ids.items():
             lines.append(f'    {node_id}["{folder_name}"]')
-            node_index += 1
 
         # 简单连接相邻文件夹
         folder_list = list(folder_ids.values())
@@ -468,16 +669,26 @@ class ProjectService:
         except OSError as error:
             logger.warning("清理临时目录失败: %s", str(error))
 
+    def _safe_remove_file(self, file_path: str) -> None:
+        """安全删除临时文件"""
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as error:
+            logger.warning("删除临时文件失败: %s", str(error))
+
     def _cleanup_expired_tasks(self) -> None:
-        """清理超过 24 小时的过期任务"""
-        current_time = time.time()
-        expired_task_ids = [
-            task_id
-            for task_id, task_data in self.tasks.items()
-            if current_time - task_data.get("created_at", 0) > TASK_EXPIRY_SECONDS
-        ]
-        for task_id in expired_task_ids:
-            del self.tasks[task_id]
+        """
+        清理超过 24 小时的过期任务。
+        任务按创建时间顺序插入，从队首弹出直到遇到未过期的任务即可，
+        开销只与过期任务数相关，在新建任务和查询历史列表时顺带调用。
+        """
+        expire_before = time.time() - TASK_EXPIRY_SECONDS
+        while self.tasks:
+            task_id, task_data = next(iter(self.tasks.items()))
+            if task_data.get("created_at", 0) >= expire_before:
+                break
+            self.tasks.popitem(last=False)
             logger.info("已清理过期任务: %s", task_id)
 
     def get_task_status(self, task_id: str) -> Dict[str, Any]:
@@ -509,6 +720,7 @@ class ProjectService:
 
     def get_history_list(self) -> List[Dict[str, Any]]:
         """获取历史记录列表"""
+        self._cleanup_expired_tasks()
         history_list = []
         
         for task_id, task_data in self.tasks.items():
@@ -519,6 +731,7 @@ class ProjectService:
                 "task_id": task_id,
                 "file_name": file_name,
                 "created_at": task_data.get("created_at", 0),
+                "created_at_iso": task_data.get("created_at_iso", ""),
                 "status": task_data.get("status", "unknown"),
                 "file_count": len(file_list)
             }
@@ -4,7 +4,16 @@
 遵循 TECH_DESIGN.md 的剧本 JSON 结构规范。
 """
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    ValidationError,
+    ValidationInfo,
+    field_validator,
+)
 
 from app.services.llm_service import llm_service, LLMError
 from app.services.project_service import project_service
@@ -27,6 +36,68 @@ ROLE_MAPPING = {
 }
 
 
+class Character(BaseModel):
+    """剧本角色；缺失字段使用默认值，id 缺失时由调用方按序号补齐"""
+
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    id: Optional[str] = None
+    name: str = "未知角色"
+    role: str = "Unknown"
+    personality: str = ""
+
+    @field_validator("name", "role", "personality", mode="before")
+    @classmethod
+    def _null_to_default(cls, value: Any, info: ValidationInfo) -> Any:
+        # LLM 常把缺省字段写成 null：按缺失处理，使用默认值而不是让整个角色校验失败
+        return cls.model_fields[info.field_name].default if value is None else value
+
+
+class Dialogue(BaseModel):
+    """剧本中的一条对话（from/to 为角色 id）"""
+
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    from_id: str = Field("", alias="from")
+    to_id: str = Field("", alias="to")
+    content: str = ""
+    code_ref: str = ""
+
+    @field_validator("from_id", "to_id", "content", "code_ref", mode="before")
+    @classmethod
+    def _null_to_default(cls, value: Any, info: ValidationInfo) -> Any:
+        return cls.model_fields[info.field_name].default if value is None else value
+
+
+class Script(BaseModel):
+    """AI 生成的群聊剧本；角色和对话中格式不合法的条目会被丢弃，而不是让整个剧本校验失败"""
+
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+    scenario: Optional[str] = None
+    characters: List[Character] = []
+    dialogues: List[Dialogue] = []
+
+    @field_validator("scenario", mode="before")
+    @classmethod
+    def _ignore_invalid_scenario(cls, value: Any) -> Any:
+        return value if isinstance(value, (str, int, float)) else None
+
+    @field_validator("characters", "dialogues", mode="before")
+    @classmethod
+    def _drop_invalid_items(cls, value: Any, info: ValidationInfo) -> List[BaseModel]:
+        if not isinstance(value, list):
+            return []
+        item_model = Character if info.field_name == "characters" else Dialogue
+        valid_items: List[BaseModel] = []
+        for item in value:
+            try:
+                valid_items.append(item_model.model_validate(item))
+            except ValidationError:
+                continue
+        return valid_items
+
+
 class ScriptService:
     """群聊剧本生成服务"""
 
@@ -74,21 +145,24 @@ class ScriptService:
             functions = summary.get("functions", [])
             methods = summary.get("methods", [])
             ai_summary = summary.get("ai_summary", "")
-            preview = summary.get("sanitized_preview", "")[:800]
+            # 项目解析时已切好 preview_800，避免每次构建上下文都重新切片
+            preview = summary.get("preview_800")
+            if preview is None:
+                preview = summary.get("sanitized_preview", "")[:800]
 
-            part = f"文件：{file_path}"
+            lines = [f"文件：{file_path}"]
             if classes:
-                part += f"\n  类：{', '.join(classes)}"
+                lines.append(f"  类：{', '.join(classes)}")
             if functions:
-                part += f"\n  函数：{', '.join(functions[:8])}"
+                lines.append(f"  函数：{', '.join(functions[:8])}")
             if methods:
-                part += f"\n  方法：{', '.join(methods[:8])}"
+                lines.append(f"  方法：{', '.join(methods[:8])}")
             if ai_summary:
-                part += f"\n  功能：{ai_summary}"
+                lines.append(f"  功能：{ai_summary}")
             if preview:
-                part += f"\n  代码片段：\n{preview}"
+                lines.append(f"  代码片段：\n{preview}")
 
-            context_parts.append(part)
+            context_parts.append("\n".join(lines))
 
         return "\n\n".join(context_parts)
 
@@ -162,60 +236,28 @@ class ScriptService:
         Returns:
             校验并修正后的剧本
         """
-        # 确保 scenario 字段存在
-        if "scenario" not in script or not script["scenario"]:
-            script["scenario"] = scenario
-
-        # 确保 characters 字段存在且为列表
-        if "characters" not in script or not isinstance(script["characters"], list):
-            script["characters"] = []
-
-        # 校验每个角色的必要字段
-        valid_characters: List[Dict[str, Any]] = []
-        for character in script["characters"]:
-            if not isinstance(character, dict):
-                continue
-            validated_character = {
-                "id": character.get("id", f"char_{len(valid_characters)}"),
-                "name": character.get("name", "未知角色"),
-                "role": character.get("role", "Unknown"),
-                "personality": character.get("personality", ""),
-            }
-            valid_characters.append(validated_character)
-        script["characters"] = valid_characters
-
-        # 确保 dialogues 字段存在且为列表
-        if "dialogues" not in script or not isinstance(script["dialogues"], list):
-            script["dialogues"] = []
-
-        # 收集有效的角色 ID
-        valid_character_ids = {char["id"] for char in valid_characters}
-
-        # 校验每条对话的必要字段
-        valid_dialogues: List[Dict[str, Any]] = []
-        for dialogue in script["dialogues"]:
-            if not isinstance(dialogue, dict):
-                continue
-            from_id = dialogue.get("from", "")
-            to_id = dialogue.get("to", "")
-            content = dialogue.get("content", "")
-
-            if not content:
-                continue
-
-            # 如果 from/to 不在角色列表中，跳过
-            if from_id not in valid_character_ids or to_id not in valid_character_ids:
-                continue
-
-            valid_dialogues.append({
-                "from": from_id,
-                "to": to_id,
-                "content": content,
-                "code_ref": dialogue.get("code_ref", ""),
-            })
-
-        script["dialogues"] = valid_dialogues
-
+        validated = Script.model_validate(script)
+
+        # 缺失 id 的角色按其在有效角色中的序号补齐
+        characters: List[Dict[str, Any]] = []
+        for index, character in enumerate(validated.characters):
+            if character.id is None:
+                character.id = f"char_{index}"
+            characters.append(character.model_dump())
+
+        # 只保留有内容、且 from/to 都是有效角色的对话
+        valid_character_ids = {character["id"] for character in characters}
+        dialogues: List[Dict[str, Any]] = [
+            dialogue.model_dump(by_alias=True)
+            for dialogue in validated.dialogues
+            if dialogue.content
+            and dialogue.from_id in valid_character_ids
+            and dialogue.to_id in valid_character_ids
+        ]
+
+        script["scenario"] = validated.scenario or scenario
+        script["characters"] = characters
+        script["dialogues"] = dialogues
         return script
 
     def _generate_fallback_script(self, scenario: str) -> Dict[str, Any]:
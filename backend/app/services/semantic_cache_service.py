@@ -0,0 +1,184 @@
+"""
+语义缓存服务
+对输入做向量化后在专用 ChromaDB 集合中检索最相似的历史请求，
+相似度超过阈值时直接复用之前的 LLM 结果，避免对近似问题重复调用大模型。
+集合中只保存输入的向量和摘要，不保存输入原文（可能包含用户源码）。
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+from app.core.config import settings
+from app.services.vector_service import vector_service
+
+logger = logging.getLogger(__name__)
+
+# 语义缓存专用集合名称
+CACHE_COLLECTION_NAME = "llm_response_cache"
+
+
+class SemanticCacheService:
+    """基于向量相似度的 LLM 响应缓存（延迟初始化）"""
+
+    def __init__(self) -> None:
+        self.enabled: bool = settings.SEMANTIC_CACHE_ENABLED
+        self.similarity_threshold: float = settings.SEMANTIC_CACHE_THRESHOLD
+        self.ttl_seconds: int = settings.SEMANTIC_CACHE_TTL_SECONDS
+        self._collection = None
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    @property
+    def collection(self):
+        """首次使用时才创建缓存集合，使用余弦距离便于换算相似度（加锁，可在工作线程中并发调用）"""
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self._collection = vector_service.get_or_create_collection(
+                        CACHE_COLLECTION_NAME,
+                        metadata={"hnsw:space": "cosine"},
+                    )
+                    self._initialized = True
+        return self._collection
+
+    @staticmethod
+    def _build_entry_id(namespace: str, scope: str, text: str) -> str:
+        """按命名空间、作用域和输入文本生成稳定的条目 ID"""
+        raw = f"{namespace}\x00{scope}\x00{text}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    async def lookup(
+        self, namespace: str, text: str, scope: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查找与输入语义相近且未过期的缓存结果（嵌入与 ChromaDB 查询是同步阻塞调用，放到线程池执行）
+
+        Args:
+            namespace: 缓存命名空间（如 chat_script）
+            text: 待匹配的输入文本
+            scope: 作用域（如 task_id），只在同一作用域内匹配
+
+        Returns:
+            命中时返回缓存的响应字典，否则返回 None
+        """
+        if not self.enabled or not text.strip():
+            return None
+        return await asyncio.to_thread(self._lookup_sync, namespace, text, scope)
+
+    def _lookup_sync(
+        self, namespace: str, text: str, scope: str
+    ) -> Optional[Dict[str, Any]]:
+        """lookup 的同步实现，在工作线程中执行"""
+        collection = self.collection
+        if not collection:
+            return None
+
+        try:
+            results = collection.query(
+                query_embeddings=self._embed(text),
+                n_results=1,
+                where={
+                    "$and": [
+                        {"namespace": namespace},
+                        {"scope": scope},
+                        {"ts": {"$gte": time.time() - self.ttl_seconds}},
+                    ]
+                },
+                include=["metadatas", "distances"],
+            )
+        except Exception as error:
+            logger.warning("语义缓存查询失败: %s", str(error))
+            return None
+
+        if not results or not results.get("ids") or not results["ids"][0]:
+            return None
+
+        similarity = 1.0 - results["distances"][0][0]
+        if similarity < self.similarity_threshold:
+            return None
+
+        logger.info("命中语义缓存: namespace=%s, similarity=%.3f", namespace, similarity)
+        return orjson.loads(results["metadatas"][0][0]["response"])
+
+    async def store(
+        self, namespace: str, text: str, response: Dict[str, Any], scope: str = ""
+    ) -> None:
+        """
+        写入缓存条目（相同输入覆盖旧条目）；只保存向量和元数据，不保存输入原文
+
+        Args:
+            namespace: 缓存命名空间
+            text: 输入文本
+            response: LLM 生成的响应字典
+            scope: 作用域
+        """
+        if not self.enabled or not text.strip():
+            return
+        await asyncio.to_thread(self._store_sync, namespace, text, response, scope)
+
+    def _store_sync(
+        self, namespace: str, text: str, response: Dict[str, Any], scope: str
+    ) -> None:
+        """store 的同步实现，在工作线程中执行"""
+        collection = self.collection
+        if not collection:
+            return
+
+        try:
+            collection.upsert(
+                ids=[self._build_entry_id(namespace, scope, text)],
+                embeddings=self._embed(text),
+                metadatas=[{
+                    "namespace": namespace,
+                    "scope": scope,
+                    "response": orjson.dumps(
+                        response, option=orjson.OPT_NON_STR_KEYS
+                    ).decode("utf-8"),
+                    "ts": time.time(),
+                }],
+            )
+        except Exception as error:
+            logger.warning("语义缓存写入失败: %s", str(error))
+
+    @staticmethod
+    def _embed(text: str) -> List[Any]:
+        """计算输入的向量（复用向量服务的查询向量 LRU，lookup 与随后的 store 只嵌入一次）"""
+        embeddings = vector_service.embed_queries([text])
+        if not embeddings:
+            raise RuntimeError("嵌入函数不可用")
+        return embeddings
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        text: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        scope: str = "",
+    ) -> Dict[str, Any]:
+        """
+        先查语义缓存，未命中时调用 compute 生成结果并写回缓存
+
+        Args:
+            namespace: 缓存命名空间
+            text: 输入文本
+            compute: 未命中时执行的协程工厂（通常是 LLM 调用）
+            scope: 作用域
+
+        Returns:
+            响应字典
+        """
+        cached = await self.lookup(namespace, text, scope)
+        if cached is not None:
+            return cached
+
+        response = await compute()
+        await self.store(namespace, text, response, scope)
+        return response
+
+
+semantic_cache_service = SemanticCacheService()
@@ -2,14 +2,75 @@
 向量数据库服务
 使用 ChromaDB 存储和检索代码片段的向量表示
 """
+import asyncio
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
 
+import orjson
+
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 查询向量 LRU 缓存容量（按查询文本 SHA-1 摘要索引）
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+# 检索结果 LRU 缓存：容量与有效期（秒）；写入、删除、重置集合时整体失效
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL_SECONDS = 300
+# 带过滤条件的检索：先取 n_results 的若干倍近邻候选，再在 Python 中按元数据过滤
+PREFILTER_OVERSAMPLE = 10
+PREFILTER_MAX_CANDIDATES = 500
+# 本地嵌入模型单次前向计算的文本数
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+# 写入侧嵌入批处理：并发写入的待嵌入文档攒满该条数，或最早一条等待超过该时长（秒）后合并为一次嵌入请求
+EMBEDDING_BATCH_MAX_SIZE = 64
+EMBEDDING_BATCH_WAIT_SECONDS = 0.02
+
+
+class LocalEmbeddingFunction:
+    """
+    基于 sentence-transformers 的本地嵌入函数（符合 ChromaDB 嵌入函数接口）。
+    一次前向计算处理一整批文本，可利用 GPU / 向量化指令，比逐条嵌入快得多。
+    与 Chroma 默认嵌入函数同为 all-MiniLM-L6-v2（384 维），已有集合可以继续使用。
+    """
+
+    def __init__(self, model: Any) -> None:
+        self._model = model
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        vectors = self._model.encode(
+            list(input),
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    @classmethod
+    def create(cls, model_name: str) -> Optional["LocalEmbeddingFunction"]:
+        """
+        加载本地模型
+
+        Returns:
+            嵌入函数；未安装 sentence-transformers 或模型加载失败时返回 None
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            return None
+        try:
+            return cls(SentenceTransformer(model_name))
+        except Exception as error:
+            logger.warning("本地嵌入模型 %s 加载失败: %s", model_name, str(error))
+            return None
+
+
 class VectorService:
     """向量数据库服务，负责代码片段的存储和语义检索（延迟初始化）"""
 
@@ -19,15 +80,33 @@ class VectorService:
         self._client = None
         self._collection = None
         self._embedding_function = None
+        self._remote_embeddings = False
         self._initialized = False
+        self._init_lock = threading.Lock()
+        self._query_embeddings: "OrderedDict[bytes, Any]" = OrderedDict()
+        # embed_queries 会在多个工作线程中并发执行，查询向量 LRU 的读写需加锁
+        self._query_embeddings_lock = threading.Lock()
+        self._search_cache: "OrderedDict[bytes, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        # 等待嵌入的 (文档, Future) 队列、延时刷新任务、在途的嵌入批次
+        self._embedding_queue: List[Tuple[str, asyncio.Future]] = []
+        self._embedding_flush_task: Optional[asyncio.Task] = None
+        self._embedding_batches: set = set()
 
     def _ensure_initialized(self) -> bool:
-        """延迟初始化：首次调用时才创建 ChromaDB 客户端和集合"""
+        """延迟初始化：首次调用时才创建 ChromaDB 客户端和集合（加锁，可在工作线程中并发调用）"""
         if self._initialized:
             return self._collection is not None
 
-        self._initialized = True
+        with self._init_lock:
+            if not self._initialized:
+                try:
+                    self._initialize_client()
+                finally:
+                    self._initialized = True
+        return self._collection is not None
 
+    def _initialize_client(self) -> None:
+        """创建 ChromaDB 客户端、嵌入函数和集合；失败时只记录日志，集合保持为 None"""
         try:
             import chromadb
             from chromadb.config import Settings as ChromaSettings
@@ -52,20 +131,31 @@ class VectorService:
                         api_base=settings.API_BASE,
                         model_name="text-embedding-ada-002"
                     )
+                    self._remote_embeddings = True
                     logger.info("使用 OpenAI 嵌入模型")
                 except Exception:
-                    self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
-                    logger.warning("OpenAI 嵌入模型不可用，降级使用默认嵌入函数")
+                    self._embedding_function = self._create_fallback_embedding_function(
+                        embedding_functions
+                    )
+                    logger.warning("OpenAI 嵌入模型不可用，已降级")
             else:
-                self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
-                logger.info("未配置 API Key，使用默认嵌入函数")
+                self._embedding_function = self._create_fallback_embedding_function(
+                    embedding_functions
+                )
+                logger.info("未配置 API Key，使用本地嵌入函数")
 
             self._initialize_collection()
-            return self._collection is not None
 
         except Exception as error:
             logger.error("ChromaDB 初始化失败: %s", str(error))
-            return False
+
+    def _create_fallback_embedding_function(self, embedding_functions: Any) -> Any:
+        """优先使用批量计算的本地 sentence-transformers 模型，不可用时退回 Chroma 默认嵌入函数"""
+        local_function = LocalEmbeddingFunction.create(settings.LOCAL_EMBEDDING_MODEL)
+        if local_function is not None:
+            logger.info("使用本地嵌入模型: %s", settings.LOCAL_EMBEDDING_MODEL)
+            return local_function
+        return embedding_functions.DefaultEmbeddingFunction()
 
     @property
     def client(self):
@@ -77,6 +167,32 @@ class VectorService:
         self._ensure_initialized()
         return self._collection
 
+    def warm_up(self) -> None:
+        """
+        预热：完成延迟初始化，本地嵌入模型做一次前向计算加载权重，集合非空时执行一次近邻查询。
+        供应用启动时在后台线程调用，失败只记录日志
+        """
+        if not self._ensure_initialized():
+            return
+
+        try:
+            if not self._remote_embeddings:
+                vector = self._embedding_function(["warmup"])[0]
+                if self._collection.count():
+                    self._collection.query(query_embeddings=[vector], n_results=1)
+            logger.info("向量库预热完成")
+        except Exception as error:
+            logger.warning("向量库预热失败: %s", str(error))
+
+    async def _get_collection(self):
+        """
+        异步获取集合。首次调用时在线程池中完成初始化（创建客户端、加载嵌入模型），
+        避免阻塞事件循环
+        """
+        if not self._initialized:
+            await asyncio.to_thread(self._ensure_initialized)
+        return self._collection
+
     def _initialize_collection(self) -> None:
         """初始化或获取 ChromaDB 集合"""
         try:
@@ -92,13 +208,78 @@ class VectorService:
                 self._collection = self._client.create_collection(
                     name=self.collection_name,
                     embedding_function=self._embedding_function,
-                    metadata={"description": "代码片段向量存储"}
+                    metadata={"description": "代码片段向量存储", **_hnsw_metadata()}
                 )
                 logger.info("创建新集合: %s", self.collection_name)
         except Exception as error:
             logger.error("初始化集合失败: %s", str(error))
             raise
 
+    def get_or_create_collection(
+        self, name: str, metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        获取或创建与代码片段共用嵌入函数的辅助集合（如 LLM 响应缓存）
+
+        Args:
+            name: 集合名称
+            metadata: 集合元数据（可用于指定 hnsw:space 等参数）
+
+        Returns:
+            ChromaDB 集合，初始化失败时返回 None
+        """
+        if not self._ensure_initialized():
+            return None
+
+        try:
+            return self._client.get_or_create_collection(
+                name=name,
+                embedding_function=self._embedding_function,
+                metadata=metadata
+            )
+        except Exception as error:
+            logger.error("获取集合 %s 失败: %s", name, str(error))
+            return None
+
+    def embed_queries(self, queries: List[str]) -> List[Any]:
+        """
+        计算查询文本的向量，命中 LRU 缓存的直接复用，未命中的合并为一次嵌入调用
+
+        Args:
+            queries: 查询文本列表
+
+        Returns:
+            与 queries 一一对应的向量列表
+        """
+        if not queries or not self._ensure_initialized():
+            return []
+
+        keys = [hashlib.sha1(query.encode("utf-8")).digest() for query in queries]
+        # 结果先收集到局部字典：其他线程随后淘汰缓存条目也不影响本次返回
+        vectors_by_key: Dict[bytes, Any] = {}
+        missing: Dict[bytes, str] = {}
+        with self._query_embeddings_lock:
+            for key, query in zip(keys, queries):
+                vector = self._query_embeddings.get(key)
+                if vector is not None:
+                    self._query_embeddings.move_to_end(key)
+                    vectors_by_key[key] = vector
+                else:
+                    missing.setdefault(key, query)
+
+        if missing:
+            # 嵌入计算较慢，不持有锁
+            vectors = self._embedding_function(list(missing.values()))
+            vectors_by_key.update(zip(missing.keys(), vectors))
+            with self._query_embeddings_lock:
+                for key in missing:
+                    self._query_embeddings[key] = vectors_by_key[key]
+                    self._query_embeddings.move_to_end(key)
+                while len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self._query_embeddings.popitem(last=False)
+
+        return [vectors_by_key[key] for key in keys]
+
     async def add_code_fragments(
         self,
         fragments: List[Dict[str, Any]]
@@ -117,7 +298,8 @@ class VectorService:
         Returns:
             成功添加的片段数量
         """
-        if not self.collection:
+        collection = await self._get_collection()
+        if not collection:
             logger.error("集合未初始化")
             return 0
         
@@ -130,6 +312,7 @@ class VectorService:
             ids = []
             documents = []
             metadatas = []
+            content_hashes = []
             
             for fragment in fragments:
                 fragment_id = fragment.get("id", "")
@@ -141,11 +324,14 @@ class VectorService:
                 if not fragment_id or not content:
                     continue
                 
+                content_hash = _content_hash(content)
                 ids.append(fragment_id)
                 documents.append(content)
+                content_hashes.append(content_hash)
                 metadatas.append({
                     "file_path": file_path,
                     "language": language,
+                    "content_hash": content_hash,
                     **additional_metadata
                 })
             
@@ -153,25 +339,132 @@ class VectorService:
                 logger.warning("没有有效的代码片段")
                 return 0
             
-            # 批量添加到 ChromaDB
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                metadatas=metadatas
-            )
-            
-            logger.info("成功添加 %d 个代码片段到向量数据库", len(ids))
-            return len(ids)
+            # 按固定大小分批添加到 ChromaDB（嵌入计算与写入是同步阻塞调用，放到线程池执行）；
+            # 单批失败不影响其余批次
+            batch_size = max(1, settings.VECTOR_ADD_BATCH_SIZE)
+            added_count = 0
+            # 内容相同的片段（生成的样板代码、许可证头等）只做一次嵌入计算，向量在各批次间共享
+            hash_to_embedding: Dict[str, Any] = {}
+            for start in range(0, len(ids), batch_size):
+                end = start + batch_size
+                try:
+                    await self._embed_unique_documents(
+                        documents[start:end],
+                        content_hashes[start:end],
+                        hash_to_embedding,
+                    )
+                    await asyncio.to_thread(
+                        collection.add,
+                        ids=ids[start:end],
+                        documents=documents[start:end],
+                        metadatas=metadatas[start:end],
+                        embeddings=[hash_to_embedding[h] for h in content_hashes[start:end]]
+                    )
+                    added_count += len(ids[start:end])
+                except Exception as error:
+                    logger.error("添加第 %d-%d 个代码片段失败: %s", start + 1, min(end, len(ids)), str(error))
+
+            if added_count:
+                self._search_cache.clear()
+            logger.info("成功添加 %d 个代码片段到向量数据库", added_count)
+            return added_count
             
         except Exception as error:
             logger.error("添加代码片段失败: %s", str(error))
             return 0
 
+    async def _embed_unique_documents(
+        self,
+        documents: List[str],
+        content_hashes: List[str],
+        hash_to_embedding: Dict[str, Any],
+    ) -> None:
+        """
+        计算一批文档中尚未嵌入过的内容的向量，结果写入 hash_to_embedding
+
+        Args:
+            documents: 文档内容列表
+            content_hashes: 与 documents 一一对应的内容摘要
+            hash_to_embedding: 内容摘要 -> 向量（跨批次共享）
+        """
+        missing: Dict[str, str] = {}
+        for content_hash, document in zip(content_hashes, documents):
+            if content_hash not in hash_to_embedding:
+                missing.setdefault(content_hash, document)
+
+        if missing:
+            vectors = await self._embed_documents(list(missing.values()))
+            hash_to_embedding.update(zip(missing.keys(), vectors))
+
+    async def _embed_documents(self, documents: List[str]) -> List[Any]:
+        """
+        把文档交给嵌入批处理器并等待各自的向量。
+        并发的多次写入（如 N 个单片段的 add_code_fragments）会合并：每攒满
+        EMBEDDING_BATCH_MAX_SIZE 条立即发起一次嵌入请求，不足时最多等待
+        EMBEDDING_BATCH_WAIT_SECONDS 再发起，N 次往返降为 ceil(N / 批大小) 次。
+
+        Args:
+            documents: 文档内容列表
+
+        Returns:
+            与 documents 一一对应的向量列表
+
+        Raises:
+            Exception: 所在批次的嵌入调用失败时抛出该异常
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for document in documents:
+            future = loop.create_future()
+            self._embedding_queue.append((document, future))
+            futures.append(future)
+
+        while len(self._embedding_queue) >= EMBEDDING_BATCH_MAX_SIZE:
+            self._start_embedding_batch()
+        if self._embedding_queue and (
+            self._embedding_flush_task is None or self._embedding_flush_task.done()
+        ):
+            self._embedding_flush_task = loop.create_task(self._flush_embedding_queue_later())
+
+        return list(await asyncio.gather(*futures))
+
+    async def _flush_embedding_queue_later(self) -> None:
+        """等待一个批处理窗口后把队列中剩余的文档全部发出"""
+        await asyncio.sleep(EMBEDDING_BATCH_WAIT_SECONDS)
+        while self._embedding_queue:
+            self._start_embedding_batch()
+
+    def _start_embedding_batch(self) -> None:
+        """从队首取出至多 EMBEDDING_BATCH_MAX_SIZE 条文档，后台发起一次嵌入请求"""
+        items = self._embedding_queue[:EMBEDDING_BATCH_MAX_SIZE]
+        del self._embedding_queue[:EMBEDDING_BATCH_MAX_SIZE]
+        task = asyncio.get_running_loop().create_task(self._run_embedding_batch(items))
+        # 事件循环只持有任务的弱引用，需自行保留到完成
+        self._embedding_batches.add(task)
+        task.add_done_callback(self._embedding_batches.discard)
+
+    async def _run_embedding_batch(self, items: List[Tuple[str, asyncio.Future]]) -> None:
+        """在线程池中执行一次嵌入调用（批内相同文本只嵌入一次），把结果分发给各 Future"""
+        unique_documents = list(dict.fromkeys(document for document, _ in items))
+        try:
+            vectors = await asyncio.to_thread(self._embedding_function, unique_documents)
+        except Exception as error:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        vector_by_document = dict(zip(unique_documents, vectors))
+        for document, future in items:
+            if not future.done():
+                future.set_result(vector_by_document[document])
+
     async def search_similar_code(
         self,
         query: str,
         n_results: int = 5,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[Any] = None
     ) -> List[Dict[str, Any]]:
         """
         语义搜索相似的代码片段
@@ -180,40 +473,138 @@ class VectorService:
             query: 查询文本（自然语言或代码片段）
             n_results: 返回结果数量
             filters: 元数据过滤条件（如 {"language": "python"}）
+            query_embedding: 预先计算好的查询向量，为空时走缓存计算
 
         Returns:
             相似代码片段列表，按相似度排序
         """
-        if not self.collection:
-            logger.error("集合未初始化")
+        results = await self.search_similar_code_batch(
+            [query],
+            n_results=n_results,
+            filters=filters,
+            query_embeddings=None if query_embedding is None else [query_embedding]
+        )
+        logger.info("查询 '%s' 找到 %d 个结果", query[:50], len(results[0]))
+        return results[0]
+
+    async def search_similar_code_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        filters: Optional[Dict[str, Any]] = None,
+        query_embeddings: Optional[List[Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量语义搜索：未命中缓存的查询合并为一次嵌入调用和一次 collection.query
+
+        Args:
+            queries: 查询文本列表
+            n_results: 每个查询返回的结果数量
+            filters: 所有查询共用的元数据过滤条件
+            query_embeddings: 与 queries 一一对应的预先计算好的查询向量，为空时走缓存计算
+
+        Returns:
+            与 queries 一一对应的结果列表；检索失败的查询对应空列表
+        """
+        if not queries:
             return []
+
+        cache_keys = [_search_cache_key(query, n_results, filters) for query in queries]
+        results: List[Optional[List[Dict[str, Any]]]] = [
+            self._get_cached_search(key) for key in cache_keys
+        ]
+        pending = [index for index, items in enumerate(results) if items is None]
+        if not pending:
+            return results
+
+        collection = await self._get_collection()
+        if not collection:
+            logger.error("集合未初始化")
+            return [items if items is not None else [] for items in results]
         
         try:
-            # 执行查询
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=filters
-            )
-            
-            # 格式化结果
-            formatted_results = []
-            
-            if results and results.get("ids") and results["ids"][0]:
-                for i, doc_id in enumerate(results["ids"][0]):
-                    formatted_results.append({
-                        "id": doc_id,
-                        "content": results["documents"][0][i],
-                        "metadata": results["metadatas"][0][i],
-                        "similarity": 1.0 - results["distances"][0][i] if "distances" in results else None
-                    })
-            
-            logger.info("查询 '%s' 找到 %d 个结果", query[:50], len(formatted_results))
-            return formatted_results
-            
+            if query_embeddings is None:
+                embeddings = await asyncio.to_thread(
+                    self.embed_queries, [queries[index] for index in pending]
+                )
+            else:
+                embeddings = [query_embeddings[index] for index in pending]
+
+            found = await self._query_collection(collection, embeddings, n_results, filters)
         except Exception as error:
             logger.error("语义搜索失败: %s", str(error))
-            return []
+            return [items if items is not None else [] for items in results]
+
+        for index, items in zip(pending, found):
+            self._set_cached_search(cache_keys[index], items)
+            results[index] = list(items)
+        return results
+
+    async def _query_collection(
+        self,
+        collection: Any,
+        embeddings: List[Any],
+        n_results: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """对一批查询向量执行近邻检索，返回与 embeddings 一一对应的结果"""
+        found: List[List[Dict[str, Any]]] = [[] for _ in embeddings]
+        needs_where = list(range(len(embeddings)))
+
+        # 简单的等值 / $in 过滤先做不带 where 的 HNSW 近邻检索，再在 Python 中按元数据过滤，
+        # 避免 Chroma 元数据过滤在大集合上退化为全量扫描
+        if filters and _is_simple_filter(filters):
+            candidate_count = min(
+                n_results * PREFILTER_OVERSAMPLE, PREFILTER_MAX_CANDIDATES
+            )
+            candidates_per_query = _format_query_results(await asyncio.to_thread(
+                collection.query,
+                query_embeddings=embeddings,
+                n_results=candidate_count
+            ), len(embeddings))
+            needs_where = []
+            for index, candidates in enumerate(candidates_per_query):
+                matched = [
+                    item for item in candidates
+                    if _matches_filters(item["metadata"], filters)
+                ][:n_results]
+                # 候选集被占满仍凑不够结果时，说明过滤条件较稀疏，退回带 where 的查询
+                if len(matched) < n_results and len(candidates) >= candidate_count:
+                    needs_where.append(index)
+                else:
+                    found[index] = matched
+
+        if needs_where:
+            # ChromaDB 查询是同步阻塞调用，放到线程池执行
+            where_results = _format_query_results(await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[embeddings[index] for index in needs_where],
+                n_results=n_results,
+                where=filters
+            ), len(needs_where))
+            for index, items in zip(needs_where, where_results):
+                found[index] = items
+
+        return found
+
+    def _get_cached_search(self, key: bytes) -> Optional[List[Dict[str, Any]]]:
+        """读取检索结果缓存，未命中或已过期返回 None"""
+        entry = self._search_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            del self._search_cache[key]
+            return None
+        self._search_cache.move_to_end(key)
+        return list(results)
+
+    def _set_cached_search(self, key: bytes, results: List[Dict[str, Any]]) -> None:
+        """写入检索结果缓存，超出容量时淘汰最久未使用的条目"""
+        self._search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL_SECONDS, results)
+        self._search_cache.move_to_end(key)
+        while len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
 
     async def get_fragment_by_id(self, fragment_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -225,12 +616,14 @@ class VectorService:
         Returns:
             代码片段信息，如果不存在则返回 None
         """
-        if not self.collection:
+        collection = await self._get_collection()
+        if not collection:
             logger.error("集合未初始化")
             return None
         
         try:
-            results = self.collection.get(
+            results = await asyncio.to_thread(
+                collection.get,
                 ids=[fragment_id],
                 include=["documents", "metadatas"]
             )
@@ -258,26 +651,25 @@ class VectorService:
         Returns:
             删除的片段数量
         """
-        if not self.collection:
+        collection = await self._get_collection()
+        if not collection:
             logger.error("集合未初始化")
             return 0
         
         try:
-            # 查找所有匹配的片段
-            results = self.collection.get(
-                where={"file_path": file_path},
-                include=["documents"]
+            # 只取 id（include=[] 不回传文档内容和元数据），取 id 与删除合并为一次线程池调用
+            deleted_ids = await asyncio.to_thread(
+                _delete_where, collection, {"file_path": file_path}
             )
             
-            if not results or not results.get("ids"):
+            if not deleted_ids:
                 logger.info("没有找到文件 %s 的代码片段", file_path)
                 return 0
             
-            # 删除片段
-            self.collection.delete(ids=results["ids"])
+            self._search_cache.clear()
             
-            logger.info("删除文件 %s 的 %d 个代码片段", file_path, len(results["ids"]))
-            return len(results["ids"])
+            logger.info("删除文件 %s 的 %d 个代码片段", file_path, len(deleted_ids))
+            return len(deleted_ids)
             
         except Exception as error:
             logger.error("删除代码片段失败: %s", str(error))
@@ -290,11 +682,12 @@ class VectorService:
         Returns:
             统计信息字典
         """
-        if not self.collection:
+        collection = await self._get_collection()
+        if not collection:
             return {"error": "集合未初始化"}
         
         try:
-            count = self.collection.count()
+            count = await asyncio.to_thread(collection.count)
             return {
                 "collection_name": self.collection_name,
                 "total_fragments": count,
@@ -311,19 +704,116 @@ class VectorService:
         Returns:
             是否成功
         """
-        if not self.collection:
+        collection = await self._get_collection()
+        if not collection:
             return False
 
         try:
-            self._client.delete_collection(name=self.collection_name)
-            self._collection = None
-            self._initialize_collection()
+            self._search_cache.clear()
+            await asyncio.to_thread(self._recreate_collection)
             logger.info("集合 %s 已重置", self.collection_name)
             return True
         except Exception as error:
             logger.error("重置集合失败: %s", str(error))
             return False
 
+    def _recreate_collection(self) -> None:
+        """删除并重新创建代码片段集合（同步阻塞，由 reset_collection 放到线程池执行）"""
+        self._client.delete_collection(name=self.collection_name)
+        self._collection = None
+        self._initialize_collection()
+
+
+def _hnsw_metadata() -> Dict[str, Any]:
+    """新建集合时传给 Chroma 的 HNSW 索引参数"""
+    return {
+        "hnsw:space": settings.VECTOR_HNSW_SPACE,
+        "hnsw:M": settings.VECTOR_HNSW_M,
+        "hnsw:construction_ef": settings.VECTOR_HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": settings.VECTOR_HNSW_SEARCH_EF,
+        "hnsw:batch_size": settings.VECTOR_HNSW_BATCH_SIZE,
+        "hnsw:sync_threshold": settings.VECTOR_HNSW_SYNC_THRESHOLD,
+    }
+
+
+def _delete_where(collection: Any, where: Dict[str, Any]) -> List[str]:
+    """删除满足 where 条件的片段（同步阻塞），返回被删除的 id 列表"""
+    results = collection.get(where=where, include=[])
+    ids = results.get("ids") if results else None
+    if ids:
+        collection.delete(ids=ids)
+    return ids or []
+
+
+def _search_cache_key(
+    query: str, n_results: int, filters: Optional[Dict[str, Any]]
+) -> bytes:
+    """检索结果缓存 key：查询文本、结果数量和规范化（键排序）后的过滤条件的 SHA-1 摘要"""
+    payload = orjson.dumps([query, n_results, filters], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha1(payload).digest()
+
+
+def _content_hash(content: str) -> str:
+    """片段内容的 128 位摘要（十六进制，可直接存入 Chroma 元数据）"""
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _format_query_results(
+    results: Optional[Dict[str, Any]], query_count: int
+) -> List[List[Dict[str, Any]]]:
+    """将 collection.query 返回的二维并行列表转为每个查询的逐条结果"""
+    formatted_results: List[List[Dict[str, Any]]] = []
+    ids_per_query = (results or {}).get("ids") or []
+    for query_index in range(query_count):
+        items = []
+        ids = ids_per_query[query_index] if query_index < len(ids_per_query) else []
+        for i, doc_id in enumerate(ids):
+            items.append({
+                "id": doc_id,
+                "content": results["documents"][query_index][i],
+                "metadata": results["metadatas"][query_index][i],
+                "similarity": (
+                    1.0 - results["distances"][query_index][i] if "distances" in results else None
+                )
+            })
+        formatted_results.append(items)
+    return formatted_results
+
+
+def _is_simple_filter(filters: Dict[str, Any]) -> bool:
+    """过滤条件是否只包含字段等值、$eq 或 $in（可以在 Python 中等价判断）"""
+    for key, condition in filters.items():
+        if key.startswith("$"):
+            return False
+        if isinstance(condition, dict):
+            if len(condition) != 1:
+                return False
+            operator, operand = next(iter(condition.items()))
+            if operator == "$in":
+                if not isinstance(operand, list):
+                    return False
+            elif operator != "$eq":
+                return False
+    return True
+
+
+def _matches_filters(metadata: Optional[Dict[str, Any]], filters: Dict[str, Any]) -> bool:
+    """判断元数据是否满足 _is_simple_filter 认可的过滤条件"""
+    metadata = metadata or {}
+    for key, condition in filters.items():
+        if key not in metadata:
+            return False
+        value = metadata[key]
+        if isinstance(condition, dict):
+            operator, operand = next(iter(condition.items()))
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$eq" and value != operand:
+                return False
+        elif value != condition:
+            return False
+    return True
+
 
 # 全局单例
 vector_service = VectorService()
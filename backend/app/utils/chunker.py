@@ -2,8 +2,13 @@
 代码分片与摘要提取工具
 将源代码文件拆分为可管理的片段，并提取类名、函数名、注释等关键信息。
 """
+import hashlib
+import os
 import re
-from typing import Dict, List, Any
+import stat
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from pathlib import Path
 
 
@@ -37,15 +42,43 @@ CONFIG_EXTENSIONS = {
 
 MAX_FILE_SIZE_BYTES = 500 * 1024  # 500KB，超过此大小的文件只提取摘要
 MAX_CHUNK_CHARS = 2000  # 每个分片最大字符数
+SCAN_CHUNK_SIZE = 32  # 提交到进程池时每批文件数，摊薄进程间通信开销
+PREVIEW_DECODE_BYTES = 64 * 1024  # 只需预览的文件最多解码的字节数
+PREVIEW_LINES = 10  # 通用提取保留的预览行数
+BINARY_SNIFF_BYTES = 512  # 检查开头多少字节内是否有 NUL 来识别二进制文件
+SUMMARY_CACHE_SIZE = 4096  # 按内容摘要缓存的提取结果条数（每个进程池 worker 各自一份）
+
+# 有专用摘要提取器、需要完整解码全文的扩展名；其余文件只取开头若干行作为预览
+_JS_LIKE_EXTENSIONS = {".js", ".ts", ".jsx", ".tsx", ".vue", ".svelte"}
+_FULL_PARSE_EXTENSIONS = {".py", ".java"} | _JS_LIKE_EXTENSIONS
+
+
+# 供 str.endswith 一次性匹配的后缀元组
+_SKIP_FILE_SUFFIXES = tuple(SKIP_FILE_PATTERNS)
+
+
+def should_skip_name(name: str) -> bool:
+    """
+    判断单个目录项名称是否应该跳过。
+    供逐级遍历目录的调用方使用（祖先目录已检查过），无需构造 Path 对象。
+    """
+    return name in SKIP_DIRECTORIES or name.lower().endswith(_SKIP_FILE_SUFFIXES)
+
+
+# 整条相对路径的跳过规则合并为一个正则，一次 C 层扫描完成匹配：
+# 任一路径段命中 SKIP_DIRECTORIES（区分大小写），或文件名以 SKIP_FILE_PATTERNS 结尾（不区分大小写）
+_SKIP_PATH_RE = re.compile(
+    "(?:^|/)(?:"
+    + "|".join(map(re.escape, sorted(SKIP_DIRECTORIES)))
+    + ")(?:/|$)|(?i:"
+    + "|".join(map(re.escape, sorted(SKIP_FILE_PATTERNS)))
+    + ")$"
+)
 
 
 def should_skip_path(path: Path) -> bool:
     """判断是否应该跳过该路径"""
-    for part in path.parts:
-        if part in SKIP_DIRECTORIES:
-            return True
-    file_name = path.name.lower()
-    return any(file_name.endswith(pattern) for pattern in SKIP_FILE_PATTERNS)
+    return _SKIP_PATH_RE.search(path.as_posix()) is not None
 
 
 def is_code_file(path: Path) -> bool:
@@ -53,21 +86,53 @@ def is_code_file(path: Path) -> bool:
     return path.suffix.lower() in CODE_EXTENSIONS
 
 
+def is_code_name(name: str) -> bool:
+    """
+    按文件名判断是否为源代码文件，与 is_code_file 结果一致。
+    供逐个文件名过滤的热路径使用，无需构造 Path 对象。
+    """
+    # 与 PurePath.suffix 相同：以点开头的隐藏文件和以点结尾的名称没有扩展名
+    dot = name.rfind(".")
+    return 0 < dot < len(name) - 1 and name[dot:].lower() in CODE_EXTENSIONS
+
+
 def is_config_file(path: Path) -> bool:
     """判断是否为配置/文档文件"""
     return path.suffix.lower() in CONFIG_EXTENSIONS
 
 
+# 各语言摘要提取使用的正则，模块加载时编译一次，逐文件调用时无需再查 re 模块的缓存
+_PY_CLASS_RE = re.compile(r"^class\s+(\w+)", re.MULTILINE)
+_PY_FUNCTION_RE = re.compile(r"^(?:async\s+)?def\s+(\w+)", re.MULTILINE)
+_PY_IMPORT_RE = re.compile(r"^(?:from\s+\S+\s+)?import\s+(.+)$", re.MULTILINE)
+_PY_DOCSTRING_RE = re.compile(r'"""(.*?)"""', re.DOTALL)
+
+_JS_CLASS_RE = re.compile(r"(?:export\s+)?class\s+(\w+)")
+_JS_FUNCTION_RE = re.compile(r"(?:export\s+)?(?:async\s+)?function\s+(\w+)")
+_JS_ARROW_FUNCTION_RE = re.compile(
+    r"(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?\("
+)
+_JS_IMPORT_RE = re.compile(r"import\s+.*?from\s+['\"](.+?)['\"]")
+_JS_REACT_COMPONENT_RE = re.compile(r"(?:export\s+default\s+)?function\s+([A-Z]\w+)")
+
+_JAVA_CLASS_RE = re.compile(r"(?:public|private|protected)?\s*class\s+(\w+)")
+_JAVA_INTERFACE_RE = re.compile(r"interface\s+(\w+)")
+_JAVA_METHOD_RE = re.compile(r"(?:public|private|protected)\s+\w+\s+(\w+)\s*\(")
+_JAVA_IMPORT_RE = re.compile(r"import\s+([\w.]+);")
+_JAVA_PACKAGE_RE = re.compile(r"package\s+([\w.]+);")
+
+
 def extract_python_summary(content: str) -> Dict[str, Any]:
     """提取 Python 文件的类名、函数名、导入和文档字符串"""
-    classes = re.findall(r"^class\s+(\w+)", content, re.MULTILINE)
-    functions = re.findall(r"^(?:async\s+)?def\s+(\w+)", content, re.MULTILINE)
-    imports = re.findall(r"^(?:from\s+\S+\s+)?import\s+(.+)$", content, re.MULTILINE)
-    docstrings = re.findall(r'"""(.*?)"""', content, re.DOTALL)
+    classes = _PY_CLASS_RE.findall(content)
+    functions = _PY_FUNCTION_RE.findall(content)
+    imports = _PY_IMPORT_RE.findall(content)
+    # 只需要第一个文档字符串，search 找到即停，不必扫描全文
+    docstring_match = _PY_DOCSTRING_RE.search(content)
 
     top_docstring = ""
-    if docstrings:
-        top_docstring = docstrings[0].strip()[:200]
+    if docstring_match:
+        top_docstring = docstring_match.group(1).strip()[:200]
 
     return {
         "classes": classes,
@@ -79,17 +144,11 @@ def extract_python_summary(content: str) -> Dict[str, Any]:
 
 def extract_javascript_summary(content: str) -> Dict[str, Any]:
     """提取 JavaScript/TypeScript 文件的类名、函数名、导入"""
-    classes = re.findall(r"(?:export\s+)?class\s+(\w+)", content)
-    functions = re.findall(
-        r"(?:export\s+)?(?:async\s+)?function\s+(\w+)", content
-    )
-    arrow_functions = re.findall(
-        r"(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?\(", content
-    )
-    imports = re.findall(r"import\s+.*?from\s+['\"](.+?)['\"]", content)
-    react_components = re.findall(
-        r"(?:export\s+default\s+)?function\s+([A-Z]\w+)", content
-    )
+    classes = _JS_CLASS_RE.findall(content)
+    functions = _JS_FUNCTION_RE.findall(content)
+    arrow_functions = _JS_ARROW_FUNCTION_RE.findall(content)
+    imports = _JS_IMPORT_RE.findall(content)
+    react_components = _JS_REACT_COMPONENT_RE.findall(content)
 
     return {
         "classes": classes,
@@ -101,22 +160,18 @@ def extract_javascript_summary(content: str) -> Dict[str, Any]:
 
 def extract_java_summary(content: str) -> Dict[str, Any]:
     """提取 Java 文件的类名、方法名、导入"""
-    classes = re.findall(
-        r"(?:public|private|protected)?\s*class\s+(\w+)", content
-    )
-    interfaces = re.findall(r"interface\s+(\w+)", content)
-    methods = re.findall(
-        r"(?:public|private|protected)\s+\w+\s+(\w+)\s*\(", content
-    )
-    imports = re.findall(r"import\s+([\w.]+);", content)
-    package_name = re.findall(r"package\s+([\w.]+);", content)
+    classes = _JAVA_CLASS_RE.findall(content)
+    interfaces = _JAVA_INTERFACE_RE.findall(content)
+    methods = _JAVA_METHOD_RE.findall(content)
+    imports = _JAVA_IMPORT_RE.findall(content)
+    package_match = _JAVA_PACKAGE_RE.search(content)
 
     return {
         "classes": classes,
         "interfaces": interfaces,
         "methods": methods,
         "imports": imports[:10],
-        "package": package_name[0] if package_name else "",
+        "package": package_match.group(1) if package_match else "",
     }
 
 
@@ -144,19 +199,70 @@ def extract_file_summary(file_path: str, content: str) -> Dict[str, Any]:
     }
 
     if suffix == ".py":
-        base_summary.update(extract_python_summary(content))
-    elif suffix in {".js", ".ts", ".jsx", ".tsx", ".vue", ".svelte"}:
-        base_summary.update(extract_javascript_summary(content))
+        base_summary.update(_extract_cached(extract_python_summary, content))
+    elif suffix in _JS_LIKE_EXTENSIONS:
+        base_summary.update(_extract_cached(extract_javascript_summary, content))
     elif suffix == ".java":
-        base_summary.update(extract_java_summary(content))
+        base_summary.update(_extract_cached(extract_java_summary, content))
     else:
         # 通用提取：取前 10 行作为预览
-        preview_lines = content.split("\n")[:10]
+        preview_lines = content.split("\n", PREVIEW_LINES)[:PREVIEW_LINES]
         base_summary["preview"] = "\n".join(preview_lines)
 
     return base_summary
 
 
+# 提取结果 LRU 缓存：key 为（提取器名 + 内容）的 128 位摘要，不持有源码字符串本身
+_summary_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+
+
+def _extract_cached(
+    extractor: Callable[[str], Dict[str, Any]], content: str
+) -> Dict[str, Any]:
+    """
+    按内容摘要缓存提取结果，重复上传同一项目时未改动的文件无需再跑正则。
+    返回浅拷贝，调用方修改返回的字典不会影响缓存。
+    """
+    hasher = hashlib.blake2b(extractor.__name__.encode("utf-8"), digest_size=16)
+    hasher.update(content.encode("utf-8", errors="surrogatepass"))
+    key = hasher.digest()
+
+    summary = _summary_cache.get(key)
+    if summary is not None:
+        _summary_cache.move_to_end(key)
+        return dict(summary)
+
+    summary = extractor(content)
+    _summary_cache[key] = summary
+    while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
+    return dict(summary)
+
+
+def _extract_preview_summary(file_path: str, raw: bytes) -> Dict[str, Any]:
+    """
+    只需预览的文件（配置、文档及没有专用提取器的语言）：行数直接在字节上统计，
+    只解码开头 PREVIEW_DECODE_BYTES 字节取预览，不必解码全文。
+    结果与对 UTF-8 文本模式读入的内容调用 extract_file_summary 一致
+    （\r 与 \n 之间夹有非法 UTF-8 字节的情况除外）；
+    调用方只对不超过 MAX_FILE_SIZE_BYTES 的文件使用，因此 is_large 恒为 False。
+    """
+    path = Path(file_path)
+    # 与文本模式的通用换行一致：\r\n、\r、\n 各算一个换行（UTF-8 多字节序列中不会出现这两个字节）
+    line_count = raw.count(b"\n") + raw.count(b"\r") - raw.count(b"\r\n") + 1
+    head = raw[:PREVIEW_DECODE_BYTES].decode("utf-8", errors="ignore")
+    head = head.replace("\r\n", "\n").replace("\r", "\n")
+
+    return {
+        "file_path": file_path,
+        "file_name": path.name,
+        "extension": path.suffix.lower(),
+        "line_count": line_count,
+        "is_large": False,
+        "preview": "\n".join(head.split("\n", PREVIEW_LINES)[:PREVIEW_LINES]),
+    }
+
+
 def chunk_code(content: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
     """
     将代码内容按逻辑边界分片。
@@ -172,76 +278,124 @@ def chunk_code(content: str, max_chars: int = MAX_CHUNK_CHARS) -> List[str]:
     if len(content) <= max_chars:
         return [content]
 
+    # 每个分片用一次 rfind 定位窗口内最后一个换行符（C 层扫描），直接按偏移切片，
+    # 不再先 split 出整份行列表、再逐行累加并 join 回分片
     chunks: List[str] = []
-    lines = content.split("\n")
-    current_chunk_lines: List[str] = []
-    current_length = 0
-
-    for line in lines:
-        line_length = len(line) + 1  # +1 for newline
+    chunk_start = 0
 
-        if current_length + line_length > max_chars and current_chunk_lines:
-            chunks.append("\n".join(current_chunk_lines))
-            current_chunk_lines = []
-            current_length = 0
+    while True:
+        limit = chunk_start + max_chars
+        if len(content) < limit:
+            break
 
-        current_chunk_lines.append(line)
-        current_length += line_length
+        cut = content.rfind("\n", chunk_start, limit)
+        if cut == -1:
+            # 单行超过 max_chars 时整行独占一个分片
+            cut = content.find("\n", chunk_start)
+            if cut == -1:
+                break
 
-    if current_chunk_lines:
-        chunks.append("\n".join(current_chunk_lines))
+        chunks.append(content[chunk_start:cut])
+        chunk_start = cut + 1
 
+    chunks.append(content[chunk_start:])
     return chunks
 
 
-def scan_project_files(root_dir: str) -> List[Dict[str, Any]]:
+def scan_project_files(
+    root_dir: str, executor: Optional[Executor] = None
+) -> List[Dict[str, Any]]:
     """
     扫描项目目录，提取所有有效文件的摘要。
+    自顶向下遍历并原地剪掉 SKIP_DIRECTORIES，node_modules、.git 等子树不会被进入。
 
     Args:
         root_dir: 项目根目录路径
+        executor: 执行逐文件读取与摘要提取的执行器（通常为共享进程池），为空时在当前线程顺序执行
 
     Returns:
-        文件摘要列表
+        文件摘要列表（按相对路径排序）
     """
-    root_path = Path(root_dir)
     file_summaries: List[Dict[str, Any]] = []
 
-    if not root_path.exists():
+    if not os.path.isdir(root_dir):
         return file_summaries
 
-    for file_path in sorted(root_path.rglob("*")):
-        if not file_path.is_file():
-            continue
-
-        if should_skip_path(file_path):
-            continue
-
-        relative_path = str(file_path.relative_to(root_path))
-
-        if not (is_code_file(file_path) or is_config_file(file_path)):
-            continue
+    candidates: List[Tuple[Tuple[str, ...], str, str]] = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        dir_names[:] = [name for name in dir_names if name not in SKIP_DIRECTORIES]
+        relative_dir = os.path.relpath(dir_path, root_dir)
+        for name in file_names:
+            if should_skip_name(name):
+                continue
+            suffix = os.path.splitext(name)[1].lower()
+            if suffix not in CODE_EXTENSIONS and suffix not in CONFIG_EXTENSIONS:
+                continue
+            relative_path = name if relative_dir == "." else os.path.join(relative_dir, name)
+            candidates.append(
+                (tuple(relative_path.split(os.sep)), relative_path, os.path.join(dir_path, name))
+            )
+
+    # 与 sorted(Path.rglob()) 的顺序保持一致：按路径段逐级比较
+    candidates.sort()
+    file_paths = [file_path for _parts, _relative, file_path in candidates]
+    relative_paths = [relative_path for _parts, relative_path, _file in candidates]
+
+    if executor is None:
+        results = map(summarize_project_file, file_paths, relative_paths)
+    else:
+        results = executor.map(
+            summarize_project_file, file_paths, relative_paths, chunksize=SCAN_CHUNK_SIZE
+        )
 
-        try:
-            file_size = file_path.stat().st_size
+    file_summaries.extend(summary for summary in results if summary is not None)
+    return file_summaries
 
-            # 超大文件只记录元信息
-            if file_size > MAX_FILE_SIZE_BYTES:
-                file_summaries.append({
-                    "file_path": relative_path,
-                    "file_name": file_path.name,
-                    "extension": file_path.suffix.lower(),
-                    "line_count": 0,
-                    "is_large": True,
-                    "note": f"文件过大（{file_size // 1024}KB），仅记录元信息",
-                })
-                continue
 
-            content = file_path.read_text(encoding="utf-8", errors="ignore")
-            summary = extract_file_summary(relative_path, content)
-            file_summaries.append(summary)
+def summarize_project_file(file_path: str, relative_path: str) -> Optional[Dict[str, Any]]:
+    """
+    读取单个文件并提取摘要。
+    只依赖标准库和本模块，可直接提交到进程池执行。
 
-        except (PermissionError, OSError):
-            continue
+    Args:
+        file_path: 文件的绝对路径
+        relative_path: 项目内相对路径
 
-    return file_summaries
+    Returns:
+        文件摘要；不是普通文件、是二进制文件或读取失败时返回 None
+    """
+    try:
+        file_stat = os.stat(file_path)
+        if not stat.S_ISREG(file_stat.st_mode):
+            return None
+
+        file_size = file_stat.st_size
+        file_name = os.path.basename(relative_path)
+
+        # 超大文件只记录元信息
+        if file_size > MAX_FILE_SIZE_BYTES:
+            return {
+                "file_path": relative_path,
+                "file_name": file_name,
+                "extension": os.path.splitext(file_name)[1].lower(),
+                "line_count": 0,
+                "is_large": True,
+                "note": f"文件过大（{file_size // 1024}KB），仅记录元信息",
+            }
+
+        with open(file_path, "rb") as file:
+            raw = file.read()
+
+        # 开头出现 NUL 字节视为二进制文件（如误用代码扩展名的产物、UTF-16 文本），跳过
+        if b"\x00" in raw[:BINARY_SNIFF_BYTES]:
+            return None
+
+        if os.path.splitext(file_name)[1].lower() not in _FULL_PARSE_EXTENSIONS:
+            return _extract_preview_summary(relative_path, raw)
+
+        # 与文本模式读取一致：先解码，再把 \r\n、\r 统一为 \n
+        content = raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+        return extract_file_summary(relative_path, content)
+
+    except (PermissionError, OSError):
+        return None
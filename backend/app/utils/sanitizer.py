@@ -3,16 +3,31 @@
 在发送给大模型之前，通过正则过滤 API_KEY、PASSWORD、IP 地址等敏感信息。
 """
 import re
-from typing import List, Tuple
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# 代码预览长度，以及为其读取的最大字符数（大文件不再整份读入，留足余量应对脱敏后长度变化）
+PREVIEW_MAX_CHARS = 3000
+PREVIEW_READ_CHARS = 16384
+
+# 密钥类、密码类变量名关键字（正则片段）
+_API_KEY_NAMES = r"api[_-]?key|secret[_-]?key|access[_-]?token|auth[_-]?token|private[_-]?key"
+_PASSWORD_NAMES = r"password|passwd|pwd|secret|token|credential"
+
+_ENV_SECRET_RE = re.compile(
+    r"(?im)^((?:API_KEY|SECRET_KEY|PASSWORD|DB_PASSWORD|AUTH_TOKEN|ACCESS_TOKEN|PRIVATE_KEY)\s*=\s*)(.+)$"
+)
+_IPV4_RE = re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b")
+_EMAIL_RE = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b")
 
 # 脱敏规则：(正则模式, 替换文本, 描述)
 SANITIZE_RULES: List[Tuple[re.Pattern, str, str]] = [
     # API Key / Secret / Token — 双引号赋值
     (
         re.compile(
-            r'(?i)(api[_-]?key|secret[_-]?key|access[_-]?token|auth[_-]?token|private[_-]?key)'
+            rf'({_API_KEY_NAMES})'
             r'(\s*[:=]\s*)"[^"]*"',
-            re.MULTILINE,
+            re.IGNORECASE | re.MULTILINE,
         ),
         r'\1\2"***REDACTED***"',
         "API Key (double-quoted)",
@@ -20,9 +35,9 @@ SANITIZE_RULES: List[Tuple[re.Pattern, str, str]] = [
     # API Key / Secret / Token — 单引号赋值
     (
         re.compile(
-            r"(?i)(api[_-]?key|secret[_-]?key|access[_-]?token|auth[_-]?token|private[_-]?key)"
+            rf"({_API_KEY_NAMES})"
             r"(\s*[:=]\s*)'[^']*'",
-            re.MULTILINE,
+            re.IGNORECASE | re.MULTILINE,
         ),
         r"\1\2'***REDACTED***'",
         "API Key (single-quoted)",
@@ -30,9 +45,9 @@ SANITIZE_RULES: List[Tuple[re.Pattern, str, str]] = [
     # Password / Credential — 双引号赋值
     (
         re.compile(
-            r'(?i)(password|passwd|pwd|secret|token|credential)'
+            rf'({_PASSWORD_NAMES})'
             r'(\s*[:=]\s*)"[^"]*"',
-            re.MULTILINE,
+            re.IGNORECASE | re.MULTILINE,
         ),
         r'\1\2"***REDACTED***"',
         "Password (double-quoted)",
@@ -40,35 +55,66 @@ SANITIZE_RULES: List[Tuple[re.Pattern, str, str]] = [
     # Password / Credential — 单引号赋值
     (
         re.compile(
-            r"(?i)(password|passwd|pwd|secret|token|credential)"
+            rf"({_PASSWORD_NAMES})"
             r"(\s*[:=]\s*)'[^']*'",
-            re.MULTILINE,
+            re.IGNORECASE | re.MULTILINE,
         ),
         r"\1\2'***REDACTED***'",
         "Password (single-quoted)",
     ),
     # 无引号的简单赋值（如 .env 文件）
-    (
-        re.compile(
-            r"(?im)^((?:API_KEY|SECRET_KEY|PASSWORD|DB_PASSWORD|AUTH_TOKEN|ACCESS_TOKEN|PRIVATE_KEY)\s*=\s*)(.+)$"
-        ),
-        r"\1***REDACTED***",
-        "Env variable secret",
-    ),
+    (_ENV_SECRET_RE, r"\1***REDACTED***", "Env variable secret"),
     # IPv4 地址
-    (
-        re.compile(r"\b(?:\d{1,3}\.){3}\d{1,3}\b"),
-        "***.***.***.***",
-        "IPv4 Address",
-    ),
+    (_IPV4_RE, "***.***.***.***", "IPv4 Address"),
     # 邮箱地址
-    (
-        re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"),
-        "***@***.***",
-        "Email Address",
-    ),
+    (_EMAIL_RE, "***@***.***", "Email Address"),
 ]
 
+
+
+def _name_first_chars(names: str) -> str:
+    """关键字正则片段中各关键字的首字母"""
+    return "".join(sorted({name[0] for name in names.split("|")}))
+
+
+def _compile_pass(rule: re.Pattern, name_first_chars: str = "") -> re.Pattern:
+    """
+    编译 sanitize_code 实际执行的扫描正则：对关键字规则用前瞻限定首字母，
+    让回溯引擎在绝大多数位置立即失败，匹配结果与规则本身一致。
+    必须使用标准库 re：规则按 Unicode 语义匹配（空白含全角空格和不换行空格、数字含全角数字、
+    单词边界不把中文当边界），RE2 的这些字符类只认 ASCII，换用后会漏掉这类输入中的密钥
+
+    Args:
+        rule: SANITIZE_RULES 中的正则
+        name_first_chars: 规则开头关键字的首字母集合，为空时不加前瞻
+
+    Returns:
+        编译后的正则对象
+    """
+    if name_first_chars:
+        return re.compile(f"(?=[{name_first_chars}]){rule.pattern}", rule.flags)
+    return rule
+
+
+# 按 SANITIZE_RULES 的顺序逐条全文扫描，不能合并成交替分支：前面规则的替换结果会影响后面规则的匹配，
+# 合并后在引号不配对等输入下匹配位置改变，会漏掉逐条执行时能脱敏的密钥
+_SANITIZE_PASSES: List[Tuple[re.Pattern, str]] = [
+    (_compile_pass(pattern, name_first_chars), replacement)
+    for (pattern, replacement, _description), name_first_chars in zip(
+        SANITIZE_RULES,
+        [
+            _name_first_chars(_API_KEY_NAMES),
+            _name_first_chars(_API_KEY_NAMES),
+            _name_first_chars(_PASSWORD_NAMES),
+            _name_first_chars(_PASSWORD_NAMES),
+            "",
+            "",
+            "",
+        ],
+    )
+]
+
+
 def sanitize_code(source_code: str) -> str:
     """
     对源代码进行脱敏处理，过滤敏感信息。
@@ -80,7 +126,7 @@ def sanitize_code(source_code: str) -> str:
         脱敏后的源代码
     """
     sanitized = source_code
-    for pattern, replacement, _description in SANITIZE_RULES:
+    for pattern, replacement in _SANITIZE_PASSES:
         sanitized = pattern.sub(replacement, sanitized)
     return sanitized
 
@@ -115,3 +161,39 @@ def sanitize_file_content(file_path: str, content: str) -> str:
         return sanitize_code(content)
 
     return content
+
+
+def sanitize_file_head(
+    file_path: str, display_path: str, read_chars: int, max_chars: int
+) -> Optional[str]:
+    """
+    读取文件开头部分并脱敏，用于生成代码预览。
+    只依赖标准库和本模块，可直接提交到进程池执行。
+
+    Args:
+        file_path: 文件的绝对路径
+        display_path: 项目内相对路径（决定脱敏规则）
+        read_chars: 最多读取的字符数
+        max_chars: 脱敏后保留的最大字符数
+
+    Returns:
+        脱敏后的代码预览；文件不存在或不是普通文件时返回 None
+
+    Raises:
+        OSError: 读取文件失败时
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        return None
+
+    # 只读取文件开头部分，避免大文件整份读入内存
+    with path.open("r", encoding="utf-8", errors="ignore") as file:
+        content = file.read(read_chars)
+    if len(content) == read_chars:
+        # 丢弃被截断的最后一行，避免残缺的敏感信息逃过脱敏规则；
+        # 首行就超过 read_chars（如压缩后的 JS）时没有换行可截，直接脱敏截断后的文本
+        last_newline = content.rfind("\n")
+        if last_newline != -1:
+            content = content[: last_newline + 1]
+
+    return sanitize_file_content(display_path, content)[:max_chars]
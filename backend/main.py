@@ -1,7 +1,21 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api.routes import api_router
 from app.core.config import settings
+from app.services.llm_service import llm_service
+from app.services.vector_service import vector_service
+from app.core.process_pool import shutdown_process_pool
+from app.core.profiling import ProfilingMiddleware
+from app.core.prompt_cache import (
+    PromptCacheHeaderMiddleware,
+    PROMPT_CACHE_HIT_HEADER,
+    PROMPT_CACHED_TOKENS_HEADER,
+)
 import logging
 
 # 配置日志级别为 DEBUG，确保所有日志都能输出
@@ -13,7 +27,9 @@ logging.basicConfig(
 app = FastAPI(
     title="代码逻辑可视化工具 API",
     description="将复杂代码库转化为大白话和拟人化群聊",
-    version="1.0.0"
+    version="1.0.0",
+    # 使用 orjson（C 实现）序列化响应，大目录树 / 架构数据编码更快
+    default_response_class=ORJSONResponse,
 )
 
 # CORS 配置
@@ -23,11 +39,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[PROMPT_CACHE_HIT_HEADER, PROMPT_CACHED_TOKENS_HEADER],
 )
 
+# 压缩大 JSON 响应（目录树、架构数据），Starlette 会自动跳过 text/event-stream 并设置 Vary
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# 在响应头中标记 LLM 调用是否命中服务商的提示词前缀缓存
+app.add_middleware(PromptCacheHeaderMiddleware)
+
+# 按需性能剖析（默认关闭，避免任意客户端触发剖析）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # 注册路由
 app.include_router(api_router, prefix="/api")
 
+@app.on_event("startup")
+async def configure_thread_pool():
+    """限制 asyncio.to_thread 使用的默认线程池大小"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.THREAD_POOL_MAX_WORKERS)
+    )
+
+@app.on_event("startup")
+async def warm_up_vector_service():
+    """
+    在后台线程预热向量库（创建 ChromaDB 客户端、加载嵌入模型），首个检索请求无需承担冷启动开销；
+    不阻塞启动，预热期间到达的请求会等待同一次初始化完成
+    """
+    app.state.vector_warmup = asyncio.create_task(asyncio.to_thread(vector_service.warm_up))
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    """关闭 LLM 服务共享的 HTTP 连接池"""
+    await llm_service.aclose()
+
+@app.on_event("shutdown")
+async def close_process_pool():
+    """关闭代码脱敏使用的进程池"""
+    shutdown_process_pool()
+
 @app.get("/")
 async def root():
     return {"message": "代码逻辑可视化工具 API 服务正在运行", "version": "1.0.0"}
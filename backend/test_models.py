@@ -2,11 +2,17 @@
 测试不同的模型名称
 """
 import asyncio
+import importlib.util
 import httpx
 import json
 
-async def test_model(model_name):
-    """测试单个模型"""
+# 同时探测的模型数上限
+MAX_CONCURRENT_PROBES = 5
+# HTTP/2 需要可选依赖 h2（httpx[http2]），未安装时退回 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+async def test_model(model_name, client):
+    """测试单个模型（client 为所有探测共享的连接池）"""
     api_key = "sk-29370fabd56a5f6302bdc6df707775ac"
     api_base = "https://apis.iflow.cn/v1"
     
@@ -24,16 +30,15 @@ async def test_model(model_name):
     }
     
     try:
-        async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            result = response.json()
-            
-            if response.status_code == 200 and "choices" in result:
-                print(f"✅ {model_name:30s} - 成功！响应: {result['choices'][0]['message']['content'][:50]}")
-                return True, model_name
-            else:
-                print(f"❌ {model_name:30s} - 失败: {result.get('msg', 'Unknown error')}")
-                return False, None
+        response = await client.post(url, json=payload, headers=headers)
+        result = response.json()
+        
+        if response.status_code == 200 and "choices" in result:
+            print(f"✅ {model_name:30s} - 成功！响应: {result['choices'][0]['message']['content'][:50]}")
+            return True, model_name
+        else:
+            print(f"❌ {model_name:30s} - 失败: {result.get('msg', 'Unknown error')}")
+            return False, None
     except Exception as e:
         print(f"❌ {model_name:30s} - 异常: {str(e)[:50]}")
         return False, None
@@ -70,13 +75,24 @@ async def main():
         "model-gpt4",
     ]
     
-    working_models = []
-    
-    for model in models_to_test:
-        success, working_model = await test_model(model)
-        if success:
-            working_models.append(working_model)
-        await asyncio.sleep(0.5)  # 避免请求过快
+    # 并发探测，信号量限制同时在途的请求数，避免触发限流
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+
+    # 所有探测共用一个客户端：复用 keep-alive 连接（可用时走 HTTP/2 多路复用），只做一次 TLS 握手
+    async with httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=10.0,
+        verify=False,
+        limits=httpx.Limits(max_keepalive_connections=MAX_CONCURRENT_PROBES),
+    ) as client:
+
+        async def bounded_test(model):
+            async with semaphore:
+                return await test_model(model, client)
+
+        results = await asyncio.gather(*(bounded_test(model) for model in models_to_test))
+
+    working_models = [working_model for success, working_model in results if success]
     
     print("\n" + "=" * 60)
     print("📊 测试结果汇总")
@@ -2,8 +2,39 @@
 测试新的 API Key
 """
 import asyncio
+import importlib.util
+import ssl
+import sys
 import httpx
 import json
+import orjson
+
+# 同时在途的探测请求数上限
+MAX_CONCURRENT_PROBES = 4
+# HTTP/2 需要可选依赖 h2（httpx[http2]），未安装时退回 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+# 校验证书用的 SSL 上下文，导入时只构建一次：优先用 truststore 直接读取系统信任库，
+# 未安装时退回 certifi / OpenSSL 默认证书
+try:
+    import truststore
+
+    SSL_CONTEXT = truststore.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+except ImportError:
+    SSL_CONTEXT = ssl.create_default_context()
+# 探测请求体模板，只序列化一次
+MODEL_PLACEHOLDER = b'"__MODEL__"'
+PAYLOAD_TEMPLATE = orjson.dumps({
+    "model": "__MODEL__",
+    "messages": [
+        {"role": "user", "content": "你好"}
+    ],
+    "max_tokens": 50,
+})
+
+def _write_lines(lines):
+    """一次性写出收集的输出行"""
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
 
 async def test_new_api_key():
     """测试新的 API Key"""
@@ -14,10 +45,9 @@ async def test_new_api_key():
     api_key = os.getenv("API_KEY")
     api_base = os.getenv("API_BASE", "https://dashscope.aliyuncs.com/compatible-mode/v1")
     
-    print("=" * 60)
-    print("🧪 测试新的 API Key")
-    print("=" * 60)
-    print(f"\nAPI Key: {api_key[:20]}...{api_key[-4:]}")
+    # 输出先收集到列表，结束时一次性写出，不在并发探测期间逐行争用 stdout
+    lines = ["=" * 60, "🧪 测试新的 API Key", "=" * 60]
+    lines.append(f"\nAPI Key: {api_key[:20]}...{api_key[-4:]}")
     
     # 先测试一些可能的模型名称
     models_to_try = [
@@ -35,50 +65,64 @@ async def test_new_api_key():
         "Content-Type": "application/json",
     }
     
-    for model in models_to_try:
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "user", "content": "你好"}
-            ],
-            "max_tokens": 50,
-        }
-        
-        try:
-            async with httpx.AsyncClient(timeout=10.0, verify=False) as client:
-                response = await client.post(url, json=payload, headers=headers)
-                result = response.json()
-                
-                if response.status_code == 200 and "choices" in result:
-                    print(f"\n✅ 模型 '{model}' 可用！")
-                    print(f"   响应: {result['choices'][0]['message']['content']}")
-                    
-                    # 更新 .env 文件建议
-                    print(f"\n💡 建议在 .env 文件中设置:")
-                    print(f"   API_KEY={api_key}")
-                    print(f"   API_BASE={api_base}")
-                    print(f"   MODEL_NAME={model}")
-                    return True
-                else:
-                    print(f"❌ 模型 '{model}' 不可用: {result.get('msg', 'Unknown error')}")
-        except Exception as e:
-            print(f"❌ 模型 '{model}' 请求异常: {str(e)[:50]}")
-        
-        await asyncio.sleep(0.3)
+    # 并发探测所有候选模型（共享一个客户端复用连接，信号量限制同时在途的请求数），
+    # 总耗时取决于最慢的一次请求而不是所有请求之和
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+
+    async def probe(client, model):
+        # 各模型的请求体只有 model 字段不同：替换模板中的占位符，直接以字节发送
+        body = PAYLOAD_TEMPLATE.replace(MODEL_PLACEHOLDER, orjson.dumps(model))
+        async with semaphore:
+            response = await client.post(url, content=body, headers=headers)
+        return response.status_code, response.json()
+
+    # 可用时启用 HTTP/2：并发的探测请求在同一个连接上多路复用，只做一次 TLS 握手
+    async with httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=10.0,
+        verify=SSL_CONTEXT,
+        limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+    ) as client:
+        results = await asyncio.gather(
+            *(probe(client, model) for model in models_to_try),
+            return_exceptions=True,
+        )
+
+    # 按候选顺序输出，与逐个尝试时一样以第一个可用模型为准
+    for model, outcome in zip(models_to_try, results):
+        if isinstance(outcome, Exception):
+            lines.append(f"❌ 模型 '{model}' 请求异常: {str(outcome)[:50]}")
+            continue
+
+        status_code, result = outcome
+        if status_code == 200 and "choices" in result:
+            lines.append(f"\n✅ 模型 '{model}' 可用！")
+            lines.append(f"   响应: {result['choices'][0]['message']['content']}")
+            
+            # 更新 .env 文件建议
+            lines.append(f"\n💡 建议在 .env 文件中设置:")
+            lines.append(f"   API_KEY={api_key}")
+            lines.append(f"   API_BASE={api_base}")
+            lines.append(f"   MODEL_NAME={model}")
+            _write_lines(lines)
+            return True
+        else:
+            lines.append(f"❌ 模型 '{model}' 不可用: {result.get('msg', 'Unknown error')}")
     
-    print("\n" + "=" * 60)
-    print("⚠️  所有测试模型均不可用")
-    print("=" * 60)
-    print("\n可能的原因:")
-    print("1. API Key 不正确或已过期")
-    print("2. 该 API 提供商使用特殊的模型名称")
-    print("3. 需要额外的认证参数")
-    print(f"\n当前配置:")
-    print(f"- API_KEY: {api_key[:20]}...{api_key[-4:]}")
-    print(f"- API_BASE: {api_base}")
-    print("\n建议:")
-    print("- 检查 .env 文件中的配置是否正确")
-    print("- 联系 API 提供商获取正确的模型名称列表")
+    lines.append("\n" + "=" * 60)
+    lines.append("⚠️  所有测试模型均不可用")
+    lines.append("=" * 60)
+    lines.append("\n可能的原因:")
+    lines.append("1. API Key 不正确或已过期")
+    lines.append("2. 该 API 提供商使用特殊的模型名称")
+    lines.append("3. 需要额外的认证参数")
+    lines.append(f"\n当前配置:")
+    lines.append(f"- API_KEY: {api_key[:20]}...{api_key[-4:]}")
+    lines.append(f"- API_BASE: {api_base}")
+    lines.append("\n建议:")
+    lines.append("- 检查 .env 文件中的配置是否正确")
+    lines.append("- 联系 API 提供商获取正确的模型名称列表")
+    _write_lines(lines)
     return False
 
 if __name__ == "__main__":
@@ -0,0 +1,55 @@
+"""
+测试公共配置
+把 backend 根目录加入 Python 路径，测试模块可直接 import app.*
+（在收集测试前执行一次，pytest-xdist 的各 worker 也各自执行）
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_ROOT = str(Path(__file__).parent.parent)
+if BACKEND_ROOT not in sys.path:
+    sys.path.insert(0, BACKEND_ROOT)
+
+
+@pytest.fixture(scope="session")
+def project_layouts(tmp_path_factory) -> Path:
+    """
+    一次性构建扫描测试用的各种项目目录结构，测试只读不写，各自使用其中一个子目录
+    （pytest-xdist 下每个 worker 各构建一份）
+    """
+    base = tmp_path_factory.mktemp("projects")
+
+    def write(relative: str, content, binary: bool = False) -> None:
+        path = base / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if binary:
+            path.write_bytes(content)
+        else:
+            path.write_text(content)
+
+    write("simple/main.py", "def hello():\n    print('hello')")
+
+    write("with_node_modules/node_modules/package/index.js", "module.exports = {}")
+    write("with_node_modules/app.js", "console.log('hello')")
+
+    (base / "empty").mkdir()
+
+    write("large/big.py", "x = 1\n" * 100000)
+
+    write("nested/node_modules/lib/index.js", "x")
+    write("nested/src/app.py", "x = 1")
+    write("nested/main.py", "x = 1")
+
+    for index in range(5):
+        write(f"package/pkg/mod_{index}.py", f"def f{index}():\n    pass")
+    write("package/README.md", "# demo")
+
+    write("binary/blob.py", b"\x00\x01\x02\x03" * 64, binary=True)
+    write("binary/ok.py", "x = 1")
+
+    lines = [f"第 {index} 行" for index in range(30)]
+    write("crlf_notes/notes.md", "\r\n".join(lines).encode("utf-8"), binary=True)
+
+    return base
@@ -0,0 +1,134 @@
+"""架构可视化服务的单元测试（不调用 LLM）"""
+import asyncio
+
+import pytest
+
+from app.services import architecture_service as architecture_module
+from app.services.architecture_service import ArchitectureService
+from app.services.llm_service import LLMError, LLMResponseFormatError, llm_service
+from app.services.project_service import project_service
+
+
+class TestGenerateArchitectureVisualization:
+    """测试可视化生成的入口"""
+
+    def test_missing_project_raises_value_error(self, monkeypatch) -> None:
+        service = ArchitectureService()
+        monkeypatch.setattr(project_service, "tasks", {})
+
+        async def run() -> None:
+            await service.generate_architecture_visualization("missing")
+
+        with pytest.raises(ValueError):
+            asyncio.run(run())
+
+
+class TestBuildProjectContext:
+    """测试项目上下文构建"""
+
+    def test_truncates_functions_and_reuses_result(self) -> None:
+        service = ArchitectureService()
+        summaries = [{
+            "file_path": "app/main.py",
+            "classes": ["App"],
+            "functions": [f"func_{index}" for index in range(10)],
+        }]
+
+        first = service._build_project_context(summaries)
+        second = service._build_project_context([dict(summaries[0])])
+
+        assert "func_7" in first and "func_8" not in first
+        assert first is second
+
+    def test_empty_project(self) -> None:
+        assert ArchitectureService()._build_project_context([]) == "这是一个空项目。"
+
+    def test_prefers_informative_files_within_budget(self) -> None:
+        long_name = "x" * 200
+        summaries = [
+            {"file_path": f"trivial_{index}.py", "functions": [long_name]}
+            for index in range(40)
+        ]
+        summaries.append({"file_path": "core/models.py", "classes": ["User", "Order"]})
+
+        context = ArchitectureService()._build_project_context(summaries)
+
+        assert "core/models.py" in context
+        assert len(context) <= 6000
+        assert context.index("trivial_0.py") < context.index("core/models.py")
+
+
+class TestEnrichScenarios:
+    """测试场景字段补全"""
+
+    def test_fills_missing_ids_in_place(self) -> None:
+        scenarios = [{
+            "title": "用户登录",
+            "characters": [{"name": "前端小美"}, {"id": "be", "color": "custom"}],
+            "messages": [{"content": "你好"}],
+        }]
+
+        result = ArchitectureService()._enrich_scenarios_with_ids(scenarios)
+
+        assert result is scenarios
+        assert result[0]["id"] == "scenario-0"
+        assert result[0]["characters"][0]["id"] == "char-scenario-0-0"
+        assert result[0]["characters"][1] == {"id": "be", "color": "custom"}
+        assert result[0]["messages"][0]["id"] == "msg-scenario-0-0"
+
+    def test_keeps_existing_scenario_id_as_prefix(self) -> None:
+        scenarios = [{"id": "login", "characters": [{}], "messages": [{}]}]
+
+        result = ArchitectureService()._enrich_scenarios_with_ids(scenarios)
+
+        assert result[0]["characters"][0]["id"] == "char-login-0"
+        assert result[0]["messages"][0]["id"] == "msg-login-0"
+
+
+class TestLLMFallback:
+    """测试 LLM 失败时的重试与降级"""
+
+    def test_fallback_result_is_not_cached(self, monkeypatch) -> None:
+        service = ArchitectureService()
+        monkeypatch.setattr(
+            project_service, "get_project_data", lambda task_id: {"tree": {}}
+        )
+        monkeypatch.setattr(project_service, "get_file_summaries", lambda task_id: [])
+
+        async def failing_call(**kwargs) -> dict:
+            raise LLMError("timeout")
+
+        monkeypatch.setattr(service, "_call_llm_with_retry", failing_call)
+
+        result = asyncio.run(service.generate_architecture_visualization("t1"))
+
+        assert result["layers"] == service._generate_default_layers()
+        assert not service.is_cached("t1")
+
+    def test_transport_errors_are_not_retried_again(self, monkeypatch) -> None:
+        calls = []
+
+        async def failing_generate_json(**kwargs) -> dict:
+            calls.append(1)
+            raise LLMError("LLM API 调用失败（共尝试 5 次）")
+
+        monkeypatch.setattr(llm_service, "generate_json", failing_generate_json)
+
+        with pytest.raises(LLMError):
+            asyncio.run(ArchitectureService()._call_llm_with_retry(user_prompt="x"))
+        assert len(calls) == 1
+
+    def test_unparseable_output_is_regenerated(self, monkeypatch) -> None:
+        monkeypatch.setattr(architecture_module, "LLM_RETRY_BASE_SECONDS", 0)
+        outcomes = [LLMResponseFormatError("not json"), {"layers": []}]
+
+        async def flaky_generate_json(**kwargs) -> dict:
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        monkeypatch.setattr(llm_service, "generate_json", flaky_generate_json)
+
+        result = asyncio.run(ArchitectureService()._call_llm_with_retry(user_prompt="x"))
+        assert result == {"layers": []}
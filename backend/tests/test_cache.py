@@ -0,0 +1,128 @@
+"""精确匹配响应缓存的单元测试（不依赖 Redis）"""
+import asyncio
+
+from app.core import cache as cache_module
+from app.core.persistent_cache import PersistentCacheStore
+from app.core.cache import (
+    ResponseCache,
+    build_cache_key,
+    normalize_code,
+    normalize_text,
+)
+
+
+class TestNormalize:
+    """测试输入规范化"""
+
+    def test_collapses_whitespace_and_lowercases(self) -> None:
+        assert normalize_text("  User   LOGIN\n\tflow ") == "user login flow"
+
+    def test_collapses_whitespace_in_code(self) -> None:
+        assert normalize_code("x = 1\n    y  = 2\n") == normalize_code("x = 1 y = 2")
+
+    def test_keeps_operators_that_look_like_comments(self) -> None:
+        assert normalize_code("x = a // b") != normalize_code("x = a // c")
+        assert normalize_code("s = '#fff'") != normalize_code("s = '#000'")
+
+    def test_keeps_identifier_case(self) -> None:
+        assert normalize_code("useState()") != normalize_code("usestate()")
+
+    def test_keeps_urls(self) -> None:
+        assert "http://example.com" in normalize_code('url = "http://example.com"')
+
+    def test_cache_key_is_prefixed_by_route(self) -> None:
+        key = build_cache_key("explain_term", "api")
+        route, digest = key.split(":")
+        assert route == "explain_term"
+        assert len(digest) == 64
+
+
+class TestResponseCache:
+    """测试进程内缓存读写"""
+
+    def test_computes_once_for_same_key(self) -> None:
+        cache = ResponseCache()
+        calls = []
+
+        async def compute() -> dict:
+            calls.append(1)
+            return {"term": "API"}
+
+        async def run() -> None:
+            first = await cache.cached("k", compute, ttl_seconds=60)
+            second = await cache.cached("k", compute, ttl_seconds=60)
+            assert first == second == {"term": "API"}
+
+        asyncio.run(run())
+        assert len(calls) == 1
+
+    def test_expired_entry_is_recomputed(self) -> None:
+        cache = ResponseCache()
+
+        async def run() -> None:
+            await cache.set("k", {"v": 1}, ttl_seconds=-1)
+            assert await cache.get("k") is None
+
+        asyncio.run(run())
+
+    def test_memory_store_evicts_least_recently_used(self, monkeypatch) -> None:
+        monkeypatch.setattr(cache_module, "MEMORY_CACHE_SIZE", 2)
+        cache = ResponseCache()
+
+        async def run() -> None:
+            await cache.set("a", 1, ttl_seconds=60)
+            await cache.set("b", 2, ttl_seconds=60)
+            assert await cache.get("a") == 1
+            await cache.set("c", 3, ttl_seconds=60)
+            assert await cache.get("b") is None
+            assert await cache.get("a") == 1
+
+        asyncio.run(run())
+        assert list(cache._memory) == ["c", "a"]
+
+    def test_concurrent_misses_share_one_computation(self) -> None:
+        cache = ResponseCache()
+        calls = []
+
+        async def compute() -> dict:
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"layers": []}
+
+        async def run() -> list:
+            return await asyncio.gather(
+                *(cache.cached("task", compute, ttl_seconds=60) for _ in range(5))
+            )
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(result == {"layers": []} for result in results)
+
+
+class TestPersistentCache:
+    """测试 SQLite 持久化层"""
+
+    def test_survives_new_cache_instance(self, tmp_path) -> None:
+        db_path = str(tmp_path / "llm_cache.db")
+
+        async def run() -> dict:
+            await ResponseCache(db_path=db_path).set("k", {"v": 1}, ttl_seconds=60)
+            return await ResponseCache(db_path=db_path).get("k")
+
+        assert asyncio.run(run()) == {"v": 1}
+
+    def test_persistent_entry_from_other_model_is_ignored(self, tmp_path) -> None:
+        db_path = str(tmp_path / "llm_cache.db")
+        PersistentCacheStore(db_path, model="model-a").set("k", '{"v": 1}', 60)
+
+        assert PersistentCacheStore(db_path, model="model-b").get("k") is None
+        assert PersistentCacheStore(db_path, model="model-a").get("k") == '{"v": 1}'
+
+    def test_expired_persistent_entry_is_ignored(self, tmp_path) -> None:
+        db_path = str(tmp_path / "llm_cache.db")
+
+        async def run() -> None:
+            await ResponseCache(db_path=db_path).set("k", {"v": 1}, ttl_seconds=-1)
+            assert await ResponseCache(db_path=db_path).get("k") is None
+
+        asyncio.run(run())
@@ -1,12 +1,14 @@
 """代码分片与摘要提取工具的单元测试"""
 import os
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from pathlib import Path
 
+import app.utils.chunker as chunker_module
 from app.utils.chunker import (
     should_skip_path,
     is_code_file,
+    is_code_name,
     is_config_file,
     extract_python_summary,
     extract_javascript_summary,
@@ -70,6 +72,12 @@ class TestFileTypeDetection:
         assert not is_code_file(Path("logo.png"))
         assert not is_config_file(Path("logo.png"))
 
+    @pytest.mark.parametrize(
+        "name", ["main.py", "App.TSX", "a.b.go", ".py", "Makefile", "trailing.", "logo.png", "..py"]
+    )
+    def test_is_code_name_matches_is_code_file(self, name: str) -> None:
+        assert is_code_name(name) == is_code_file(Path(name))
+
 
 class TestExtractPythonSummary:
     """测试 Python 文件摘要提取"""
@@ -172,47 +180,98 @@ class TestChunkCode:
         reassembled = "\n".join(chunks)
         assert reassembled == code
 
+    def test_overlong_line_becomes_its_own_chunk(self) -> None:
+        code = "a = 1\n" + "x" * 50 + "\nb = 2"
+        chunks = chunk_code(code, max_chars=20)
+        assert chunks == ["a = 1", "x" * 50, "b = 2"]
+
 
 class TestScanProjectFiles:
     """测试项目文件扫描"""
 
-    def test_scans_python_files(self) -> None:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            py_file = Path(temp_dir) / "main.py"
-            py_file.write_text("def hello():\n    print('hello')")
-
-            summaries = scan_project_files(temp_dir)
-            assert len(summaries) == 1
-            assert summaries[0]["file_name"] == "main.py"
-
-    def test_skips_node_modules(self) -> None:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            nm_dir = Path(temp_dir) / "node_modules" / "package"
-            nm_dir.mkdir(parents=True)
-            (nm_dir / "index.js").write_text("module.exports = {}")
-
-            src_file = Path(temp_dir) / "app.js"
-            src_file.write_text("console.log('hello')")
+    def test_scans_python_files(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "simple"))
+        assert len(summaries) == 1
+        assert summaries[0]["file_name"] == "main.py"
 
-            summaries = scan_project_files(temp_dir)
-            file_names = [s["file_name"] for s in summaries]
-            assert "app.js" in file_names
-            assert "index.js" not in file_names
+    def test_skips_node_modules(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "with_node_modules"))
+        file_names = [s["file_name"] for s in summaries]
+        assert "app.js" in file_names
+        assert "index.js" not in file_names
 
-    def test_handles_empty_directory(self) -> None:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            summaries = scan_project_files(temp_dir)
-            assert summaries == []
+    def test_handles_empty_directory(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "empty"))
+        assert summaries == []
 
     def test_handles_nonexistent_directory(self) -> None:
         summaries = scan_project_files("/nonexistent/path")
         assert summaries == []
 
-    def test_marks_large_files(self) -> None:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            large_file = Path(temp_dir) / "big.py"
-            large_file.write_text("x = 1\n" * 100000)
+    def test_marks_large_files(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "large"))
+        assert len(summaries) == 1
+        assert summaries[0]["is_large"] is True
+
+    def test_skips_binary_file(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "binary"))
+        assert [s["file_name"] for s in summaries] == ["ok.py"]
+
+    def test_does_not_descend_into_skipped_directories(self, project_layouts, monkeypatch) -> None:
+        root = str(project_layouts / "nested")
+        visited = []
+        real_walk = os.walk
+
+        def recording_walk(*args, **kwargs):
+            for dir_path, dir_names, file_names in real_walk(*args, **kwargs):
+                visited.append(os.path.relpath(dir_path, root))
+                yield dir_path, dir_names, file_names
+
+        monkeypatch.setattr(chunker_module.os, "walk", recording_walk)
+        summaries = scan_project_files(root)
+
+        assert [s["file_path"] for s in summaries] == [
+            "main.py", os.path.join("src", "app.py"),
+        ]
+        assert not any(path.startswith("node_modules") for path in visited)
+
+    def test_executor_results_match_sequential_scan(self, project_layouts) -> None:
+        root = str(project_layouts / "package")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parallel = scan_project_files(root, executor)
+
+        assert parallel == scan_project_files(root)
+        assert len(parallel) == 6
+
+    def test_preview_only_files_match_full_text_summary(self, project_layouts) -> None:
+        summaries = scan_project_files(str(project_layouts / "crlf_notes"))
+
+        lines = [f"第 {index} 行" for index in range(30)]
+        expected = extract_file_summary("notes.md", "\n".join(lines))
+        assert summaries == [expected]
+        assert summaries[0]["line_count"] == 30
+
+
+class TestExtractSummaryCache:
+    """测试提取结果按内容缓存"""
+
+    def test_same_content_is_extracted_once(self, monkeypatch) -> None:
+        calls = []
+        real_extractor = chunker_module.extract_python_summary
+
+        def counting_extractor(content):
+            calls.append(content)
+            return real_extractor(content)
+
+        monkeypatch.setattr(chunker_module, "extract_python_summary", counting_extractor)
+        monkeypatch.setattr(chunker_module, "_summary_cache", type(chunker_module._summary_cache)())
+        code = "class Cached:\n    pass"
+
+        first = extract_file_summary("a.py", code)
+        second = extract_file_summary("b.py", code)
+        extract_file_summary("c.py", code + "\n")
 
-            summaries = scan_project_files(temp_dir)
-            assert len(summaries) == 1
-            assert summaries[0]["is_large"] is True
+        assert len(calls) == 2
+        assert first["classes"] == second["classes"] == ["Cached"]
+        assert second["file_path"] == "b.py"
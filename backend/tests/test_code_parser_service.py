@@ -0,0 +1,162 @@
+"""代码解析服务的单元测试（LLM 调用以桩函数替代）"""
+import asyncio
+import json
+
+from app.services import code_parser_service as code_parser_module
+from app.services.code_parser_service import CodeParserService
+from app.services.llm_service import LLMError
+
+
+class TestLifestyleSummaries:
+    """测试分批生成生活化摘要"""
+
+    def test_failed_batch_falls_back_without_affecting_others(self, monkeypatch) -> None:
+        batch_sizes = []
+
+        async def fake_generate_json(**kwargs) -> dict:
+            user_prompt = kwargs["user_prompt"]
+            batch_sizes.append(user_prompt.count("--- 文件："))
+            if "f7.py" in user_prompt:
+                raise LLMError("timeout")
+            return {"f0.py": "这是前台接待台", "f6.py": "这是档案室"}
+
+        monkeypatch.setattr(
+            code_parser_module.llm_service, "generate_json", fake_generate_json
+        )
+        files = [
+            {"file_path": f"f{index}.py", "file_name": f"f{index}.py", "extension": ".py"}
+            for index in range(12)
+        ]
+
+        result = asyncio.run(CodeParserService()._generate_lifestyle_summaries(files))
+
+        assert sorted(batch_sizes) == [2, 5, 5]
+        assert result[0]["lifestyle_summary"] == "这是前台接待台"
+        assert result[6]["lifestyle_summary"] == "这是 f6.py，负责处理后端逻辑"
+        assert result[1]["lifestyle_summary"] == "这是 f1.py，负责处理后端逻辑"
+
+    def test_identical_files_are_summarized_once(self, monkeypatch) -> None:
+        prompts = []
+
+        async def fake_generate_json(**kwargs) -> dict:
+            prompts.append(kwargs["user_prompt"])
+            return {"a/__init__.py": "这是门牌", "main.py": "这是总指挥"}
+
+        monkeypatch.setattr(
+            code_parser_module.llm_service, "generate_json", fake_generate_json
+        )
+        files = [
+            {"file_path": "a/__init__.py", "file_name": "__init__.py", "sanitized_preview": "from .x import y"},
+            {"file_path": "main.py", "file_name": "main.py", "sanitized_preview": "print('hi')"},
+            {"file_path": "b/__init__.py", "file_name": "__init__.py", "sanitized_preview": "from .x import y"},
+        ]
+
+        result = asyncio.run(CodeParserService()._generate_lifestyle_summaries(files))
+
+        assert len(prompts) == 1
+        assert "b/__init__.py" not in prompts[0]
+        assert result[2]["lifestyle_summary"] == "这是门牌"
+        assert result[1]["lifestyle_summary"] == "这是总指挥"
+
+
+class TestSaveToJson:
+    """测试解析结果写入 JSON 文件"""
+
+    def test_writes_readable_utf8_json(self, tmp_path) -> None:
+        output_path = tmp_path / "summary.json"
+        data = {"project": "示例", "files": [{"file_name": "main.py", "size": 12}]}
+
+        asyncio.run(CodeParserService().save_to_json(data, str(output_path)))
+
+        content = output_path.read_text(encoding="utf-8")
+        assert "示例" in content
+        assert json.loads(content) == data
+
+
+class TestFilterCoreCodeFiles:
+    """测试核心代码文件过滤"""
+
+    def test_keeps_only_non_test_source_files(self) -> None:
+        summaries = [
+            {"file_name": "main.py", "extension": ".py"},
+            {"file_name": "README.md", "extension": ".md"},
+            {"file_name": "style.css", "extension": ".css"},
+            {"file_name": "test_main.py", "extension": ".py"},
+            {"file_name": "App.Spec.ts", "extension": ".ts"},
+            {"file_name": "huge.py", "extension": ".py", "is_large": True},
+            {"file_name": "service.ts", "extension": ".ts"},
+        ]
+
+        core_files = CodeParserService()._filter_core_code_files(summaries)
+
+        assert [item["file_name"] for item in core_files] == ["main.py", "service.ts"]
+
+
+class TestSanitizeCodeFiles:
+    """测试并发读取并脱敏文件"""
+
+    def test_reads_only_file_head_for_preview(self, tmp_path) -> None:
+        lines = [f"value_{index} = {index}\n" for index in range(5000)]
+        lines.insert(0, 'API_KEY = "sk-should-not-leak"\n')
+        (tmp_path / "big.py").write_text("".join(lines), encoding="utf-8")
+
+        summaries = asyncio.run(
+            CodeParserService()._sanitize_code_files(
+                str(tmp_path), [{"file_path": "big.py"}, {"file_path": "missing.py"}]
+            )
+        )
+
+        assert "sanitized_preview" not in summaries[1]
+        preview = summaries[0]["sanitized_preview"]
+        assert len(preview) == code_parser_module.PREVIEW_MAX_CHARS
+        assert "sk-should-not-leak" not in preview
+        assert "REDACTED" in preview
+
+
+class TestBuildFilesDescription:
+    """测试发送给 LLM 的文件描述"""
+
+    def test_includes_short_preview_only_without_structure(self) -> None:
+        files = [
+            {"file_path": "a.py", "functions": ["main"], "sanitized_preview": "A" * 1000},
+            {"file_path": "b.js", "sanitized_preview": "B" * 1000},
+        ]
+
+        description = CodeParserService()._build_files_description(files)
+
+        assert "A" * 10 not in description
+        assert "B" * code_parser_module.PROMPT_PREVIEW_CHARS in description
+        assert "B" * (code_parser_module.PROMPT_PREVIEW_CHARS + 1) not in description
+        assert "函数：main" in description
+
+
+class TestParseProject:
+    """测试 parse_project 的步骤编排"""
+
+    def test_vector_storage_runs_alongside_summaries(self, monkeypatch) -> None:
+        service = CodeParserService()
+        files = [{"file_path": "main.py", "file_name": "main.py", "extension": ".py"}]
+        monkeypatch.setattr(code_parser_module, "scan_project_files", lambda *_: files)
+
+        async def fake_sanitize(project_dir, summaries):
+            return summaries
+
+        async def run() -> dict:
+            storage_started = asyncio.Event()
+
+            async def fake_store(summaries) -> None:
+                storage_started.set()
+
+            async def fake_summaries(summaries):
+                # 顺序执行时向量入库尚未开始，这里会超时
+                await asyncio.wait_for(storage_started.wait(), timeout=1)
+                return summaries
+
+            monkeypatch.setattr(service, "_sanitize_code_files", fake_sanitize)
+            monkeypatch.setattr(service, "_store_to_vector_database", fake_store)
+            monkeypatch.setattr(service, "_generate_lifestyle_summaries", fake_summaries)
+            return await service.parse_project("/tmp/project")
+
+        result = asyncio.run(run())
+
+        assert result["core_code_files"] == 1
@@ -0,0 +1,90 @@
+"""术语解释服务的单元测试"""
+import asyncio
+
+from app.services.explain_service import COMMON_TERMS, ExplainService
+from app.services.llm_service import LLMError
+
+
+class TestExtractKeywords:
+    """测试 _extract_keywords 方法"""
+
+    def test_matches_terms_case_insensitively_in_term_order(self) -> None:
+        service = ExplainService()
+        keywords = service._extract_keywords("const data = await fetch('/api/users').json()")
+        assert keywords == ["API", "await", "JSON"]
+
+    def test_matches_overlapping_terms(self) -> None:
+        service = ExplainService()
+        keywords = service._extract_keywords("use a NoSQL store")
+        assert "NoSQL" in keywords
+        assert "SQL" in keywords
+
+    def test_matches_same_terms_as_substring_scan(self) -> None:
+        service = ExplainService()
+        snippet = "class UserController { async getUser() { return db.query(sql) } } // CI/CD"
+        expected = [term for term in COMMON_TERMS if term.lower() in snippet.lower()]
+        keywords = service._extract_keywords(snippet)
+        assert keywords[: len(expected)] == expected
+        assert "UserController" in keywords
+
+
+class TestExplainWithLocalDictionary:
+    """测试 _explain_with_local_dictionary 方法"""
+
+    def test_matches_dictionary_key_case_insensitively(self) -> None:
+        service = ExplainService()
+        result = service._explain_with_local_dictionary("", ["websocket"])
+        assert result["term"] == "WebSocket"
+        assert result["plain_explanation"] == "网络套接字"
+
+    def test_falls_back_to_first_keyword_when_no_match(self) -> None:
+        service = ExplainService()
+        result = service._explain_with_local_dictionary("", ["Unknown"])
+        assert result["term"] == "Unknown"
+
+
+class TestExplainTermCache:
+    """测试 explain_term 的进程内缓存"""
+
+    def test_reuses_llm_explanation_for_identical_snippet(self, monkeypatch) -> None:
+        service = ExplainService()
+        calls = []
+
+        async def fake_explain_with_llm(code_snippet, keywords):
+            calls.append(code_snippet)
+            return {"term": "API", "plain_explanation": "接口", "analogy": "就像服务员"}
+
+        monkeypatch.setattr(service, "_explain_with_llm", fake_explain_with_llm)
+
+        first = asyncio.run(service.explain_term("call the API"))
+        second = asyncio.run(service.explain_term("call the API"))
+
+        assert first == second
+        assert calls == ["call the API"]
+
+    def test_does_not_cache_local_fallback(self, monkeypatch) -> None:
+        service = ExplainService()
+        calls = []
+
+        async def failing_explain_with_llm(code_snippet, keywords):
+            calls.append(code_snippet)
+            raise LLMError("unavailable")
+
+        monkeypatch.setattr(service, "_explain_with_llm", failing_explain_with_llm)
+
+        asyncio.run(service.explain_term("call the API"))
+        asyncio.run(service.explain_term("call the API"))
+
+        assert len(calls) == 2
+
+
+class TestExtractKeywordsDeduplication:
+    """测试关键词去重"""
+
+    def test_deduplicates_camel_case_words_and_terms(self) -> None:
+        service = ExplainService()
+        snippet = "new WebSocket(url); UserService.get(); UserService.save(); OrderService.list()"
+        keywords = service._extract_keywords(snippet)
+        assert keywords.count("WebSocket") == 1
+        assert keywords.count("UserService") == 1
+        assert "OrderService" in keywords
@@ -1,6 +1,16 @@
 """LLM 服务的单元测试（测试 JSON 校验逻辑，不依赖外部 API）"""
+import asyncio
+
+import httpx
 import pytest
-from app.services.llm_service import validate_and_parse_json, LLMError
+
+from app.services import llm_service as llm_module
+from app.services.llm_service import (
+    LLMService,
+    validate_and_parse_json,
+    LLMError,
+    _with_system_cache_control,
+)
 
 
 class TestValidateAndParseJson:
@@ -27,6 +37,11 @@ class TestValidateAndParseJson:
         result = validate_and_parse_json(raw)
         assert result["key"] == "value"
 
+    def test_strips_markdown_code_block_followed_by_text(self) -> None:
+        raw = '```json\n{"key": "value"}\n```\n以上是结果'
+        result = validate_and_parse_json(raw)
+        assert result["key"] == "value"
+
     def test_extracts_json_from_surrounding_text(self) -> None:
         raw = 'Here is the result: {"key": "value"} Hope this helps!'
         result = validate_and_parse_json(raw)
@@ -70,3 +85,75 @@ class TestValidateAndParseJson:
         assert len(result["characters"]) == 1
         assert len(result["dialogues"]) == 1
         assert result["dialogues"][0]["code_ref"] == "login.js:L45"
+
+
+class TestSystemCacheControl:
+    """测试系统提示词缓存标记"""
+
+    def test_marks_only_system_message(self) -> None:
+        messages = [
+            {"role": "system", "content": "固定提示词"},
+            {"role": "user", "content": "问题"},
+        ]
+        result = _with_system_cache_control(messages)
+        assert result[0]["content"] == [{
+            "type": "text",
+            "text": "固定提示词",
+            "cache_control": {"type": "ephemeral"},
+        }]
+        assert result[1] == {"role": "user", "content": "问题"}
+
+
+class TestChatCompletionRetry:
+    """测试 chat_completion 的重试与退避策略"""
+
+    @staticmethod
+    def _make_service(monkeypatch, responses: list) -> tuple:
+        service = LLMService()
+        service.api_key = "sk-test-key"
+        requests = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return responses.pop(0)
+
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        delays = []
+
+        async def fake_sleep(delay: float) -> None:
+            delays.append(delay)
+
+        monkeypatch.setattr(llm_module.asyncio, "sleep", fake_sleep)
+        return service, requests, delays
+
+    @staticmethod
+    def _ok_response() -> httpx.Response:
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": "ok"}}]}
+        )
+
+    def test_honors_retry_after_on_rate_limit(self, monkeypatch) -> None:
+        responses = [
+            httpx.Response(429, headers={"Retry-After": "2"}),
+            httpx.Response(503),
+            self._ok_response(),
+        ]
+        service, requests, delays = self._make_service(monkeypatch, responses)
+
+        result = asyncio.run(service.chat_completion([{"role": "user", "content": "hi"}]))
+
+        assert result == "ok"
+        assert len(requests) == 3
+        assert 2.0 <= delays[0] < 2.2
+        assert 1.0 <= delays[1] < 1.2
+
+    def test_does_not_retry_client_errors(self, monkeypatch) -> None:
+        responses = [httpx.Response(401), self._ok_response()]
+        service, requests, delays = self._make_service(monkeypatch, responses)
+
+        with pytest.raises(LLMError):
+            asyncio.run(service.chat_completion([{"role": "user", "content": "hi"}]))
+
+        assert len(requests) == 1
+        assert delays == []
@@ -0,0 +1,364 @@
+"""项目解析服务的单元测试（不调用 LLM）"""
+import asyncio
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from app.core.cache import ResponseCache
+from app.services import project_service as project_service_module
+from app.services.llm_service import LLMError
+from app.services.project_service import ProjectService
+
+
+class TestTaskProgressSubscription:
+    """测试任务进度订阅推送"""
+
+    def _create_service(self) -> ProjectService:
+        service = ProjectService()
+        service.tasks["t1"] = {
+            "status": "processing",
+            "progress": 0,
+            "message": "开始解析项目...",
+        }
+        return service
+
+    def test_subscriber_receives_progress_and_terminal_status(self) -> None:
+        async def run() -> list:
+            service = self._create_service()
+            queue = service.subscribe("t1")
+            service._update_progress("t1", 40, "正在提取代码摘要...")
+            service._finish_task("t1", "completed", "项目解析完成！", progress=100)
+            return [queue.get_nowait(), queue.get_nowait()]
+
+        first, second = asyncio.run(run())
+        assert (first["progress"], first["status"]) == (40, "processing")
+        assert (second["progress"], second["status"]) == (100, "completed")
+
+    def test_unsubscribed_queue_receives_nothing(self) -> None:
+        async def run() -> bool:
+            service = self._create_service()
+            queue = service.subscribe("t1")
+            service.unsubscribe("t1", queue)
+            service._update_progress("t1", 10, "正在解压文件...")
+            return queue.empty() and "t1" not in service._subscribers
+
+        assert asyncio.run(run())
+
+
+class TestUploadAndParse:
+    """测试上传 ZIP 后的解压流程"""
+
+    def test_extracts_once_and_removes_zip(self, tmp_path, monkeypatch) -> None:
+        zip_path = tmp_path / "project.zip"
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("src/main.py", "print('hi')\n")
+            zip_file.writestr("README.md", "# demo\n")
+
+        service = ProjectService()
+        parsed_directories = []
+
+        async def fake_parse_project(task_id: str, filename: str) -> None:
+            parsed_directories.append(service.tasks[task_id]["directory"])
+
+        monkeypatch.setattr(service, "_parse_project", fake_parse_project)
+
+        async def run() -> dict:
+            result = await service.upload_and_parse(str(zip_path), "project.zip")
+            await asyncio.sleep(0)
+            return result
+
+        result = asyncio.run(run())
+        temp_dir = service.tasks[result["task_id"]]["directory"]
+        try:
+            assert result["file_list"] == ["README.md", os.path.join("src", "main.py")]
+            assert not zip_path.exists()
+            assert parsed_directories == [temp_dir]
+            assert os.path.isfile(os.path.join(temp_dir, "src", "main.py"))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_rejects_non_zip_and_removes_file(self, tmp_path) -> None:
+        upload_path = tmp_path / "project.zip"
+        upload_path.write_bytes(b"not a zip")
+
+        with pytest.raises(ValueError):
+            asyncio.run(ProjectService().upload_and_parse(str(upload_path), "project.zip"))
+        assert not upload_path.exists()
+
+
+class TestExtractZip:
+    """测试 ZIP 并行解压"""
+
+    def test_extracts_all_members(self, tmp_path) -> None:
+        zip_path = tmp_path / "project.zip"
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("empty/", "")
+            for index in range(20):
+                zip_file.writestr(f"pkg{index % 3}/mod{index}.py", f"value = {index}\n" * 100)
+
+        target_dir = tmp_path / "out"
+        file_list = ProjectService()._extract_zip(str(zip_path), str(target_dir))
+
+        assert file_list == sorted(
+            os.path.join(f"pkg{index % 3}", f"mod{index}.py") for index in range(20)
+        )
+        assert (target_dir / "empty").is_dir()
+        assert (target_dir / "pkg1" / "mod7.py").read_text() == "value = 7\n" * 100
+        assert len(list(target_dir.rglob("*.py"))) == 20
+
+    def test_rejects_path_traversal(self, tmp_path) -> None:
+        zip_path = tmp_path / "evil.zip"
+        with zipfile.ZipFile(zip_path, "w") as zip_file:
+            zip_file.writestr("../escaped.py", "print('pwned')\n")
+
+        with pytest.raises(ValueError):
+            ProjectService()._extract_zip(str(zip_path), str(tmp_path / "out"))
+        assert not (tmp_path / "escaped.py").exists()
+
+
+class TestScanProject:
+    """测试遍历解压目录生成目录树"""
+
+    def test_tree_skips_ignored_entries(self, tmp_path) -> None:
+        for relative in ("src/main.py", "src/app.min.js", "node_modules/lib/index.js", ".env"):
+            path = tmp_path / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text("x")
+
+        tree, file_nodes = ProjectService()._scan_project(str(tmp_path))
+
+        assert tree["path"] == "."
+        assert [child["name"] for child in tree["children"]] == ["src"]
+        assert [child["path"] for child in tree["children"][0]["children"]] == [
+            os.path.join("src", "main.py")
+        ]
+        assert file_nodes == {
+            os.path.join("src", "main.py"): tree["children"][0]["children"][0]
+        }
+
+
+class TestEnrichTreeWithSummaries:
+    """测试将 AI 摘要写入目录树"""
+
+    def test_summaries_update_indexed_tree_nodes(self, tmp_path, monkeypatch) -> None:
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "main.py").write_text("print('hi')")
+        service = ProjectService()
+        tree, file_nodes = service._scan_project(str(tmp_path))
+        main_path = os.path.join("src", "main.py")
+
+        async def fake_batch_summarize(files) -> dict:
+            return {main_path: "这是总指挥"}
+
+        monkeypatch.setattr(service, "_batch_summarize_files", fake_batch_summarize)
+        summaries = [
+            {"file_path": main_path, "file_name": "main.py", "sanitized_preview": "print('hi')"}
+        ]
+
+        enriched = asyncio.run(
+            service._enrich_tree_with_summaries(tree, file_nodes, summaries)
+        )
+
+        assert enriched["children"][0]["children"][0]["summary"] == "这是总指挥"
+        assert summaries[0]["ai_summary"] == "这是总指挥"
+
+
+class TestParseProject:
+    """测试后台解析流程的步骤编排"""
+
+    def test_summaries_and_mermaid_run_concurrently(self, tmp_path, monkeypatch) -> None:
+        (tmp_path / "main.py").write_text("print('hi')")
+        service = ProjectService()
+        tree, file_nodes = service._scan_project(str(tmp_path))
+        service.tasks["t1"] = {
+            "directory": str(tmp_path),
+            "project_tree": tree,
+            "tree_file_nodes": file_nodes,
+            "status": "processing",
+            "progress": 0,
+            "message": "",
+        }
+        monkeypatch.setattr(service, "_safe_cleanup", lambda _: None)
+
+        async def run() -> None:
+            mermaid_started = asyncio.Event()
+
+            async def fake_enrich(tree, file_nodes, summaries):
+                # 顺序执行时架构图尚未开始生成，这里会超时
+                await asyncio.wait_for(mermaid_started.wait(), timeout=1)
+                return tree
+
+            async def fake_mermaid(summaries) -> str:
+                mermaid_started.set()
+                return "graph TD"
+
+            monkeypatch.setattr(service, "_enrich_tree_with_summaries", fake_enrich)
+            monkeypatch.setattr(service, "_generate_mermaid_with_llm", fake_mermaid)
+            await service._parse_project("t1", "project.zip")
+
+        asyncio.run(run())
+
+        assert service.tasks["t1"]["status"] == "completed"
+        assert service.tasks["t1"]["project_data"]["mermaid_diagram"] == "graph TD"
+
+
+class TestCleanupExpiredTasks:
+    """测试过期任务清理"""
+
+    def test_drops_only_expired_tasks_from_front(self) -> None:
+        service = ProjectService()
+        now = project_service_module.time.time()
+        expiry = project_service_module.TASK_EXPIRY_SECONDS
+        service.tasks["old"] = {"created_at": now - expiry - 10, "status": "completed"}
+        service.tasks["new"] = {"created_at": now, "status": "processing"}
+
+        history = service.get_history_list()
+
+        assert [item["task_id"] for item in history] == ["new"]
+        assert list(service.tasks) == ["new"]
+
+
+class TestGenerateFallbackMermaid:
+    """测试 LLM 不可用时的基础架构图"""
+
+    def test_groups_by_top_level_folder_and_links_neighbours(self) -> None:
+        summaries = [
+            {"file_path": "api/routes.py", "file_name": "routes.py"},
+            {"file_path": "main.py", "file_name": "main.py"},
+            {"file_path": "services/user/service.py", "file_name": "service.py"},
+            {"file_path": "api/deps.py", "file_name": "deps.py"},
+        ]
+
+        mermaid = ProjectService()._generate_fallback_mermaid(summaries)
+
+        assert mermaid.split("\n") == [
+            "graph TD",
+            '    F0["api"]',
+            '    F1["services"]',
+            "    F0 --> F1",
+        ]
+
+
+class TestHasCodeFile:
+    """测试空项目检测"""
+
+    def test_detects_nested_code_file(self) -> None:
+        tree = {"type": "folder", "name": "root", "children": [
+            {"type": "file", "name": "README.md"},
+            {"type": "folder", "name": "src", "children": [
+                {"type": "folder", "name": "empty", "children": []},
+                {"type": "file", "name": "main.go"},
+            ]},
+        ]}
+        assert ProjectService()._has_code_file(tree)
+
+    def test_project_without_code_is_empty(self) -> None:
+        tree = {"type": "folder", "name": "root", "children": [
+            {"type": "file", "name": "README.md"},
+            {"type": "folder", "name": "docs", "children": []},
+        ]}
+        assert not ProjectService()._has_code_file(tree)
+
+
+class TestSanitizeSummaries:
+    """测试并发脱敏文件预览"""
+
+    def test_sanitizes_existing_files_and_blanks_missing(self, tmp_path) -> None:
+        (tmp_path / "config.py").write_text('API_KEY = "sk-secret-value"\n', encoding="utf-8")
+        summaries = [{"file_path": "config.py"}, {"file_path": "missing.py"}]
+
+        result = asyncio.run(ProjectService()._sanitize_summaries(str(tmp_path), summaries))
+
+        assert "sk-secret-value" not in result[0]["sanitized_preview"]
+        assert "REDACTED" in result[0]["sanitized_preview"]
+        assert result[1]["sanitized_preview"] == ""
+        assert result[0]["preview_800"] == result[0]["sanitized_preview"][:800]
+        assert result[1]["preview_1500"] == ""
+
+    def test_preview_of_large_file_is_capped(self, tmp_path) -> None:
+        (tmp_path / "big.js").write_text("let x = 1;\n" * 100000, encoding="utf-8")
+        summaries = [{"file_path": "big.js"}]
+
+        result = asyncio.run(ProjectService()._sanitize_summaries(str(tmp_path), summaries))
+
+        assert len(result[0]["sanitized_preview"]) == 3000
+
+
+class TestBatchSummarizeCache:
+    """测试项目白话摘要的 LLM 结果缓存"""
+
+    def test_identical_prompts_call_llm_once(self, monkeypatch) -> None:
+        calls = []
+
+        async def fake_generate_json(**kwargs) -> dict:
+            calls.append(kwargs["user_prompt"])
+            return {"main.py": "这是总指挥"}
+
+        monkeypatch.setattr(project_service_module, "response_cache", ResponseCache())
+        monkeypatch.setattr(
+            project_service_module.llm_service, "generate_json", fake_generate_json
+        )
+        files = [{"file_path": "main.py", "file_name": "main.py", "sanitized_preview": "x = 1"}]
+
+        async def run() -> list:
+            service = ProjectService()
+            return [
+                await service._batch_summarize_files(files),
+                await service._batch_summarize_files(files),
+            ]
+
+        first, second = asyncio.run(run())
+
+        assert first == second == {"main.py": "这是总指挥"}
+        assert len(calls) == 1
+
+    def test_only_uncached_files_are_sent_to_llm(self, monkeypatch) -> None:
+        prompts = []
+
+        async def fake_generate_json(**kwargs) -> dict:
+            prompts.append(kwargs["user_prompt"])
+            return {"settings.py": "这是配置清单", "views.py": "这是前台接待"}
+
+        monkeypatch.setattr(project_service_module, "response_cache", ResponseCache())
+        monkeypatch.setattr(
+            project_service_module.llm_service, "generate_json", fake_generate_json
+        )
+        shared = {"file_name": "settings.py", "sanitized_preview": "DEBUG = True"}
+
+        async def run() -> dict:
+            service = ProjectService()
+            await service._batch_summarize_files([{**shared, "file_path": "settings.py"}])
+            return await service._batch_summarize_files([
+                {**shared, "file_path": "other/settings.py"},
+                {"file_path": "views.py", "file_name": "views.py", "sanitized_preview": "def index(): ..."},
+            ])
+
+        result = asyncio.run(run())
+
+        assert len(prompts) == 2
+        assert "settings.py" not in prompts[1]
+        assert result == {"other/settings.py": "这是配置清单", "views.py": "这是前台接待"}
+
+    def test_llm_failure_is_not_cached(self, monkeypatch) -> None:
+        calls = []
+
+        async def failing_generate_json(**kwargs) -> dict:
+            calls.append(kwargs["user_prompt"])
+            raise LLMError("timeout")
+
+        monkeypatch.setattr(project_service_module, "response_cache", ResponseCache())
+        monkeypatch.setattr(
+            project_service_module.llm_service, "generate_json", failing_generate_json
+        )
+        files = [{"file_path": "main.py", "file_name": "main.py", "sanitized_preview": "x = 1"}]
+
+        async def run() -> None:
+            service = ProjectService()
+            await service._batch_summarize_files(files)
+            await service._batch_summarize_files(files)
+
+        asyncio.run(run())
+
+        assert len(calls) == 2
@@ -0,0 +1,32 @@
+"""异步令牌桶限流器的单元测试"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.rate_limit import AsyncTokenBucket
+
+
+class TestAsyncTokenBucket:
+    """测试 AsyncTokenBucket"""
+
+    def test_allows_burst_up_to_capacity_then_waits(self) -> None:
+        async def run() -> tuple:
+            limiter = AsyncTokenBucket(max_rate=3, time_period=0.3)
+            started = time.monotonic()
+            for _ in range(3):
+                async with limiter:
+                    pass
+            burst_elapsed = time.monotonic() - started
+            async with limiter:
+                pass
+            return burst_elapsed, time.monotonic() - started
+
+        burst_elapsed, total_elapsed = asyncio.run(run())
+
+        assert burst_elapsed < 0.05
+        assert total_elapsed >= 0.08
+
+    def test_rejects_non_positive_rate(self) -> None:
+        with pytest.raises(ValueError):
+            AsyncTokenBucket(max_rate=0)
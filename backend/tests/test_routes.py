@@ -0,0 +1,86 @@
+"""API 路由注册的单元测试"""
+import asyncio
+from collections import Counter
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import routes
+from app.api.routes import api_router
+from app.core.config import settings
+from app.services.project_service import project_service
+
+
+class TestRouteRegistration:
+    """测试路由注册"""
+
+    def test_each_route_is_registered_once(self) -> None:
+        registrations = Counter(
+            (method, route.path)
+            for route in api_router.routes
+            for method in route.methods
+        )
+        duplicates = [key for key, count in registrations.items() if count > 1]
+        assert duplicates == []
+
+
+class TestWarmArchitectureVisualization:
+    """测试任务完成后的架构可视化预生成"""
+
+    def _run_with_prewarm(self, monkeypatch, enabled: bool) -> list:
+        calls = []
+
+        async def fake_load(task_id: str) -> dict:
+            calls.append(task_id)
+            return {}
+
+        monkeypatch.setattr(settings, "ARCHITECTURE_PREWARM_ENABLED", enabled)
+        monkeypatch.setattr(routes, "_load_architecture_visualization", fake_load)
+
+        async def run() -> None:
+            routes._warm_architecture_visualization("t1")
+            assert len(routes._background_tasks) == (1 if enabled else 0)
+            await asyncio.gather(*routes._background_tasks)
+
+        asyncio.run(run())
+        return calls
+
+    def test_skipped_when_disabled(self, monkeypatch) -> None:
+        assert self._run_with_prewarm(monkeypatch, enabled=False) == []
+
+    def test_keeps_reference_until_done(self, monkeypatch) -> None:
+        assert self._run_with_prewarm(monkeypatch, enabled=True) == ["t1"]
+        assert routes._background_tasks == set()
+
+
+class TestGetProjectDetails:
+    """测试 /project/{task_id} 的响应结构"""
+
+    def _get(self, monkeypatch, status: str) -> dict:
+        monkeypatch.setattr(
+            project_service,
+            "get_task_status",
+            lambda task_id: {"task_id": task_id, "status": status, "progress": 40},
+        )
+        monkeypatch.setattr(project_service, "get_project_data", lambda task_id: None)
+
+        async def no_visualization(task_id: str) -> dict:
+            raise ValueError("未生成")
+
+        monkeypatch.setattr(routes, "_load_architecture_visualization", no_visualization)
+        app = FastAPI()
+        app.include_router(api_router, prefix="/api")
+        return TestClient(app).get("/api/project/t1").json()
+
+    def test_completed_response_keeps_null_fields(self, monkeypatch) -> None:
+        body = self._get(monkeypatch, "completed")
+
+        assert body["structure"] is None
+        assert body["chatScript"] is None
+        assert body["termDictionary"] is None
+        assert body["fileName"] == "未知项目"
+
+    def test_progress_response_is_compact(self, monkeypatch) -> None:
+        body = self._get(monkeypatch, "processing")
+
+        assert body == {"taskId": "t1", "status": "processing", "progress": 40}
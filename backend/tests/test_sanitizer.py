@@ -1,6 +1,13 @@
 """代码脱敏工具的单元测试"""
+import random
+
 import pytest
-from app.utils.sanitizer import sanitize_code, sanitize_file_content
+from app.utils.sanitizer import (
+    SANITIZE_RULES,
+    sanitize_code,
+    sanitize_file_content,
+    sanitize_file_head,
+)
 
 
 class TestSanitizeCode:
@@ -70,6 +77,56 @@ admin@example.com
         assert "admin@example.com" not in result
         assert "normal_variable" in result
 
+    @pytest.mark.parametrize("code", [
+        'API_KEY = "sk-123"  # 线上密钥',
+        "password: 'p@ss'\nserver = '192.168.1.10'",
+        'access_token = "abc" ; contact = "ops@example.com"',
+        "api_key\n= \"split-line\"\nPASSWORD=hunter2",
+        'secret_key="a" token="b" 10.0.0.1 admin@corp.io',
+        'log("token=" + t); api_key = "sk-live-123"',
+        "pwd='x token=\"y' z\"",
+        'password\u3000=\u3000"hunter2"',
+        'api_key\xa0=\xa0"sk-live-123"',
+        "ip=１９２.１６８.１.１",
+        "服务器地址192.168.1.10",
+        'ſecret = "hunter2"',
+    ])
+    def test_single_scan_matches_rule_by_rule_result(self, code: str) -> None:
+        assert sanitize_code(code) == _apply_rules_one_by_one(code)
+
+    def test_matches_rule_by_rule_result_on_random_input(self) -> None:
+        # 随机拼接关键字、分隔符、未配对的引号、IP、邮箱等片段
+        fragments = [
+            "api_key", "API-KEY", "token", "Password", "pwd", "secret", "credential",
+            "=", " = ", ": ", '"', "'", '"v"', "'v'", "sk-live-123", "\n", " ", "x",
+            "10.0.0.1", "1.2.3.4.5", "ops@corp.io", "@", ".", "AUTH_TOKEN=", "DB_PASSWORD = ",
+            # 非 ASCII：全角空格、不换行空格、全角数字、紧邻中文、Unicode 大小写折叠
+            "\u3000", "\xa0", "１９２.１６８.１.１", "服务器地址", "用户", "ſecret", "\u212a",
+        ]
+        rng = random.Random(20261015)
+        for _ in range(3000):
+            code = "".join(rng.choice(fragments) for _ in range(rng.randint(1, 16)))
+            assert sanitize_code(code) == _apply_rules_one_by_one(code), code
+
+    @pytest.mark.parametrize("code, secret", [
+        ('password\u3000=\u3000"hunter2"', "hunter2"),
+        ('api_key\xa0=\xa0"sk-live-123"', "sk-live-123"),
+        ("ip=１９２.１６８.１.１", "１９２.１６８.１.１"),
+    ])
+    def test_redacts_secrets_around_unicode_whitespace_and_digits(self, code, secret) -> None:
+        assert secret not in sanitize_code(code)
+
+    def test_redacts_key_after_unbalanced_quote(self) -> None:
+        result = sanitize_code('log("token=" + t); api_key = "sk-live-123"')
+        assert "sk-live-123" not in result
+
+
+def _apply_rules_one_by_one(code: str) -> str:
+    """按 SANITIZE_RULES 顺序逐条执行，作为 sanitize_code 的参照结果"""
+    for pattern, replacement, _description in SANITIZE_RULES:
+        code = pattern.sub(replacement, code)
+    return code
+
 
 class TestSanitizeFileContent:
     """测试 sanitize_file_content 函数"""
@@ -94,3 +151,25 @@ class TestSanitizeFileContent:
         content = "This is a README file with API_KEY mentioned"
         result = sanitize_file_content("image.png", content)
         assert result == content
+
+
+class TestSanitizeFileHead:
+    """测试 sanitize_file_head 函数"""
+
+    def test_drops_truncated_last_line(self, tmp_path) -> None:
+        path = tmp_path / "config.py"
+        path.write_text('name = "demo"\npassword = "hunter2-very-long"\n', encoding="utf-8")
+        result = sanitize_file_head(str(path), "config.py", read_chars=24, max_chars=100)
+        assert result == 'name = "demo"\n'
+
+    def test_keeps_first_line_longer_than_read_chars(self, tmp_path) -> None:
+        path = tmp_path / "bundle.min.js"
+        path.write_text('var a=1;var password="hunter2";' + "x" * 100, encoding="utf-8")
+        result = sanitize_file_head(str(path), "bundle.min.js", read_chars=40, max_chars=100)
+        assert result
+        assert result.startswith("var a=1;")
+        assert "hunter2" not in result
+
+    def test_returns_none_for_missing_file(self, tmp_path) -> None:
+        result = sanitize_file_head(str(tmp_path / "missing.py"), "missing.py", 100, 100)
+        assert result is None
@@ -0,0 +1,66 @@
+"""群聊剧本服务的单元测试（不调用 LLM）"""
+from app.services.script_service import ScriptService
+
+
+class TestValidateScriptStructure:
+    """测试 AI 生成剧本的结构校验"""
+
+    def test_fills_defaults_and_drops_invalid_entries(self) -> None:
+        script = {
+            "scenario": "",
+            "characters": [
+                {"id": "user", "name": "用户小明"},
+                "not a character",
+                {"name": "无名"},
+                {"id": 3, "name": "数字角色", "extra": "ignored"},
+            ],
+            "dialogues": [
+                {"from": "user", "to": "char_1", "content": "你好", "code_ref": "main.py:1"},
+                {"from": "user", "to": "ghost", "content": "没人接"},
+                {"from": "user", "to": "char_1", "content": ""},
+                {"from": 3, "to": "user", "content": "收到"},
+                None,
+            ],
+        }
+
+        result = ScriptService()._validate_script_structure(script, "用户登录")
+
+        assert result["scenario"] == "用户登录"
+        assert result["characters"] == [
+            {"id": "user", "name": "用户小明", "role": "Unknown", "personality": ""},
+            {"id": "char_1", "name": "无名", "role": "Unknown", "personality": ""},
+            {"id": "3", "name": "数字角色", "role": "Unknown", "personality": ""},
+        ]
+        assert result["dialogues"] == [
+            {"from": "user", "to": "char_1", "content": "你好", "code_ref": "main.py:1"},
+            {"from": "3", "to": "user", "content": "收到", "code_ref": ""},
+        ]
+
+    def test_null_fields_use_defaults(self) -> None:
+        script = {
+            "scenario": "用户登录",
+            "characters": [
+                {"id": "user", "name": None, "role": None, "personality": None},
+                {"id": "api", "name": "接口", "role": "Controller"},
+            ],
+            "dialogues": [
+                {"from": "user", "to": "api", "content": "登录", "code_ref": None},
+                {"from": "api", "to": "user", "content": None},
+            ],
+        }
+
+        result = ScriptService()._validate_script_structure(script, "默认")
+
+        assert result["characters"][0] == {
+            "id": "user", "name": "未知角色", "role": "Unknown", "personality": "",
+        }
+        assert result["dialogues"] == [
+            {"from": "user", "to": "api", "content": "登录", "code_ref": ""},
+        ]
+
+    def test_non_list_fields_become_empty(self) -> None:
+        script = {"scenario": "下单", "characters": "oops", "dialogues": {"a": 1}}
+
+        result = ScriptService()._validate_script_structure(script, "默认")
+
+        assert result == {"scenario": "下单", "characters": [], "dialogues": []}
@@ -0,0 +1,66 @@
+"""语义缓存服务的单元测试（不依赖 ChromaDB）"""
+import asyncio
+import threading
+
+from app.services import semantic_cache_service as semantic_cache_module
+from app.services.semantic_cache_service import SemanticCacheService
+
+
+class _FakeCacheCollection:
+    """记录 upsert / query 调用及其所在线程的集合桩"""
+
+    def __init__(self) -> None:
+        self.upserts = []
+        self.query_threads = []
+
+    def upsert(self, **kwargs) -> None:
+        self.upserts.append(kwargs)
+
+    def query(self, **kwargs):
+        self.query_threads.append(threading.current_thread())
+        if not self.upserts:
+            return {"ids": [[]], "distances": [[]], "metadatas": [[]]}
+        return {
+            "ids": [[self.upserts[-1]["ids"][0]]],
+            "distances": [[0.0]],
+            "metadatas": [[self.upserts[-1]["metadatas"][0]]],
+        }
+
+
+def _service_with(collection: _FakeCacheCollection, monkeypatch) -> SemanticCacheService:
+    monkeypatch.setattr(
+        semantic_cache_module.vector_service,
+        "embed_queries",
+        lambda queries: [[float(len(query))] for query in queries],
+    )
+    service = SemanticCacheService()
+    service.enabled = True
+    service._initialized = True
+    service._collection = collection
+    return service
+
+
+class TestSemanticCacheService:
+    """测试语义缓存的读写"""
+
+    def test_stores_embedding_without_input_text(self, monkeypatch) -> None:
+        collection = _FakeCacheCollection()
+        service = _service_with(collection, monkeypatch)
+
+        asyncio.run(service.store("chat_script", "用户登录", {"ok": True}, scope="t1"))
+
+        (upsert,) = collection.upserts
+        assert "documents" not in upsert
+        assert upsert["embeddings"] == [[4.0]]
+        assert "用户登录" not in str(upsert["metadatas"])
+
+    def test_lookup_runs_off_the_event_loop(self, monkeypatch) -> None:
+        collection = _FakeCacheCollection()
+        service = _service_with(collection, monkeypatch)
+
+        async def run():
+            await service.store("chat_script", "用户登录", {"ok": True}, scope="t1")
+            return await service.lookup("chat_script", "用户登录", scope="t1")
+
+        assert asyncio.run(run()) == {"ok": True}
+        assert collection.query_threads[0] is not threading.main_thread()
@@ -4,30 +4,28 @@
 """
 import asyncio
 import sys
-from pathlib import Path
+import threading
 
-# 添加项目根目录到 Python 路径
-sys.path.insert(0, str(Path(__file__).parent.parent))
+import pytest
 
-from app.services.vector_service import vector_service
+from app.core.config import settings
+from app.services import vector_service as vector_service_module
+from app.services.vector_service import (
+    LocalEmbeddingFunction,
+    VectorService,
+    vector_service,
+)
 
 
+@pytest.mark.network
 async def test_vector_service():
     """测试向量数据库服务"""
-    print("=" * 50)
-    print("开始测试向量数据库服务")
-    print("=" * 50)
+    # 输出先收集到列表，结束时一次性打印，避免控制台 I/O 穿插在并发调用之间
+    lines = ["=" * 50, "开始测试向量数据库服务", "=" * 50]
     
     try:
-        # 测试 1: 获取集合统计信息
-        print("\n[测试 1] 获取集合统计信息...")
-        stats = await vector_service.get_collection_stats()
-        print(f"✓ 集合名称: {stats.get('collection_name')}")
-        print(f"✓ 代码片段总数: {stats.get('total_fragments')}")
-        print(f"✓ 持久化目录: {stats.get('persist_directory')}")
-        
-        # 测试 2: 添加测试代码片段
-        print("\n[测试 2] 添加测试代码片段...")
+        # 测试 1: 添加测试代码片段（后续查询依赖这些数据，先单独执行）
+        lines.append("\n[测试 1] 添加测试代码片段...")
         test_fragments = [
             {
                 "id": "test_file_1",
@@ -54,51 +52,474 @@ async def test_vector_service():
         ]
         
         added_count = await vector_service.add_code_fragments(test_fragments)
-        print(f"✓ 成功添加 {added_count} 个代码片段")
+        lines.append(f"✓ 成功添加 {added_count} 个代码片段")
         
-        # 测试 3: 语义搜索
-        print("\n[测试 3] 语义搜索代码片段...")
-        search_results = await vector_service.search_similar_code(
-            query="打印 hello world",
-            n_results=2
+        # 测试 2-4: 统计、语义搜索、获取片段详情互不依赖，并发执行
+        stats, search_results, fragment = await asyncio.gather(
+            vector_service.get_collection_stats(),
+            vector_service.search_similar_code(
+                query="打印 hello world",
+                n_results=2
+            ),
+            vector_service.get_fragment_by_id("test_file_1"),
         )
-        print(f"✓ 找到 {len(search_results)} 个相关结果:")
+
+        lines.append("\n[测试 2] 获取集合统计信息...")
+        lines.append(f"✓ 集合名称: {stats.get('collection_name')}")
+        lines.append(f"✓ 代码片段总数: {stats.get('total_fragments')}")
+        lines.append(f"✓ 持久化目录: {stats.get('persist_directory')}")
+        
+        lines.append("\n[测试 3] 语义搜索代码片段...")
+        lines.append(f"✓ 找到 {len(search_results)} 个相关结果:")
         for i, result in enumerate(search_results, 1):
-            print(f"  {i}. {result['metadata']['file_path']} (相似度: {result.get('similarity', 'N/A')})")
+            lines.append(f"  {i}. {result['metadata']['file_path']} (相似度: {result.get('similarity', 'N/A')})")
         
-        # 测试 4: 获取片段详情
-        print("\n[测试 4] 获取片段详情...")
-        fragment = await vector_service.get_fragment_by_id("test_file_1")
+        lines.append("\n[测试 4] 获取片段详情...")
         if fragment:
-            print(f"✓ 片段 ID: {fragment['id']}")
-            print(f"✓ 文件路径: {fragment['metadata']['file_path']}")
-            print(f"✓ 内容预览: {fragment['content'][:50]}...")
+            lines.append(f"✓ 片段 ID: {fragment['id']}")
+            lines.append(f"✓ 文件路径: {fragment['metadata']['file_path']}")
+            lines.append(f"✓ 内容预览: {fragment['content'][:50]}...")
         else:
-            print("✗ 未找到片段")
+            lines.append("✗ 未找到片段")
         
         # 测试 5: 按文件路径删除
-        print("\n[测试 5] 删除测试片段...")
+        lines.append("\n[测试 5] 删除测试片段...")
         deleted_count = await vector_service.delete_by_file_path("test/hello.py")
-        print(f"✓ 删除了 {deleted_count} 个片段")
+        lines.append(f"✓ 删除了 {deleted_count} 个片段")
         
         # 最终统计
-        print("\n[最终统计]")
+        lines.append("\n[最终统计]")
         final_stats = await vector_service.get_collection_stats()
-        print(f"✓ 当前代码片段总数: {final_stats.get('total_fragments')}")
+        lines.append(f"✓ 当前代码片段总数: {final_stats.get('total_fragments')}")
         
-        print("\n" + "=" * 50)
-        print("✓ 所有测试通过！")
-        print("=" * 50)
+        lines.extend(["\n" + "=" * 50, "✓ 所有测试通过！", "=" * 50])
         
     except Exception as error:
-        print(f"\n✗ 测试失败: {str(error)}")
+        lines.append(f"\n✗ 测试失败: {str(error)}")
+        print("\n".join(lines))
         import traceback
         traceback.print_exc()
         return False
     
+    print("\n".join(lines))
     return True
 
 
+class _FakeCollection:
+    """
+    可配置的 ChromaDB 集合桩：
+    - add 记录每批写入，指定批次抛出异常
+    - query 按元数据过滤 rows 返回候选（rows 为空时每个查询向量返回以其取值命名的单条结果）
+    - get / delete 返回并记录 ids，count 返回固定数量
+    """
+
+    def __init__(self, rows=None, ids=(), count: int = 0, fail_on_call: int = -1) -> None:
+        self.rows = rows
+        self.ids = list(ids)
+        self._count = count
+        self.fail_on_call = fail_on_call
+        self.batches = []
+        self.embeddings = []
+        self.metadatas = []
+        self.queries = []
+        self.query_sizes = []
+        self.get_calls = []
+        self.deleted = []
+
+    def add(self, ids, documents, metadatas, embeddings=None) -> None:
+        self.batches.append(list(ids))
+        self.embeddings.extend(embeddings or [])
+        self.metadatas.extend(metadatas)
+        if len(self.batches) - 1 == self.fail_on_call:
+            raise RuntimeError("boom")
+
+    def query(self, query_embeddings, n_results, where=None, **kwargs) -> dict:
+        self.queries.append({"n_results": n_results, "where": where})
+        self.query_sizes.append(len(query_embeddings))
+        if self.rows is None:
+            return {
+                "ids": [[f"hit-{vector[0]:g}"] for vector in query_embeddings],
+                "documents": [["doc"] for _ in query_embeddings],
+                "metadatas": [[{"language": "python"}] for _ in query_embeddings],
+                "distances": [[0.25] for _ in query_embeddings],
+            }
+        rows = [
+            row for row in self.rows
+            if where is None or all(row[1].get(k) == v for k, v in where.items())
+        ][:n_results]
+        return {
+            "ids": [[row[0] for row in rows] for _ in query_embeddings],
+            "documents": [[row[0] for row in rows] for _ in query_embeddings],
+            "metadatas": [[row[1] for row in rows] for _ in query_embeddings],
+            "distances": [[0.1 for _ in rows] for _ in query_embeddings],
+        }
+
+    def get(self, where=None, include=None) -> dict:
+        self.get_calls.append({"where": where, "include": include})
+        return {"ids": list(self.ids)}
+
+    def delete(self, ids) -> None:
+        self.deleted.extend(ids)
+
+    def count(self) -> int:
+        return self._count
+
+
+class _CountingEmbeddingFunction:
+    """记录每次嵌入调用输入的嵌入函数桩，向量为文本长度"""
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, input):
+        self.calls.append(list(input))
+        return [[float(len(text))] for text in input]
+
+
+def _service_with(collection: _FakeCollection) -> VectorService:
+    service = VectorService()
+    service._initialized = True
+    service._collection = collection
+    service._embedding_function = _CountingEmbeddingFunction()
+    return service
+
+
+class TestAddCodeFragments:
+    """测试分批写入向量库"""
+
+    def _fragments(self, count: int) -> list:
+        return [
+            {"id": f"f{index}", "content": f"x = {index}", "file_path": "a.py"}
+            for index in range(count)
+        ]
+
+    def test_adds_in_fixed_size_batches(self, monkeypatch) -> None:
+        monkeypatch.setattr(settings, "VECTOR_ADD_BATCH_SIZE", 4)
+        collection = _FakeCollection()
+
+        added = asyncio.run(_service_with(collection).add_code_fragments(self._fragments(10)))
+
+        assert added == 10
+        assert [len(batch) for batch in collection.batches] == [4, 4, 2]
+        assert collection.batches[2] == ["f8", "f9"]
+
+    def test_failed_batch_does_not_block_others(self, monkeypatch) -> None:
+        monkeypatch.setattr(settings, "VECTOR_ADD_BATCH_SIZE", 4)
+        collection = _FakeCollection(fail_on_call=1)
+
+        added = asyncio.run(_service_with(collection).add_code_fragments(self._fragments(10)))
+
+        assert added == 6
+        assert len(collection.batches) == 3
+
+    def test_embeds_duplicate_contents_once_across_batches(self, monkeypatch) -> None:
+        monkeypatch.setattr(settings, "VECTOR_ADD_BATCH_SIZE", 2)
+        collection = _FakeCollection()
+        service = _service_with(collection)
+        fragments = [
+            {"id": f"f{index}", "content": "# license" if index % 2 else f"x = {index}"}
+            for index in range(6)
+        ]
+
+        added = asyncio.run(service.add_code_fragments(fragments))
+
+        assert added == 6
+        assert service._embedding_function.calls == [
+            ["x = 0", "# license"], ["x = 2"], ["x = 4"],
+        ]
+        assert collection.embeddings[1] == collection.embeddings[3] == [9.0]
+        hashes = [metadata["content_hash"] for metadata in collection.metadatas]
+        assert hashes[1] == hashes[3] == hashes[5] != hashes[0]
+
+    def test_concurrent_single_fragment_adds_share_one_embedding_call(self) -> None:
+        collection = _FakeCollection()
+        service = _service_with(collection)
+
+        async def run():
+            return await asyncio.gather(*(
+                service.add_code_fragments([fragment]) for fragment in self._fragments(10)
+            ))
+
+        assert asyncio.run(run()) == [1] * 10
+        assert service._embedding_function.calls == [[f"x = {index}" for index in range(10)]]
+        assert len(collection.batches) == 10
+        assert collection.embeddings == [[5.0]] * 10
+
+    def test_embedding_failure_is_reported_to_every_waiting_add(self) -> None:
+        collection = _FakeCollection()
+        service = _service_with(collection)
+
+        def failing_embedding(input):
+            raise RuntimeError("embedding down")
+
+        service._embedding_function = failing_embedding
+
+        async def run():
+            return await asyncio.gather(*(
+                service.add_code_fragments([fragment]) for fragment in self._fragments(3)
+            ))
+
+        assert asyncio.run(run()) == [0, 0, 0]
+        assert collection.batches == []
+
+
+class TestEmbedQueries:
+    """测试查询向量 LRU 缓存"""
+
+    def test_returns_all_vectors_when_cache_is_smaller_than_batch(self, monkeypatch) -> None:
+        monkeypatch.setattr(vector_service_module, "QUERY_EMBEDDING_CACHE_SIZE", 1)
+        service = _service_with(_FakeCollection())
+
+        assert service.embed_queries(["a", "bb", "a"]) == [[1.0], [2.0], [1.0]]
+        assert service.embed_queries(["bb"]) == [[2.0]]
+        assert service._embedding_function.calls == [["a", "bb"]]
+
+    def test_concurrent_calls_do_not_race_on_eviction(self, monkeypatch) -> None:
+        monkeypatch.setattr(vector_service_module, "QUERY_EMBEDDING_CACHE_SIZE", 4)
+        service = _service_with(_FakeCollection())
+        queries = [["x" * (index % 7 + 1), "y" * (index % 5 + 1)] for index in range(400)]
+
+        async def run():
+            return await asyncio.gather(*(
+                asyncio.to_thread(service.embed_queries, batch) for batch in queries
+            ))
+
+        results = asyncio.run(run())
+        assert results == [[[float(len(text))] for text in batch] for batch in queries]
+
+
+class TestSearchSimilarCodePrefilter:
+    """测试带元数据过滤的检索先取近邻再过滤"""
+
+    def _search(self, collection, filters, n_results=2) -> list:
+        return asyncio.run(_service_with(collection).search_similar_code(
+            "q", n_results=n_results, filters=filters, query_embedding=[0.0]
+        ))
+
+    def test_filters_unfiltered_candidates_in_python(self) -> None:
+        collection = _FakeCollection(rows=[
+            ("a", {"language": "python"}),
+            ("b", {"language": "javascript"}),
+            ("c", {"language": "python"}),
+            ("d", {"language": "python"}),
+        ])
+
+        results = self._search(collection, {"language": "python"})
+
+        assert [item["id"] for item in results] == ["a", "c"]
+        assert collection.queries == [{"n_results": 20, "where": None}]
+
+    def test_falls_back_to_where_query_when_candidates_are_too_sparse(self) -> None:
+        rows = [(f"js{index}", {"language": "javascript"}) for index in range(20)]
+        rows.append(("py", {"language": "python"}))
+        collection = _FakeCollection(rows=rows)
+
+        results = self._search(collection, {"language": "python"})
+
+        assert [item["id"] for item in results] == ["py"]
+        assert collection.queries[-1] == {"n_results": 2, "where": {"language": "python"}}
+
+    def test_supports_in_operator(self) -> None:
+        collection = _FakeCollection(rows=[
+            ("a", {"language": "go"}),
+            ("b", {"language": "rust"}),
+        ])
+
+        results = self._search(collection, {"language": {"$in": ["rust", "c"]}}, n_results=1)
+
+        assert [item["id"] for item in results] == ["b"]
+
+
+class TestLocalEmbeddingFunction:
+    """测试本地嵌入函数的批量调用"""
+
+    def test_encodes_whole_batch_in_one_call(self) -> None:
+        calls = []
+
+        class FakeVectors:
+            def __init__(self, rows) -> None:
+                self.rows = rows
+
+            def tolist(self) -> list:
+                return self.rows
+
+        class FakeModel:
+            def encode(self, texts, **kwargs):
+                calls.append((texts, kwargs))
+                return FakeVectors([[float(len(text))] for text in texts])
+
+        vectors = LocalEmbeddingFunction(FakeModel())(["a", "bb", "ccc"])
+
+        assert vectors == [[1.0], [2.0], [3.0]]
+        assert len(calls) == 1
+        assert calls[0][1]["batch_size"] == 64
+        assert calls[0][1]["normalize_embeddings"] is True
+
+
+class TestLazyInitialization:
+    """测试异步方法的延迟初始化不阻塞事件循环"""
+
+    def test_first_call_initializes_in_worker_thread(self, monkeypatch) -> None:
+        service = VectorService()
+        init_threads = []
+
+        def fake_initialize_client() -> None:
+            init_threads.append(threading.current_thread())
+            service._collection = _FakeCollection(count=3)
+
+        monkeypatch.setattr(service, "_initialize_client", fake_initialize_client)
+
+        stats = asyncio.run(service.get_collection_stats())
+
+        assert stats["total_fragments"] == 3
+        assert init_threads and init_threads[0] is not threading.main_thread()
+
+        asyncio.run(service.get_collection_stats())
+        assert len(init_threads) == 1
+
+
+class TestSearchCache:
+    """测试检索结果缓存"""
+
+    def _search(self, service, filters=None) -> list:
+        return asyncio.run(service.search_similar_code(
+            "q", n_results=2, filters=filters, query_embedding=[0.0]
+        ))
+
+    def test_repeated_query_skips_collection(self) -> None:
+        collection = _FakeCollection(rows=[("a", {"language": "python"})])
+        service = _service_with(collection)
+
+        first = self._search(service, {"language": "python"})
+        second = self._search(service, {"language": "python"})
+
+        assert first == second
+        assert len(collection.queries) == 1
+
+    def test_different_filters_are_cached_separately(self) -> None:
+        collection = _FakeCollection(rows=[("a", {"language": "python"})])
+        service = _service_with(collection)
+
+        self._search(service, {"language": "python"})
+        self._search(service, {"language": "go"})
+
+        assert len(collection.queries) >= 2
+
+    def test_writes_invalidate_cache(self) -> None:
+        collection = _FakeCollection(rows=[("a", {"language": "python"})])
+        service = _service_with(collection)
+        self._search(service)
+
+        asyncio.run(service.add_code_fragments([{"id": "b", "content": "x = 1"}]))
+        self._search(service)
+
+        assert len(collection.queries) == 2
+
+
+class TestDeleteByFilePath:
+    """测试按文件路径删除片段"""
+
+    def test_fetches_ids_only_and_deletes_them(self) -> None:
+        collection = _FakeCollection(ids=["a", "b"])
+
+        deleted = asyncio.run(_service_with(collection).delete_by_file_path("src/a.py"))
+
+        assert deleted == 2
+        assert collection.get_calls == [{"where": {"file_path": "src/a.py"}, "include": []}]
+        assert collection.deleted == ["a", "b"]
+
+    def test_returns_zero_when_nothing_matches(self) -> None:
+        collection = _FakeCollection()
+
+        assert asyncio.run(_service_with(collection).delete_by_file_path("src/a.py")) == 0
+        assert collection.deleted == []
+
+
+class TestSearchSimilarCodeBatch:
+    """测试批量检索"""
+
+    def test_runs_one_embedding_call_and_one_query(self) -> None:
+        collection = _FakeCollection()
+        service = _service_with(collection)
+
+        results = asyncio.run(service.search_similar_code_batch(["a", "bb", "ccc"], n_results=1))
+
+        assert [[item["id"] for item in items] for items in results] == [
+            ["hit-1"], ["hit-2"], ["hit-3"],
+        ]
+        assert service._embedding_function.calls == [["a", "bb", "ccc"]]
+        assert collection.query_sizes == [3]
+
+    def test_only_uncached_queries_are_sent(self) -> None:
+        collection = _FakeCollection()
+        service = _service_with(collection)
+        asyncio.run(service.search_similar_code("bb", n_results=1))
+
+        results = asyncio.run(service.search_similar_code_batch(["a", "bb"], n_results=1))
+
+        assert [items[0]["id"] for items in results] == ["hit-1", "hit-2"]
+        assert collection.query_sizes == [1, 1]
+
+
+class TestWarmUp:
+    """测试启动预热"""
+
+    def test_loads_local_model_and_touches_index(self) -> None:
+        collection = _FakeCollection(count=3)
+        service = _service_with(collection)
+
+        service.warm_up()
+
+        assert service._embedding_function.calls == [["warmup"]]
+        assert [query["n_results"] for query in collection.queries] == [1]
+
+    def test_skips_query_on_empty_collection(self) -> None:
+        collection = _FakeCollection(count=0)
+        service = _service_with(collection)
+
+        service.warm_up()
+
+        assert collection.queries == []
+
+    def test_remote_embeddings_are_not_called(self) -> None:
+        collection = _FakeCollection(count=3)
+        service = _service_with(collection)
+        service._remote_embeddings = True
+
+        service.warm_up()
+
+        assert service._embedding_function.calls == []
+
+
+class _FakeClient:
+    def __init__(self) -> None:
+        self.created = []
+
+    def list_collections(self) -> list:
+        return []
+
+    def create_collection(self, name, embedding_function, metadata):
+        self.created.append(metadata)
+        return object()
+
+
+class TestInitializeCollection:
+    """测试新建集合时的 HNSW 参数"""
+
+    def test_new_collection_uses_configured_hnsw_parameters(self, monkeypatch) -> None:
+        monkeypatch.setattr(settings, "VECTOR_HNSW_M", 24)
+        service = VectorService()
+        service._client = _FakeClient()
+
+        service._initialize_collection()
+
+        metadata = service._client.created[0]
+        assert metadata["hnsw:space"] == "cosine"
+        assert metadata["hnsw:M"] == 24
+        assert metadata["hnsw:search_ef"] == settings.VECTOR_HNSW_SEARCH_EF
+        assert metadata["description"] == "代码片段向量存储"
+
+
 if __name__ == "__main__":
     success = asyncio.run(test_vector_service())
     sys.exit(0 if success else 1)